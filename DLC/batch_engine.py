@@ -0,0 +1,211 @@
+"""Batched Shroom Raider engine on NumPy arrays.
+
+BatchGame keeps N independent copies of one level as stacked tile arrays
+with per-game player, item and score vectors. Each call to step() advances
+every game by one action. The rules of GameState.move and
+GameState.pickup_item are applied to all the games at once through array
+masks, not game by game in Python.
+
+Only burning a tree group that has already been cut into leaves the
+array path; that group is flood-filled for the one game it happened in.
+
+Requires NumPy.
+"""
+import numpy as np
+
+from shroom_raider import (GameState, ACTION_KEYS, MOVE_KEYS, PICKUP_KEYS, EMPTY, TREE, AXE, FLAMETHROWER,
+                           PLAYER1, PLAYER2, MOVE_ACTION, PUSH_RESULT, STEP, COLLECT, DROWN, PUSH, CHOP,
+                           grid_neighbours)
+
+
+# Action codes are indices into ACTION_KEYS, the keys run_terminal_mode accepts;
+# pickups step nowhere
+ACTION_ROW_STEP = np.array([MOVE_KEYS[key][0] if key in MOVE_KEYS else 0 for key in ACTION_KEYS], dtype=np.intp)
+ACTION_COL_STEP = np.array([MOVE_KEYS[key][1] if key in MOVE_KEYS else 0 for key in ACTION_KEYS], dtype=np.intp)
+# Player 1 is 0, player 2 is 1
+ACTION_PLAYER = np.array([(MOVE_KEYS[key][2] if key in MOVE_KEYS else PICKUP_KEYS[key]) - 1 for key in ACTION_KEYS],
+                         dtype=np.intp)
+ACTION_IS_PICKUP = np.array([key in PICKUP_KEYS for key in ACTION_KEYS])
+
+# Step results, one per game
+BLOCKED, MOVED, WIN, LOSS, PICKED = range(5)
+# Game status
+PLAYING, WON, LOST = range(3)
+
+MOVE_ACTIONS = np.array(MOVE_ACTION, dtype=np.uint8)
+PUSH_RESULTS = np.array(PUSH_RESULT, dtype=np.uint8)
+KEY_CODES = np.full(256, -1, dtype=np.int8)
+KEY_CODES[np.frombuffer(ACTION_KEYS.encode('ascii'), dtype=np.uint8)] = np.arange(len(ACTION_KEYS))
+
+
+def encode_actions(keys):
+    """Turn a string of move keys into an array of action codes"""
+    codes = KEY_CODES[np.frombuffer(keys.lower().encode('ascii'), dtype=np.uint8)]
+    if (codes < 0).any():
+        raise ValueError(f"Unknown action in {keys!r}; expected any of {ACTION_KEYS!r}")
+    return codes.astype(np.intp)
+
+
+class BatchGame:
+    """N copies of one level, stepped together"""
+    def __init__(self, level_data=None, count=1):
+        game = GameState(level_data)
+        self.rows = game.rows
+        self.cols = game.cols
+        self.count = count
+        self.total_mushrooms = game.total_mushrooms
+        self.initial_board = np.frombuffer(game.initial_board, dtype=np.uint8)
+        self.initial_restore = np.frombuffer(bytes(game.restore_board), dtype=np.uint8)
+        self.initial_positions = np.array([
+            game.player1["yPos"] * self.cols + game.player1["xPos"],
+            game.player2["yPos"] * self.cols + game.player2["xPos"],
+        ], dtype=np.intp)
+        # Trees are never added, so every tree still standing belongs to one
+        # of the level's original groups
+        self.tree_labels = np.asarray(game.level.tree_labels)
+        self.tree_components = game.tree_components
+        self.component_cells = {}
+
+        size = self.rows * self.cols
+        self.board = np.empty((count, size), dtype=np.uint8)
+        self.restore_board = np.empty((count, size), dtype=np.uint8)
+        self.positions = np.empty((count, 2), dtype=np.intp)
+        self.axes = np.empty((count, 2), dtype=np.int32)
+        self.flamethrowers = np.empty((count, 2), dtype=np.int32)
+        self.mushrooms_collected = np.empty(count, dtype=np.int32)
+        self.move_count = np.empty(count, dtype=np.int32)
+        self.status = np.empty(count, dtype=np.int8)
+        self.reset()
+
+    def reset(self, games=None):
+        """Restart every game, or only the games selected by an index or mask"""
+        games = slice(None) if games is None else games
+        self.board[games] = self.initial_board
+        self.restore_board[games] = self.initial_restore
+        self.positions[games] = self.initial_positions
+        self.axes[games] = 0
+        self.flamethrowers[games] = 0
+        self.mushrooms_collected[games] = 0
+        self.move_count[games] = 0
+        self.status[games] = PLAYING
+
+    def step(self, actions):
+        """Apply one action code per game and return each game's result.
+
+        Games that are already won or lost are left alone and report BLOCKED.
+        """
+        actions = np.asarray(actions, dtype=np.intp)
+        results = np.full(self.count, BLOCKED, dtype=np.int8)
+        playing = self.status == PLAYING
+        pickups = ACTION_IS_PICKUP[actions]
+
+        games = np.flatnonzero(playing & pickups)
+        if games.size:
+            results[games] = self.apply_pickups(games, ACTION_PLAYER[actions[games]])
+        games = np.flatnonzero(playing & ~pickups)
+        if games.size:
+            results[games] = self.apply_moves(games, actions[games])
+        return results
+
+    def apply_pickups(self, games, players):
+        """Pick up the item under each player whose hands are empty"""
+        cells = self.positions[games, players]
+        empty_handed = (self.axes[games, players] == 0) & (self.flamethrowers[games, players] == 0)
+        items = self.restore_board[games, cells]
+        got_axe = empty_handed & (items == AXE)
+        got_flamethrower = empty_handed & (items == FLAMETHROWER)
+        picked = got_axe | got_flamethrower
+
+        self.restore_board[games[picked], cells[picked]] = EMPTY
+        self.axes[games[got_axe], players[got_axe]] = 1
+        self.flamethrowers[games[got_flamethrower], players[got_flamethrower]] = 1
+        return np.where(picked, PICKED, BLOCKED)
+
+    def apply_moves(self, games, actions):
+        """Move one player in each game, following GameState.apply_move"""
+        players = ACTION_PLAYER[actions]
+        row_step = ACTION_ROW_STEP[actions]
+        col_step = ACTION_COL_STEP[actions]
+        current = self.positions[games, players]
+        other = self.positions[games, 1 - players]
+
+        y, x = np.divmod(current, self.cols)
+        next_y = y + row_step
+        next_x = x + col_step
+        inside = (next_y >= 0) & (next_y < self.rows) & (next_x >= 0) & (next_x < self.cols)
+        target = np.where(inside, next_y * self.cols + next_x, current)
+        open_target = inside & (target != other)
+        action = np.where(open_target, MOVE_ACTIONS[self.board[games, target]], -1)
+
+        # Rocks need the tile beyond them to take the push
+        beyond_y = next_y + row_step
+        beyond_x = next_x + col_step
+        beyond_inside = (beyond_y >= 0) & (beyond_y < self.rows) & (beyond_x >= 0) & (beyond_x < self.cols)
+        beyond = np.where(beyond_inside, beyond_y * self.cols + beyond_x, current)
+        pushed = PUSH_RESULTS[self.board[games, beyond]]
+        push = (action == PUSH) & beyond_inside & (beyond != other) & (pushed != 0)
+
+        # Trees need an axe, or else a flamethrower
+        chop = action == CHOP
+        cut = chop & (self.axes[games, players] > 0)
+        burn = chop & ~cut & (self.flamethrowers[games, players] > 0)
+
+        drown = action == DROWN
+        collect = action == COLLECT
+        moved = (action == STEP) | collect | drown | push | cut | burn
+
+        self.board[games[push], beyond[push]] = pushed[push]
+        for game, cell in zip(games[burn].tolist(), target[burn].tolist()):
+            self.burn_tree(game, cell)
+        self.axes[games[cut], players[cut]] -= 1
+        self.flamethrowers[games[burn], players[burn]] -= 1
+
+        # Leave the current cell and step onto the target
+        movers = games[moved]
+        left = current[moved]
+        self.board[movers, left] = self.restore_board[movers, left]
+        self.positions[movers, players[moved]] = target[moved]
+        self.move_count[movers] += 1
+        self.mushrooms_collected[games[collect]] += 1
+
+        results = np.where(moved, MOVED, BLOCKED).astype(np.int8)
+        won = collect & (self.mushrooms_collected[games] == self.total_mushrooms)
+        results[won] = WIN
+        results[drown] = LOSS
+        self.status[games[won]] = WON
+        self.status[games[drown]] = LOST
+        return results
+
+    def burn_tree(self, game, start):
+        """Burn the group of trees connected to start in one game.
+
+        A tree a player has cut is still drawn as a tree while that player
+        stands on it, but it no longer joins groups together.
+        """
+        label = int(self.tree_labels[start])
+        cells = self.component_cells.get(label)
+        if cells is None:
+            cells = self.component_cells[label] = np.array(self.tree_components[label], dtype=np.intp)
+
+        board = self.board[game]
+        occupied = self.positions[game].tolist()
+        if (board[cells] == TREE).all() and not np.isin(occupied, cells).any():
+            # The group is still whole, which is by far the usual case
+            board[cells] = EMPTY
+            return
+
+        board[start] = EMPTY
+        stack = [start]
+        while stack:
+            for neighbour in grid_neighbours(stack.pop(), self.rows, self.cols):
+                if board[neighbour] == TREE and neighbour not in occupied:
+                    board[neighbour] = EMPTY
+                    stack.append(neighbour)
+
+    def board_with_players(self):
+        """Copy of every board with both players placed on it"""
+        tiles = self.board.copy()
+        games = np.arange(self.count)
+        tiles[games, self.positions[:, 0]] = PLAYER1
+        tiles[games, self.positions[:, 1]] = PLAYER2
+        return tiles
@@ -0,0 +1,350 @@
+"""Performance benchmarks for Shroom Raider.
+
+Times the base game's movement code (driven through InputHandler), the DLC
+GameState engine, the NumPy batch engine (when NumPy is installed), a
+rock-heavy and burn-heavy workload, level parsing, exporting, rendering and
+leaderboard writes. Every benchmark is run on the
+shipped levels and on synthetic maps, and reported in operations per second.
+
+Results can be saved as a JSON baseline and compared against on a later run:
+
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json
+"""
+import sys
+import json
+import random
+import platform
+import tempfile
+import importlib.util
+from pathlib import Path
+from time import perf_counter
+from argparse import ArgumentParser
+
+import shroom_raider
+from shroom_raider import (GameState, LeaderboardManager, TILE_EMOJI, EMPTY, PLAYER1, PLAYER2,
+                           MOVE_KEYS, PICKUP_KEYS, compile_level, load_level_file)
+from level_generator import generate_level
+
+try:
+    import batch_engine
+except ImportError:
+    # NumPy is optional; without it the batched engine is simply not measured
+    batch_engine = None
+
+
+LEVELS_DIR = Path(__file__).resolve().parent / "levels"
+BASE_GAME = Path(__file__).resolve().parent.parent / "Game" / "shroom_raider.py"
+
+DEFAULT_SIZES = (10, 100, 1000)
+DEFAULT_MIN_TIME = 0.2
+DEFAULT_REPEATS = 3
+DEFAULT_TOLERANCE = 0.2
+MOVES_PER_RUN = 1000
+SCORES_PER_RUN = 100
+BATCH_GAMES = 1024
+BATCH_CELLS = 1 << 24     # cap on tiles held by one batch, for the big maps
+
+# Move keys the base game accepts; the DLC engine takes shroom_raider.MOVE_KEYS and PICKUP_KEYS
+BASE_KEYS = "wasd"
+
+# The base game only knows one player and draws rocks without padding
+BASE_EMOJI = {tile: emoji.rstrip(" ") for tile, emoji in TILE_EMOJI.items() if tile != PLAYER2}
+
+# Tile densities for synthetic maps
+OPEN_MIX = {"trees": 0.08, "water": 0.02, "rocks": 0.05, "items": 0.02}
+ROCKS_AND_BURNS_MIX = {"trees": 0.3, "water": 0.05, "rocks": 0.25, "items": 0.06}
+
+
+def synthetic_level(rows, cols, mix=OPEN_MIX, seed=0):
+    """Two-player generated level text, in the DLC level format"""
+    text, _ = generate_level(rows, cols, players=2, seed=seed, **mix)
+    return text
+
+
+def random_moves(keys, count, seed=0, pickup_rate=0.0, pickups="p"):
+    """Random move string, with pickups mixed in at the given rate"""
+    rng = random.Random(seed)
+    return "".join(rng.choice(pickups) if rng.random() < pickup_rate else rng.choice(keys)
+                   for _ in range(count))
+
+
+def load_base_game():
+    """Import the base game under its own name, next to the DLC's shroom_raider"""
+    spec = importlib.util.spec_from_file_location("base_shroom_raider", BASE_GAME)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def base_boards(level):
+    """The base game's player dict and emoji board for a compiled level"""
+    tiles = bytearray(level.board)
+    y, x = level.player1
+    tiles[y * level.cols + x] = PLAYER1
+    board = [[BASE_EMOJI.get(tile, BASE_EMOJI[EMPTY]) for tile in tiles[start:start + level.cols]]
+             for start in range(0, len(tiles), level.cols)]
+    player = {"xPos": x, "yPos": y, "mushroom": 0, "win": level.mushrooms, "axe": 0, "flamethrower": 0}
+    return player, board
+
+
+# ------------------------- Workloads ------------------------- #
+# Each factory does its setup once and returns a function that performs one
+# run of the workload and returns how many operations that run did.
+
+def dlc_moves(text, moves):
+    """Play a move string on the DLC engine, restarting after a win or loss"""
+    game = GameState(text)
+    actions = [(PICKUP_KEYS[key], None) if key in PICKUP_KEYS else (None, MOVE_KEYS[key]) for key in moves]
+
+    def run():
+        for pickup, move in actions:
+            if pickup:
+                game.pickup_item(pickup)
+            else:
+                result = game.move(*move)
+                if result == 'win' or result == 'loss':
+                    game.restart()
+        return len(actions)
+    return run
+
+
+def base_moves(base, text, moves, output_file, chunk=16):
+    """Feed a move string to the base game's InputHandler in small chunks.
+
+    A win or loss ends the base game through quit(), so each chunk is played
+    on its own and the level is restarted whenever one of them ends the game.
+    """
+    level = compile_level(text)
+    # Base games that run out of moves write their result to the session's output file
+    session = base.NewSession(str(output_file), (level.rows, level.cols))
+    player, board = base_boards(level)
+    initial_player = dict(player)
+    initial_board = [row[:] for row in board]
+    display_board = [row[:] for row in board]
+    toggle_board = [row[:] for row in board]
+    chunks = [moves[start:start + chunk] for start in range(0, len(moves), chunk)]
+
+    def run():
+        for moveset in chunks:
+            try:
+                base.InputHandler(moveset, player, initial_player, display_board, initial_board, toggle_board, True, session)
+            except SystemExit:
+                base.Restart(player, initial_player, display_board, initial_board, toggle_board, session)
+        return len(moves)
+    return run
+
+
+def batch_moves(text, moves):
+    """Step a batch of games together, one random action each per step"""
+    count = max(1, min(BATCH_GAMES, BATCH_CELLS // len(compile_level(text).board)))
+    batch = batch_engine.BatchGame(text, count)
+    codes = batch_engine.encode_actions(moves)
+    steps = [random.Random(step).choices(codes, k=count) for step in range(16)]
+
+    def run():
+        for actions in steps:
+            batch.step(actions)
+            finished = batch.status != batch_engine.PLAYING
+            if finished.any():
+                batch.reset(finished)
+        return len(steps) * count
+    return run
+
+
+def parse_level(text):
+    """Parse level text from scratch"""
+    def run():
+        compile_level(text)
+        return 1
+    return run
+
+
+def load_cached_level(stage_file, cache_dir):
+    """Load a level through its on-disk compiled copy"""
+    load_level_file(stage_file, cache_dir)
+
+    def run():
+        shroom_raider.COMPILED_LEVELS.clear()
+        GameState(load_level_file(stage_file, cache_dir))
+        return 1
+    return run
+
+
+def render_board(text):
+    """Render the board as an emoji string"""
+    game = GameState(text)
+
+    def run():
+        game.get_board_string()
+        return 1
+    return run
+
+
+def export_board(text, output_file):
+    """Write the board out in the level format"""
+    game = GameState(text)
+
+    def run():
+        game.export_to_file(output_file, "No Clear")
+        return 1
+    return run
+
+
+def base_term_print(base, text, output_file):
+    """Write the board out with the base game's TermPrint"""
+    level = compile_level(text)
+    _, board = base_boards(level)
+
+    def run():
+        base.TermPrint(board, "No Clear", output_file, (level.rows, level.cols))
+        return 1
+    return run
+
+
+def add_scores(leaderboard_file):
+    """Record scores the way finished GUI games do"""
+    leaderboard = LeaderboardManager(leaderboard_file)
+
+    def run():
+        for score in range(SCORES_PER_RUN):
+            leaderboard.add_score("bench", "Level 1", score)
+        leaderboard.flush()
+        return SCORES_PER_RUN
+    return run
+
+
+# ------------------------- Running ------------------------- #
+
+def measure(run, min_time=DEFAULT_MIN_TIME, repeats=DEFAULT_REPEATS):
+    """Best operations per second over a few timed rounds of at least min_time each"""
+    best = 0.0
+    for _ in range(repeats):
+        ops = 0
+        start = perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            ops += run()
+            elapsed = perf_counter() - start
+        best = max(best, ops / elapsed)
+    return best
+
+
+def benchmark_maps(sizes):
+    """(name, level text) pairs: shipped levels, then synthetic maps of each size"""
+    maps = []
+    for path in sorted(LEVELS_DIR.glob("Level*.txt"), key=lambda path: int(path.stem[5:])):
+        maps.append((path.stem, path.read_text(encoding='utf-8')))
+    for size in sizes:
+        maps.append((f"synthetic{size}x{size}", synthetic_level(size, size)))
+    return maps
+
+
+def workloads(sizes, work_dir):
+    """Yield (benchmark name, map name, run factory) for every benchmark"""
+    base = load_base_game()
+    dlc_keys = random_moves("wasdijkl", MOVES_PER_RUN, pickup_rate=0.05, pickups="po")
+    base_keys = random_moves(BASE_KEYS, MOVES_PER_RUN, pickup_rate=0.05)
+    cache_dir = work_dir / "level_cache"
+
+    for map_name, text in benchmark_maps(sizes):
+        stage_file = work_dir / f"{map_name}.txt"
+        stage_file.write_text(text, encoding='utf-8')
+        yield "base.input_handler", map_name, lambda: base_moves(base, text, base_keys, work_dir / "base_output.txt")
+        yield "dlc.move", map_name, lambda: dlc_moves(text, dlc_keys)
+        if batch_engine:
+            yield "batch.step", map_name, lambda: batch_moves(text, "wasdijklpo")
+        yield "dlc.load_level", map_name, lambda: parse_level(text)
+        yield "dlc.load_cached", map_name, lambda: load_cached_level(stage_file, cache_dir)
+        yield "dlc.get_board_string", map_name, lambda: render_board(text)
+        yield "dlc.export_to_file", map_name, lambda: export_board(text, work_dir / "output.txt")
+        yield "base.term_print", map_name, lambda: base_term_print(base, text, work_dir / "base_output.txt")
+
+    rock_keys = random_moves("wasdijkl", MOVES_PER_RUN, seed=1, pickup_rate=0.2, pickups="po")
+    for size in sizes:
+        text = synthetic_level(size, size, ROCKS_AND_BURNS_MIX, seed=1)
+        yield "dlc.rocks_and_burns", f"synthetic{size}x{size}", lambda: dlc_moves(text, rock_keys)
+
+    yield "leaderboard.add_score", "-", lambda: add_scores(work_dir / "leaderboard" / "leaderboard.json")
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, min_time=DEFAULT_MIN_TIME, repeats=DEFAULT_REPEATS,
+                   only=None, report=print):
+    """Run every benchmark whose name contains `only`, returning {key: ops/sec}"""
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, map_name, factory in workloads(sizes, Path(work_dir)):
+            key = f"{name}[{map_name}]"
+            if only and only not in key:
+                continue
+            results[key] = measure(factory(), min_time, repeats)
+            report(f"{key:<50} {results[key]:>14,.1f} ops/sec")
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Lines comparing results with a baseline, and the keys that got slower than tolerated"""
+    lines = []
+    regressions = []
+    for key, rate in results.items():
+        before = baseline.get(key)
+        if not before:
+            lines.append(f"{key:<50} {rate:>14,.1f} ops/sec  (new)")
+            continue
+        ratio = rate / before
+        flag = ""
+        if ratio < 1 - tolerance:
+            flag = "  SLOWER"
+            regressions.append(key)
+        lines.append(f"{key:<50} {rate:>14,.1f} ops/sec  x{ratio:.2f}{flag}")
+    return lines, regressions
+
+
+def save_baseline(results, baseline_file):
+    """Write results, with the interpreter that produced them, as a JSON baseline"""
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(baseline_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def load_baseline(baseline_file):
+    """Read the results saved by save_baseline"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        return json.load(f)["results"]
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the Shroom Raider engines, rendering and I/O")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='Side lengths of the synthetic square maps')
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME,
+                        help='Minimum seconds per timed round')
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS,
+                        help='Timed rounds per benchmark; the best one is reported')
+    parser.add_argument('-k', '--only', help='Only run benchmarks whose name contains this')
+    parser.add_argument('--save', help='Write the results to this JSON baseline file')
+    parser.add_argument('--compare', help='Compare the results with this JSON baseline file')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Slowdown allowed before a comparison fails (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.compare) if args.compare else None
+    results = run_benchmarks(args.sizes, args.min_time, args.repeats, args.only)
+
+    if args.save:
+        save_baseline(results, args.save)
+    if baseline is not None:
+        lines, regressions = compare(results, baseline, args.tolerance)
+        print(f"\nCompared with {args.compare}:")
+        print("\n".join(lines))
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
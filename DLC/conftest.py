@@ -0,0 +1,51 @@
+"""Make this folder's shroom_raider the one its tests use.
+
+DLC/ and Game/ both ship a shroom_raider module. When pytest runs both
+folders at once, the import cache holds only one of them, so each folder
+puts its own back before collecting and before running each of its tests
+(worker processes look functions up there by module name).
+
+Every test also gets its own level cache, so none writes into the real
+level_cache folder. Tests marked slow are long regression runs, skipped
+unless SHROOM_RAIDER_SLOW_TESTS is set or they are picked with -m slow.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+
+cached = sys.modules.get("shroom_raider")
+if cached is not None and Path(cached.__file__).resolve().parent != HERE:
+    del sys.modules["shroom_raider"]
+sys.path.insert(0, str(HERE))
+
+import shroom_raider
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: long regression run, skipped by default")
+
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get("SHROOM_RAIDER_SLOW_TESTS") or "slow" in config.getoption("markexpr", ""):
+        return
+    skip = pytest.mark.skip(reason="slow; set SHROOM_RAIDER_SLOW_TESTS=1 or pass -m slow to run it")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+def pytest_runtest_setup(item):
+    sys.modules["shroom_raider"] = shroom_raider
+
+
+@pytest.fixture(autouse=True)
+def level_cache(tmp_path, monkeypatch):
+    """Compile levels into the test's own folder, for this process and any it starts"""
+    cache = tmp_path / "level_cache"
+    monkeypatch.setattr(shroom_raider, "LEVEL_CACHE_DIR", cache)
+    monkeypatch.setenv("SHROOM_RAIDER_LEVEL_CACHE", str(cache))
+    return cache
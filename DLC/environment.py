@@ -0,0 +1,127 @@
+"""Gym-style environment for training agents on Shroom Raider levels.
+
+ShroomRaiderEnv wraps a GameState with reset()/step()/action_space in the
+shape reinforcement learning libraries expect, without depending on any of
+them. Observations are NumPy views over the game's own board buffer, so
+nothing is rebuilt between steps: a view handed out once keeps showing the
+live board.
+
+Requires NumPy.
+"""
+import random
+
+import numpy as np
+
+from shroom_raider import GameState, ACTION_KEYS, MOVE_KEYS, PICKUP_KEYS
+
+
+# Rewards per step
+MUSHROOM_REWARD = 1.0
+LOSS_REWARD = -1.0
+
+# (method, arguments) per action code, in ACTION_KEYS order
+ACTION_CALLS = tuple(("move", MOVE_KEYS[key]) if key in MOVE_KEYS else ("pickup_item", (PICKUP_KEYS[key],))
+                     for key in ACTION_KEYS)
+
+
+class Discrete:
+    """The actions 0 .. n - 1"""
+    def __init__(self, n, seed=None):
+        self.n = n
+        self.rng = random.Random(seed)
+
+    def sample(self):
+        return self.rng.randrange(self.n)
+
+    def contains(self, action):
+        return isinstance(action, (int, np.integer)) and 0 <= action < self.n
+
+    def seed(self, seed=None):
+        self.rng.seed(seed)
+
+
+class ShroomRaiderEnv:
+    """One Shroom Raider game behind reset()/step()/step_many()
+
+    Actions are indices into ACTION_KEYS: the eight movement keys, then the
+    p and o pickups. Observations are dicts of:
+      board    read-only (rows, cols) uint8 view of the tiles, without players
+      players  [[p1 row, p1 col], [p2 row, p2 col]]
+      items    [[p1 axes, p1 flamethrowers], [p2 axes, p2 flamethrowers]]
+    """
+    def __init__(self, level_data=None, max_steps=None):
+        self.game = GameState(level_data)
+        self.max_steps = max_steps
+        self.action_space = Discrete(len(ACTION_KEYS))
+        self.steps = 0
+
+        self.board = np.frombuffer(self.game.board, dtype=np.uint8).reshape(self.game.rows, self.game.cols)
+        self.board.flags.writeable = False
+        self.players = np.empty((2, 2), dtype=np.int32)
+        self.items = np.empty((2, 2), dtype=np.int32)
+        self.observation = {"board": self.board, "players": self.players, "items": self.items}
+        self.calls = [(getattr(self.game, method), args) for method, args in ACTION_CALLS]
+
+    def observe(self):
+        """Refresh the small player arrays; the board view is always current"""
+        p1 = self.game.player1
+        p2 = self.game.player2
+        self.players[0] = p1["yPos"], p1["xPos"]
+        self.players[1] = p2["yPos"], p2["xPos"]
+        self.items[0] = p1["axe"], p1["flamethrower"]
+        self.items[1] = p2["axe"], p2["flamethrower"]
+        return self.observation
+
+    def info(self, result=None):
+        return {
+            "result": result,
+            "mushrooms_collected": self.game.total_mushrooms_collected,
+            "total_mushrooms": self.game.total_mushrooms,
+            "move_count": self.game.move_count,
+        }
+
+    def reset(self, seed=None):
+        """Restart the level and return (observation, info)"""
+        if seed is not None:
+            self.action_space.seed(seed)
+        # restart() copies into the same bytearray, so the board view stays valid
+        self.game.restart()
+        self.steps = 0
+        return self.observe(), self.info()
+
+    def step(self, action):
+        """Apply one action and return (observation, reward, terminated, truncated, info)"""
+        reward, terminated, result = self.apply(action)
+        truncated = not terminated and self.max_steps is not None and self.steps >= self.max_steps
+        return self.observe(), reward, terminated, truncated, self.info(result)
+
+    def apply(self, action):
+        """Apply one action and return (reward, terminated, raw result)"""
+        method, args = self.calls[action]
+        collected = self.game.total_mushrooms_collected
+        result = method(*args)
+        self.steps += 1
+
+        reward = MUSHROOM_REWARD * (self.game.total_mushrooms_collected - collected)
+        if result == 'loss':
+            return reward + LOSS_REWARD, True, result
+        return reward, result == 'win', result
+
+    def step_many(self, actions):
+        """Apply a sequence of actions in one call, stopping once the game ends.
+
+        Returns (observation, rewards, terminated, truncated, info), where
+        rewards has one entry per action that was applied.
+        """
+        rewards = []
+        terminated = truncated = False
+        result = None
+        for action in actions:
+            reward, terminated, result = self.apply(action)
+            rewards.append(reward)
+            if terminated:
+                break
+            if self.max_steps is not None and self.steps >= self.max_steps:
+                truncated = True
+                break
+        return self.observe(), np.array(rewards, dtype=np.float32), terminated, truncated, self.info(result)
@@ -0,0 +1,488 @@
+"""Textual interface for Shroom Raider.
+
+Kept apart from the game engine in shroom_raider.py so that terminal and
+batch mode never import Textual or Rich.
+"""
+from pathlib import Path
+from textual.app import App, ComposeResult
+from textual.screen import Screen
+from textual.widgets import Static, Button, Label, Header, Footer, Input
+from textual.containers import Container, Vertical, Horizontal, Grid, Center
+from textual.binding import Binding
+from rich.text import Text
+from rich.table import Table
+
+from shroom_raider import GameState, LeaderboardManager, load_level_file
+from verifier import LEVELS_DIR, check_score
+
+
+class GameScreen(Screen):
+    """The main game screen"""
+    
+    BINDINGS = [
+        Binding("w", "move_p1_up", "P1 Up", show=False),
+        Binding("s", "move_p1_down", "P1 Down", show=False),
+        Binding("a", "move_p1_left", "P1 Left", show=False),
+        Binding("d", "move_p1_right", "P1 Right", show=False),
+        Binding("i", "move_p2_up", "P2 Up", show=False),
+        Binding("k", "move_p2_down", "P2 Down", show=False),
+        Binding("j", "move_p2_left", "P2 Left", show=False),
+        Binding("l", "move_p2_right", "P2 Right", show=False),
+        Binding("p", "pickup_p1", "P1 Pickup", show=False),
+        Binding("o", "pickup_p2", "P2 Pickup", show=False),
+        Binding("r", "restart", "Restart", show=True),
+        Binding("u", "undo", "Undo", show=True),
+        Binding("y", "redo", "Redo", show=True),
+        Binding("escape", "back_to_menu", "Menu", show=True),
+    ]
+    
+    def __init__(self, level_data=None, level_name="Level 1", stage_file=None):
+        super().__init__()
+        self.game_state = GameState(level_data, journal=True)
+        # Stage file the level came from when it is not a shipped level
+        self.stage_file = stage_file
+        # If no level data provided, this is Level 0
+        if level_data is None:
+            self.level_name = "Level 0"
+        else:
+            self.level_name = level_name
+        self.game_over = False
+    
+    def compose(self) -> ComposeResult:
+        yield Header()
+        with Center():
+            with Container(id="game_container"):
+                yield Label(self.level_name, id="level_title")
+                with Vertical(id="game_board"):
+                    for _ in range(self.game_state.rows):
+                        yield Static(classes="board_row")
+                yield Static(id="game_info")
+        yield Footer()
+    
+    def on_mount(self) -> None:
+        self.query_one("#game_board").border_title = "🍄 Shroom Raider 🍄"
+        self.row_widgets = list(self.query(".board_row").results(Static))
+        self.info_counters = None
+        self.update_display()
+    
+    def update_display(self):
+        """Redraw the board rows that changed and the info panel if its counters moved"""
+        for row in self.game_state.take_dirty_rows():
+            self.row_widgets[row].update(self.game_state.row_string(row))
+        
+        p1 = self.game_state.player1
+        p2 = self.game_state.player2
+        counters = (self.game_state.total_mushrooms_collected, self.game_state.move_count,
+                    p1["axe"], p1["flamethrower"], p2["axe"], p2["flamethrower"])
+        if counters != self.info_counters:
+            self.info_counters = counters
+            self.query_one("#game_info", Static).update(self.build_info_text())
+    
+    def build_info_text(self):
+        """Build the progress and inventory panel"""
+        p1 = self.game_state.player1
+        p2 = self.game_state.player2
+        
+        mushroom_progress = f"{self.game_state.total_mushrooms_collected}/{self.game_state.total_mushrooms}"
+        
+        info_text = Text()
+        info_text.append("═" * 50 + "\n", style="bold bright_cyan")
+        info_text.append(f"  🎯 Total Progress: ", style="bold yellow")
+        info_text.append(f"{mushroom_progress} Mushrooms  ", style="bold bright_green")
+        info_text.append(f"  📊 Moves: {self.game_state.move_count}\n", style="bold bright_blue")
+        info_text.append("═" * 50 + "\n\n", style="bold bright_cyan")
+        
+        info_text.append("🧑 Player 1 (WASD)\n", style="bold bright_green")
+        if p1["axe"] > 0:
+            info_text.append("  Item: 🪓 Axe\n", style="bright_yellow")
+        elif p1["flamethrower"] > 0:
+            info_text.append("  Item: 🔥 Flamethrower\n", style="bright_red")
+        else:
+            info_text.append("  Item: None\n", style="dim")
+        
+        info_text.append("\n👩 Player 2 (IJKL)\n", style="bold bright_magenta")
+        if p2["axe"] > 0:
+            info_text.append("  Item: 🪓 Axe\n", style="bright_yellow")
+        elif p2["flamethrower"] > 0:
+            info_text.append("  Item: 🔥 Flamethrower\n", style="bright_red")
+        else:
+            info_text.append("  Item: None\n", style="dim")
+        
+        return info_text
+    
+    def action_move_p1_up(self):
+        if not self.game_over:
+            result = self.game_state.move(-1, 0, 1)
+            self.handle_move_result(result)
+    
+    def action_move_p1_down(self):
+        if not self.game_over:
+            result = self.game_state.move(1, 0, 1)
+            self.handle_move_result(result)
+    
+    def action_move_p1_left(self):
+        if not self.game_over:
+            result = self.game_state.move(0, -1, 1)
+            self.handle_move_result(result)
+    
+    def action_move_p1_right(self):
+        if not self.game_over:
+            result = self.game_state.move(0, 1, 1)
+            self.handle_move_result(result)
+    
+    def action_pickup_p1(self):
+        if not self.game_over:
+            self.game_state.pickup_item(1)
+            self.update_display()
+    
+    def action_move_p2_up(self):
+        if not self.game_over:
+            result = self.game_state.move(-1, 0, 2)
+            self.handle_move_result(result)
+    
+    def action_move_p2_down(self):
+        if not self.game_over:
+            result = self.game_state.move(1, 0, 2)
+            self.handle_move_result(result)
+    
+    def action_move_p2_left(self):
+        if not self.game_over:
+            result = self.game_state.move(0, -1, 2)
+            self.handle_move_result(result)
+    
+    def action_move_p2_right(self):
+        if not self.game_over:
+            result = self.game_state.move(0, 1, 2)
+            self.handle_move_result(result)
+    
+    def action_pickup_p2(self):
+        if not self.game_over:
+            self.game_state.pickup_item(2)
+            self.update_display()
+    
+    def action_restart(self):
+        self.game_over = False
+        self.game_state.restart()
+        self.update_display()
+    
+    def action_undo(self):
+        if self.game_state.undo():
+            self.game_over = False
+            self.update_display()
+    
+    def action_redo(self):
+        if not self.game_over:
+            result = self.game_state.redo()
+            if result:
+                self.handle_move_result(result)
+    
+    def action_back_to_menu(self):
+        self.app.pop_screen()
+    
+    def handle_move_result(self, result):
+        """Handle the result of a move"""
+        self.update_display()
+        
+        if result == 'win':
+            self.game_over = True
+            self.app.push_screen(WinScreen(self.level_name, self.game_state.move_count,
+                                           self.game_state.history_keys(), self.game_state.level,
+                                           self.stage_file))
+        elif result == 'loss':
+            self.game_over = True
+            self.app.push_screen(LossScreen())
+
+
+class WinScreen(Screen):
+    """Screen shown when players win"""
+    
+    BINDINGS = [
+        Binding("r", "play_again", "Play Again", show=False),
+        Binding("escape", "to_menu", "Menu", show=False),
+    ]
+    
+    def __init__(self, level_name, move_count, replay="", level=None, stage_file=None):
+        super().__init__()
+        self.level_name = level_name
+        self.move_count = move_count
+        # The keys that won, saved with the score so it can be replayed
+        self.replay = replay
+        # The compiled level that was won, and the stage file it came from if any
+        self.level = level
+        self.stage_file = stage_file
+    
+    def compose(self) -> ComposeResult:
+        with Center():
+            with Container(id="modal_container"):
+                yield Label("🎉 VICTORY! 🎉", id="modal_title")
+                yield Label(f"Completed in {self.move_count} moves!", id="modal_message")
+                yield Label("Enter username for leaderboard:", id="username_label")
+                yield Input(placeholder="Username (optional)", id="username_input")
+                with Horizontal(id="modal_buttons"):
+                    yield Button("💾 Save", id="save_score", variant="success")
+                    yield Button("⏭️ Next", id="next_level", variant="default")
+                    yield Button("🏠 Menu", id="menu", variant="primary")
+    
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "save_score":
+            username_input = self.query_one("#username_input", Input)
+            username = username_input.value.strip()
+            if username:
+                # Only scores whose keys replay to the same win on the level played are saved
+                level = self.level if self.level is not None else self.level_name
+                moves, reason = check_score((level, self.replay, self.move_count, LEVELS_DIR))
+                if reason is None:
+                    self.app.leaderboard.add_score(username, self.level_name, moves, self.replay, self.stage_file)
+                else:
+                    self.app.notify(f"Score not saved: {reason}", severity="error")
+            # Go to main menu after saving
+            self.app.pop_screen()
+            self.app.pop_screen()
+        elif event.button.id == "next_level":
+            self.action_next_level()
+        elif event.button.id == "menu":
+            self.action_to_menu()
+    
+    def action_next_level(self):
+        """Load the next level"""
+        # Extract level number from level name
+        if self.level_name.startswith("Level "):
+            try:
+                current_level = int(self.level_name.split()[1])
+                next_level = current_level + 1
+                
+                if next_level > 15:
+                    # After level 15, go to menu
+                    self.app.pop_screen()
+                    self.app.pop_screen()
+                else:
+                    # Load next level
+                    level_file = Path(f"levels/Level{next_level}.txt")
+                    if level_file.exists():
+                        level_data = load_level_file(level_file)
+                        self.app.pop_screen()
+                        game_screen = self.app.screen_stack[-1]
+                        if isinstance(game_screen, GameScreen):
+                            # Replace current game screen with new level
+                            self.app.pop_screen()
+                            self.app.push_screen(GameScreen(level_data, f"Level {next_level}"))
+                    else:
+                        # If file doesn't exist, go to menu
+                        self.app.pop_screen()
+                        self.app.pop_screen()
+            except (ValueError, IndexError):
+                # If level name format is unexpected, go to menu
+                self.app.pop_screen()
+                self.app.pop_screen()
+        else:
+            # If not a numbered level, go to menu
+            self.app.pop_screen()
+            self.app.pop_screen()
+    
+    def action_play_again(self):
+        self.app.pop_screen()
+        game_screen = self.app.screen_stack[-1]
+        if isinstance(game_screen, GameScreen):
+            game_screen.action_restart()
+    
+    def action_to_menu(self):
+        self.app.pop_screen()
+        self.app.pop_screen()
+
+
+class LossScreen(Screen):
+    """Screen shown when a player loses"""
+    
+    BINDINGS = [
+        Binding("r", "try_again", "Try Again", show=False),
+        Binding("escape", "to_menu", "Menu", show=False),
+    ]
+    
+    def compose(self) -> ComposeResult:
+        with Center():
+            with Container(id="modal_container"):
+                yield Label("💀 GAME OVER 💀", id="modal_title")
+                yield Label("A player drowned!", id="modal_message")
+                with Horizontal(id="modal_buttons"):
+                    yield Button("🔄 Try Again", id="try_again", variant="warning")
+                    yield Button("🏠 Menu", id="menu", variant="primary")
+    
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "try_again":
+            self.action_try_again()
+        elif event.button.id == "menu":
+            self.action_to_menu()
+    
+    def action_try_again(self):
+        self.app.pop_screen()
+        game_screen = self.app.screen_stack[-1]
+        if isinstance(game_screen, GameScreen):
+            game_screen.action_restart()
+    
+    def action_to_menu(self):
+        self.app.pop_screen()
+        self.app.pop_screen()
+
+
+class LeaderboardScreen(Screen):
+    """Screen showing leaderboard for a specific level"""
+    
+    BINDINGS = [
+        Binding("escape", "back", "Back", show=True),
+    ]
+    
+    def __init__(self, level_name):
+        super().__init__()
+        self.level_name = level_name
+    
+    def compose(self) -> ComposeResult:
+        yield Header()
+        with Center():
+            with Container(id="leaderboard_container"):
+                yield Label(f"🏆 {self.level_name} Leaderboard 🏆", id="leaderboard_title")
+                yield Static(id="leaderboard_table")
+                with Center():
+                    yield Button("⬅️ Back", id="back", variant="primary", classes="centered_button")
+        yield Footer()
+    
+    def on_mount(self):
+        self.update_leaderboard()
+    
+    def update_leaderboard(self):
+        """Update the leaderboard display"""
+        table = Table(title="🌟 Top 10 Scores 🌟", border_style="bright_cyan", show_header=True, 
+                     title_style="bold bright_yellow")
+        table.add_column("Rank", style="bold yellow", justify="center", width=8)
+        table.add_column("Username", style="bold bright_green", width=20)
+        table.add_column("Moves", style="bold bright_cyan", justify="center", width=10)
+        
+        scores = self.app.leaderboard.get_leaderboard(self.level_name)
+        
+        if scores:
+            for i, score in enumerate(scores, 1):
+                rank_emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+                # Scores saved before replays were kept could not be checked
+                moves = f"{score['moves']}?" if score.get("verified") is False else str(score["moves"])
+                table.add_row(rank_emoji, score["username"], moves)
+        else:
+            table.add_row("—", "No scores yet", "—")
+        
+        self.query_one("#leaderboard_table", Static).update(table)
+    
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "back":
+            self.action_back()
+    
+    def action_back(self):
+        self.app.pop_screen()
+
+
+class LevelSelectScreen(Screen):
+    """Screen for selecting levels"""
+    
+    BINDINGS = [
+        Binding("escape", "back", "Back", show=True),
+    ]
+    
+    def compose(self) -> ComposeResult:
+        yield Header()
+        with Center():
+            with Container(id="level_select_container"):
+                yield Label("🎮 SELECT LEVEL 🎮", id="level_select_title")
+                with Grid(id="level_grid"):
+                    # Add Level 0 (Tutorial)
+                    with Vertical(classes="level_card"):
+                        yield Button("🍄 Level 0", id=f"level_0", variant="success", classes="level_button")
+                        yield Button("🏆", id=f"leaderboard_0", variant="default", classes="leaderboard_btn")
+                    # Add Levels 1-15
+                    for i in range(1, 16):
+                        with Vertical(classes="level_card"):
+                            yield Button(f"🍄 Level {i}", id=f"level_{i}", variant="primary", classes="level_button")
+                            yield Button("🏆", id=f"leaderboard_{i}", variant="default", classes="leaderboard_btn")
+                with Center():
+                    yield Button("⬅️ Back to Menu", id="back", variant="default", classes="centered_button")
+        yield Footer()
+    
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        button_id = event.button.id
+        
+        if button_id == "back":
+            self.action_back()
+        elif button_id.startswith("leaderboard_"):
+            level_num = int(button_id.split("_")[1])
+            level_name = f"Level {level_num}"
+            self.app.push_screen(LeaderboardScreen(level_name))
+        elif button_id.startswith("level_"):
+            level_num = int(button_id.split("_")[1])
+            level_name = f"Level {level_num}"
+            level_file = Path(f"levels/Level{level_num}.txt")
+            
+            if level_file.exists():
+                level_data = load_level_file(level_file)
+                self.app.push_screen(GameScreen(level_data, level_name))
+            else:
+                self.app.push_screen(GameScreen(None, level_name))
+    
+    def action_back(self):
+        self.app.pop_screen()
+
+
+class MainMenuScreen(Screen):
+    """Main menu screen"""
+    
+    BINDINGS = [
+        Binding("q", "quit_app", "Exit", show=True),
+    ]
+    
+    def compose(self) -> ComposeResult:
+        yield Header()
+        with Center():
+            with Container(id="menu_container"):
+                yield Label("🍄 SHROOM RAIDER 🍄", id="menu_title")
+                yield Label("Cooperative Mushroom Collector", id="menu_subtitle")
+                with Vertical(id="menu_buttons"):
+                    yield Button("🎮 Play", id="play", variant="success")
+                    yield Button("📋 Levels", id="levels", variant="primary")
+                    yield Button("🚪 Exit", id="exit", variant="error")
+        yield Footer()
+    
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "play":
+            # Check if a stage file was provided via command line
+            if self.app.stage_file:
+                try:
+                    level_data = load_level_file(self.app.stage_file)
+                    level_name = Path(self.app.stage_file).stem
+                    self.app.push_screen(GameScreen(level_data, level_name, self.app.stage_file))
+                except FileNotFoundError:
+                    self.app.push_screen(GameScreen())
+            else:
+                self.app.push_screen(GameScreen())
+        elif event.button.id == "levels":
+            self.app.push_screen(LevelSelectScreen())
+        elif event.button.id == "exit":
+            self.app.exit()
+    
+    def action_quit_app(self):
+        self.app.exit()
+
+
+class MushroomGame(App):
+    """Main application"""
+    
+    CSS_PATH = "game_styles.tcss"
+    
+    BINDINGS = [
+        Binding("q", "quit", "Quit", show=False, priority=True),
+    ]
+    
+    def __init__(self, stage_file=None):
+        super().__init__()
+        # Stage file given on the command line, played by the menu's Play button
+        self.stage_file = stage_file
+        self.leaderboard = LeaderboardManager()
+    
+    def on_mount(self) -> None:
+        # Regular flushes also pull in scores saved by other terminals
+        self.set_interval(self.leaderboard.flush_interval, self.leaderboard.flush)
+        self.push_screen(MainMenuScreen())
@@ -0,0 +1,175 @@
+"""Random level generator for Shroom Raider.
+
+Levels are solvable by construction: before anything else is placed, a
+witness path is carved from each player through every mushroom that player
+is meant to collect. Path cells are left empty, so walking the path never
+touches a tree, rock or water tile, and the moves along it are returned
+alongside the level as proof that it can be cleared.
+
+With two players the map is split into a top half for L and a bottom half
+for O, so neither path ever runs through the other player.
+"""
+import math
+import random
+from argparse import ArgumentParser
+
+from shroom_raider import EMPTY, TREE, MUSHROOM, ROCK, WATER, AXE, FLAMETHROWER, PLAYER1, PLAYER2
+
+
+DEFAULT_TREES = 0.2
+DEFAULT_WATER = 0.05
+DEFAULT_ROCKS = 0.05
+DEFAULT_ITEMS = 0.01
+
+# Move keys for (up, down, left, right), per player
+PLAYER_KEYS = {1: "wsad", 2: "ikjl"}
+
+
+def plan_regions(rows, cols, players):
+    """Inner row ranges each player may use, as (first row, last row) pairs"""
+    if players == 1:
+        return [(1, rows - 2)]
+    middle = 1 + (rows - 2) // 2
+    return [(1, middle - 1), (middle, rows - 2)]
+
+
+def visit_order(cells, cols, band_height):
+    """Order cells as a boustrophedon sweep over horizontal bands.
+
+    Sweeping left to right in one band and right to left in the next keeps
+    the witness path short without solving a travelling salesman problem.
+    """
+    def key(index):
+        y, x = divmod(index, cols)
+        band = y // band_height
+        return band, x if band % 2 == 0 else -x, y
+    return sorted(cells, key=key)
+
+
+def carve_path(path, start, goal, cols, keys, horizontal_first):
+    """Mark an L-shaped path from start to goal and return the moves along it"""
+    y, x = divmod(start, cols)
+    goal_y, goal_x = divmod(goal, cols)
+    up, down, left, right = keys
+    moves = []
+
+    def walk_rows():
+        nonlocal y
+        step, key = (1, down) if goal_y > y else (-1, up)
+        while y != goal_y:
+            y += step
+            path[y * cols + x] = 1
+            moves.append(key)
+
+    def walk_cols():
+        nonlocal x
+        step, key = (1, right) if goal_x > x else (-1, left)
+        while x != goal_x:
+            x += step
+            path[y * cols + x] = 1
+            moves.append(key)
+
+    if horizontal_first:
+        walk_cols()
+        walk_rows()
+    else:
+        walk_rows()
+        walk_cols()
+    return moves
+
+
+def generate_level(rows, cols, players=1, mushrooms=None, trees=DEFAULT_TREES, water=DEFAULT_WATER,
+                   rocks=DEFAULT_ROCKS, items=DEFAULT_ITEMS, seed=None):
+    """Generate a level and a move string that clears it.
+
+    Densities are fractions of the cells off the witness path. `mushrooms`
+    is a count, defaulting to one per hundred inner cells. Returns the level
+    text in the `r = ..; c = ..` format and the witness moves.
+    """
+    if players not in (1, 2):
+        raise ValueError("A level has one or two players")
+    if min(trees, water, rocks, items) < 0 or trees + water + rocks + items > 1:
+        raise ValueError("Tile densities must be non-negative and add up to at most 1")
+    if rows < 2 + 2 * players or cols < 3:
+        raise ValueError(f"A {players}-player level needs at least {2 + 2 * players} rows and 3 columns")
+
+    rng = random.Random(seed)
+    inner = (rows - 2) * (cols - 2)
+    if mushrooms is None:
+        mushrooms = max(1, inner // 100)
+    regions = plan_regions(rows, cols, players)
+
+    # Each player gets an even share of the mushrooms in its own region
+    shares = [mushrooms // players + (number < mushrooms % players) for number in range(players)]
+    path = bytearray(rows * cols)
+    starts = []
+    targets = []
+    witness = []
+    for number, ((top, bottom), share) in enumerate(zip(regions, shares), 1):
+        width = cols - 2
+        area = (bottom - top + 1) * width
+        if share + 1 > area:
+            raise ValueError(f"Not enough room for {mushrooms} mushrooms")
+        picks = [(top + cell // width) * cols + 1 + cell % width for cell in rng.sample(range(area), share + 1)]
+        start, picks = picks[0], picks[1:]
+        path[start] = 1
+        starts.append(start)
+        targets.extend(picks)
+
+        band_height = max(1, math.isqrt(area // max(1, share)))
+        position = start
+        for goal in visit_order(picks, cols, band_height):
+            witness.extend(carve_path(path, position, goal, cols, PLAYER_KEYS[number], rng.random() < 0.5))
+            position = goal
+
+    # Fill everything off the path, then lay the path, mushrooms and players on top
+    tiles = [TREE, WATER, ROCK, AXE, FLAMETHROWER, EMPTY]
+    weights = [trees, water, rocks, items / 2, items / 2, 1 - trees - water - rocks - items]
+    board = bytearray([TREE]) * (rows * cols)
+    for y in range(1, rows - 1):
+        start = y * cols
+        row = bytes(rng.choices(tiles, weights, k=cols - 2))
+        board[start + 1:start + cols - 1] = row
+        for index in range(start + 1, start + cols - 1):
+            if path[index]:
+                board[index] = EMPTY
+    for index in targets:
+        board[index] = MUSHROOM
+    for index, tile in zip(starts, (PLAYER1, PLAYER2)):
+        board[index] = tile
+
+    lines = [board[start:start + cols].decode('ascii') for start in range(0, len(board), cols)]
+    text = f"r = {rows}; c = {cols}\n\n" + "\n".join(lines) + "\n"
+    return text, "".join(witness)
+
+
+def main():
+    parser = ArgumentParser(description="Generate a random Shroom Raider level that can always be cleared")
+    parser.add_argument('-r', '--rows', type=int, required=True, help='Number of rows, border included')
+    parser.add_argument('-c', '--cols', type=int, required=True, help='Number of columns, border included')
+    parser.add_argument('-p', '--players', type=int, choices=(1, 2), default=1, help='Number of players')
+    parser.add_argument('-m', '--mushrooms', type=int, help='Number of mushrooms (default: 1 per 100 cells)')
+    parser.add_argument('--trees', type=float, default=DEFAULT_TREES, help='Tree density off the witness path')
+    parser.add_argument('--water', type=float, default=DEFAULT_WATER, help='Water density off the witness path')
+    parser.add_argument('--rocks', type=float, default=DEFAULT_ROCKS, help='Rock density off the witness path')
+    parser.add_argument('--items', type=float, default=DEFAULT_ITEMS, help='Axe and flamethrower density')
+    parser.add_argument('-s', '--seed', type=int, help='Random seed')
+    parser.add_argument('-o', '--output', required=True, help='Level file to write')
+    parser.add_argument('-w', '--witness', help='Also write a winning move string to this file')
+    args = parser.parse_args()
+
+    try:
+        text, witness = generate_level(args.rows, args.cols, args.players, args.mushrooms, args.trees,
+                                       args.water, args.rocks, args.items, args.seed)
+    except ValueError as error:
+        parser.error(str(error))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write(text)
+    if args.witness:
+        with open(args.witness, 'w', encoding='utf-8') as f:
+            f.write(witness + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Writing terminal mode results.
+
+A result is the outcome, the board size and the board with both players
+placed, laid out like a level file:
+
+    Clear
+    r = 5; c = 10
+    TTTTTTTTTT
+    ...
+
+Tile IDs are already the level file's characters, so boards go out a row
+at a time straight from the game's bytes. write_board() writes one result
+into any binary stream, and open_output() turns an output target into
+such a stream: a file path, "-" for stdout, or an open stream like
+io.BytesIO.
+
+Batch runs can also gather every result into one file instead of one file
+each: ArchiveWriter stores each result as a member of a zip archive, and
+JsonLinesWriter as one JSON object per line.
+"""
+import sys
+import json
+from pathlib import Path
+from contextlib import contextmanager
+
+
+OUTPUT_BUFFER_SIZE = 1 << 16
+
+
+def write_board(stream, result, rows, cols, tiles, players=()):
+    """Write a result to a binary stream and return the number of bytes written.
+
+    `players` holds (board index, tile) pairs drawn over the board.
+    """
+    header = f"{result}\nr = {rows}; c = {cols}\n".encode('utf-8')
+    stream.write(header)
+    placed = {}
+    for index, tile in players:
+        placed.setdefault(index // cols, []).append((index % cols, tile))
+
+    for row in range(rows):
+        line = bytearray(tiles[row * cols:(row + 1) * cols])
+        for col, tile in placed.get(row, ()):
+            line[col] = tile
+        line += b"\n"
+        stream.write(line)
+    return len(header) + rows * (cols + 1)
+
+
+@contextmanager
+def open_output(target):
+    """A binary stream for an output target: a path, "-" for stdout, or an open stream"""
+    if target == '-':
+        stream = sys.stdout.buffer
+        try:
+            yield stream
+        finally:
+            stream.flush()
+    elif hasattr(target, 'write'):
+        yield target
+    else:
+        with open(target, 'wb', buffering=OUTPUT_BUFFER_SIZE) as stream:
+            yield stream
+
+
+class ResultsWriter:
+    """Collects many results, each under the name of the output it stands for.
+
+    Subclasses store a result with add(name, data), where data is
+    write_board() output.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+
+class ArchiveWriter(ResultsWriter):
+    """Results as the members of one zip archive"""
+    def __init__(self, path):
+        super().__init__(path)
+        # Only archives need zipfile, so single runs don't import it
+        import zipfile
+        self.archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, name, data):
+        self.archive.writestr(str(name), data)
+
+    def close(self):
+        self.archive.close()
+
+
+class JsonLinesWriter(ResultsWriter):
+    """Results as JSON objects, one per line"""
+    def __init__(self, path):
+        super().__init__(path)
+        self.file = open(path, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE)
+
+    def add(self, name, data):
+        lines = data.decode('utf-8').splitlines()
+        record = {"output": str(name), "result": lines[0], "size": lines[1], "board": lines[2:]}
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+RESULTS_WRITERS = {".zip": ArchiveWriter, ".jsonl": JsonLinesWriter, ".ndjson": JsonLinesWriter}
+
+
+def open_results(path):
+    """A ResultsWriter for a .zip or .jsonl file"""
+    writer = RESULTS_WRITERS.get(Path(path).suffix.lower())
+    if writer is None:
+        raise ValueError(f"Results file must end in one of {', '.join(RESULTS_WRITERS)}: {path}")
+    return writer(path)
@@ -0,0 +1,163 @@
+"""Reachability and dead-state analysis for Shroom Raider games.
+
+A game is dead once some mushroom left on the board can never be reached by
+either player. The analysis over-approximates what players could still do,
+so a game it calls dead really is dead; it never gives up on a game that
+could still be won.
+
+Cells stay open unless they are blocked for good:
+  - trees, once no axe or flamethrower is left anywhere, on the board or in hand
+  - rocks that are frozen: boxed in along both axes by the edge, blocked
+    trees or other frozen rocks, so they can never be pushed again
+  - water, once no rock is left that could still be pushed in to pave it
+Every other rock is assumed movable and every other tree cuttable.
+
+Players only move around inside the open area they are already in, so the
+analysis only has to be redone when that area may have shrunk: after a rock
+is pushed or a tool is used up.
+"""
+from shroom_raider import TREE, ROCK, WATER, MUSHROOM, AXE, FLAMETHROWER, grid_neighbours
+
+
+def held_tools(game):
+    """Axes and flamethrowers the players are holding"""
+    p1 = game.player1
+    p2 = game.player2
+    return p1["axe"] + p1["flamethrower"] + p2["axe"] + p2["flamethrower"]
+
+
+def frozen_rocks(game, trees_blocked, occupied):
+    """Rocks that can never be pushed again.
+
+    A rock cannot move along an axis when either neighbour on that axis is
+    blocked for good: the player cannot stand on one side, or the rock
+    cannot go to the other. The level's precomputed tables settle most rocks
+    at once; freezing one rock can freeze its neighbours, so the rest
+    repeats until nothing changes.
+    """
+    rows = game.rows
+    cols = game.cols
+    board = game.board
+    frozen = set()
+
+    def blocked(y, x):
+        if not (0 <= y < rows and 0 <= x < cols):
+            return True
+        index = y * cols + x
+        if index in occupied:
+            return False
+        return index in frozen or (trees_blocked and board[index] == TREE)
+
+    rocks = []
+    index = board.find(ROCK)
+    while index != -1:
+        # The cell a player stands on still shows the rock they pushed off it
+        if index not in occupied:
+            rocks.append(index)
+        index = board.find(ROCK, index + 1)
+    # Rocks on dead squares or in 2x2 blocks are stuck whatever happens elsewhere
+    for index in rocks:
+        if game.rock_stuck(index):
+            frozen.add(index)
+    changed = True
+    while changed:
+        changed = False
+        for index in rocks:
+            if index in frozen:
+                continue
+            y, x = divmod(index, cols)
+            if (blocked(y - 1, x) or blocked(y + 1, x)) and (blocked(y, x - 1) or blocked(y, x + 1)):
+                frozen.add(index)
+                changed = True
+    return frozen, len(rocks) > len(frozen)
+
+
+def unreachable_mushrooms(game):
+    """Board indices of mushrooms that neither player can ever reach"""
+    rows = game.rows
+    cols = game.cols
+    board = game.board
+    occupied = {game.player1["yPos"] * cols + game.player1["xPos"],
+                game.player2["yPos"] * cols + game.player2["xPos"]}
+
+    tools = held_tools(game) + game.restore_board.count(AXE) + game.restore_board.count(FLAMETHROWER)
+    trees_blocked = tools == 0
+    frozen, movable_rocks = frozen_rocks(game, trees_blocked, occupied)
+    water_blocked = not movable_rocks
+
+    def is_open(index):
+        if index in occupied:
+            return True
+        tile = board[index]
+        if tile == TREE:
+            return not trees_blocked
+        if tile == WATER:
+            return not water_blocked
+        return index not in frozen
+
+    reached = bytearray(rows * cols)
+    stack = list(occupied)
+    for index in stack:
+        reached[index] = 1
+    while stack:
+        for neighbour in grid_neighbours(stack.pop(), rows, cols):
+            if not reached[neighbour] and is_open(neighbour):
+                reached[neighbour] = 1
+                stack.append(neighbour)
+
+    mushrooms = []
+    index = board.find(MUSHROOM)
+    while index != -1:
+        # A mushroom under a player has already been collected
+        if not reached[index] and index not in occupied:
+            mushrooms.append(index)
+        index = board.find(MUSHROOM, index + 1)
+    return mushrooms
+
+
+def is_dead(game):
+    """Whether the game can no longer be won"""
+    return bool(unreachable_mushrooms(game))
+
+
+class DeadStateAnalyzer:
+    """Tracks whether a game can still be won, step by step.
+
+    Call update() after every step that was not blocked, pickups included,
+    so the tools in hand stay current; it only reruns the analysis when a rock
+    was pushed or a tool was used up since the last call. After a restart
+    or an undo, call refresh() instead.
+    """
+    def __init__(self, game):
+        self.game = game
+        self.refresh()
+
+    def refresh(self):
+        """Rerun the full analysis"""
+        game = self.game
+        self.positions = (game.player1["yPos"], game.player1["xPos"], game.player2["yPos"], game.player2["xPos"])
+        self.tools = held_tools(game)
+        self.dead = is_dead(game)
+        return self.dead
+
+    def update(self):
+        """Whether the game is dead after the latest step"""
+        game = self.game
+        p1 = game.player1
+        p2 = game.player2
+        positions = (p1["yPos"], p1["xPos"], p2["yPos"], p2["xPos"])
+        tools = held_tools(game)
+        if positions == self.positions and tools == self.tools:
+            return self.dead
+
+        # A pickup raises the count in hand; only a drop means a tool was used up
+        spent = tools < self.tools
+        self.tools = tools
+        # A player that pushed a rock ends up standing on the rock's old cell
+        cols = game.cols
+        pushed = (positions[:2] != self.positions[:2] and game.board[p1["yPos"] * cols + p1["xPos"]] == ROCK or
+                  positions[2:] != self.positions[2:] and game.board[p2["yPos"] * cols + p2["xPos"]] == ROCK)
+        self.positions = positions
+        if pushed or spent:
+            return self.refresh()
+        return self.dead
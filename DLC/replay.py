@@ -0,0 +1,207 @@
+"""Compact, seekable replay files for Shroom Raider runs.
+
+A replay holds the level it was played on, every action packed into four
+bits, and a zlib-compressed snapshot of the full game state every
+`snapshot_interval` actions. Seeking to move k restores the last snapshot
+at or before k and replays only the actions after it.
+
+File layout (little-endian):
+
+    header     magic, version, snapshot interval, action count, level size,
+               offsets of the action and snapshot index sections
+    level      the level text, with players in their starting places
+    snapshots  one after another, each a length-prefixed zlib stream of
+               GameState.export_state()
+    actions    action codes (indices into ACTION_KEYS), two per byte,
+               low nibble first
+    index      (action number, file offset) for every snapshot
+"""
+import os
+import mmap
+import zlib
+import struct
+from array import array
+from bisect import bisect_right
+from argparse import ArgumentParser
+
+from shroom_raider import GameState, ACTION_KEYS, LEAVE_TILE, EMPTY, PLAYER1, PLAYER2
+
+
+REPLAY_MAGIC = b"SRRP"
+REPLAY_VERSION = 1
+HEADER_FORMAT = struct.Struct('<4sHIQIQQ')
+SNAPSHOT_LENGTH = struct.Struct('<I')
+INDEX_ENTRY = struct.Struct('<QQ')
+DEFAULT_SNAPSHOT_INTERVAL = 256
+
+ACTION_CODES = {key: code for code, key in enumerate(ACTION_KEYS)}
+
+
+def level_text(game):
+    """The game's starting level in the r = ..; c = .. format"""
+    tiles = bytearray(game.initial_board)
+    for tile, player in ((PLAYER1, game.initial_player1), (PLAYER2, game.initial_player2)):
+        index = player["yPos"] * game.cols + player["xPos"]
+        # A level without this player puts it in the top-left corner over
+        # whatever tile is there; a player that was placed always stands on
+        # an empty cell
+        if index == 0 and tiles[0] != EMPTY:
+            continue
+        tiles[index] = tile
+    lines = [tiles[start:start + game.cols].decode('ascii') for start in range(0, len(tiles), game.cols)]
+    return f"r = {game.rows}; c = {game.cols}\n\n" + "\n".join(lines)
+
+
+class ReplayRecorder:
+    """Plays keys on a game and records them into a replay file"""
+    def __init__(self, replay_file, game, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        self.game = game
+        self.snapshot_interval = snapshot_interval
+        self.actions = bytearray()
+        self.action_count = 0
+        self.index = []
+        self.level = level_text(game).encode('utf-8')
+
+        self.file = open(replay_file, 'wb')
+        self.file.write(HEADER_FORMAT.pack(REPLAY_MAGIC, REPLAY_VERSION, snapshot_interval, 0, len(self.level), 0, 0))
+        self.file.write(self.level)
+        if game.move_count or game.board != game.initial_board or \
+           game.restore_board != game.initial_board.translate(LEAVE_TILE):
+            # Recording started mid-game, so the starting state is needed too
+            self.snapshot()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def play(self, key):
+        """Play a key on the game, recording it if it is an action key"""
+        code = ACTION_CODES.get(key)
+        if code is None:
+            return self.game.play_key(key)
+        result = self.game.play_key(key)
+        self.record(code)
+        return result
+
+    def record(self, code):
+        """Record an action code that was just applied to the game"""
+        if self.action_count % 2:
+            self.actions[-1] |= code << 4
+        else:
+            self.actions.append(code)
+        self.action_count += 1
+        if self.action_count % self.snapshot_interval == 0:
+            self.snapshot()
+
+    def snapshot(self):
+        """Write the full current state, tagged with the number of actions so far"""
+        data = zlib.compress(self.game.export_state())
+        self.index.append((self.action_count, self.file.tell()))
+        self.file.write(SNAPSHOT_LENGTH.pack(len(data)))
+        self.file.write(data)
+
+    def close(self):
+        """Write the actions and snapshot index, then fill in the header"""
+        if self.file.closed:
+            return
+        actions_offset = self.file.tell()
+        self.file.write(self.actions)
+        index_offset = self.file.tell()
+        for entry in self.index:
+            self.file.write(INDEX_ENTRY.pack(*entry))
+        self.file.seek(0)
+        self.file.write(HEADER_FORMAT.pack(REPLAY_MAGIC, REPLAY_VERSION, self.snapshot_interval,
+                                           self.action_count, len(self.level), actions_offset, index_offset))
+        self.file.close()
+
+
+class ReplayPlayer:
+    """Random access to the states of a recorded run"""
+    def __init__(self, replay_file):
+        with open(replay_file, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.snapshot_interval, self.action_count, level_size,
+         self.actions_offset, index_offset) = HEADER_FORMAT.unpack_from(self.data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{replay_file} is not a version {REPLAY_VERSION} replay")
+        if self.actions_offset == 0:
+            raise ValueError(f"{replay_file} was not closed properly")
+
+        start = HEADER_FORMAT.size
+        self.level = self.data[start:start + level_size].decode('utf-8')
+        self.snapshot_moves = array('Q')
+        self.snapshot_offsets = array('Q')
+        for position in range(index_offset, len(self.data), INDEX_ENTRY.size):
+            moves, offset = INDEX_ENTRY.unpack_from(self.data, position)
+            self.snapshot_moves.append(moves)
+            self.snapshot_offsets.append(offset)
+
+        self.game = GameState(self.level)
+        # Number of actions the game has been played to; None until the first seek
+        self.position = None
+
+    def __len__(self):
+        return self.action_count
+
+    def close(self):
+        self.data.close()
+
+    def action(self, number):
+        """Action code of the given action"""
+        if not 0 <= number < self.action_count:
+            raise IndexError(number)
+        byte = self.data[self.actions_offset + number // 2]
+        return byte >> 4 if number % 2 else byte & 0x0F
+
+    def keys(self, start=0, stop=None):
+        """Move string for actions start..stop"""
+        stop = self.action_count if stop is None else min(stop, self.action_count)
+        return "".join(ACTION_KEYS[self.action(number)] for number in range(start, stop))
+
+    def seek(self, moves):
+        """Put the game in the state after `moves` actions and return it"""
+        if not 0 <= moves <= self.action_count:
+            raise IndexError(moves)
+
+        # Start from the nearest snapshot unless carrying on forward is shorter
+        slot = bisect_right(self.snapshot_moves, moves) - 1
+        snapshot_moves = self.snapshot_moves[slot] if slot >= 0 else 0
+        if self.position is None or self.position > moves or self.position < snapshot_moves:
+            if slot >= 0:
+                offset = self.snapshot_offsets[slot]
+                (length,) = SNAPSHOT_LENGTH.unpack_from(self.data, offset)
+                start = offset + SNAPSHOT_LENGTH.size
+                self.game.import_state(zlib.decompress(self.data[start:start + length]))
+            else:
+                self.game.restart()
+            self.position = snapshot_moves
+
+        for number in range(self.position, moves):
+            self.game.play_key(ACTION_KEYS[self.action(number)])
+        self.position = moves
+        return self.game
+
+
+def main():
+    parser = ArgumentParser(description="Inspect a Shroom Raider replay file")
+    parser.add_argument('replay', help='Replay file')
+    parser.add_argument('-s', '--seek', type=int, help='Show the board after this many actions')
+    parser.add_argument('--moves', action='store_true', help='Print the recorded move string')
+    args = parser.parse_args()
+
+    player = ReplayPlayer(args.replay)
+    print(f"{len(player)} actions, {len(player.snapshot_moves)} snapshots, "
+          f"{os.path.getsize(args.replay)} bytes")
+    if args.moves:
+        print(player.keys())
+    if args.seek is not None:
+        game = player.seek(args.seek)
+        print(game.get_board_string())
+        print(f"Moves: {game.move_count}  Mushrooms: {game.total_mushrooms_collected}/{game.total_mushrooms}")
+    player.close()
+
+
+if __name__ == "__main__":
+    main()
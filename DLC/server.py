@@ -0,0 +1,239 @@
+"""Headless Shroom Raider server for many players at once.
+
+One asyncio process keeps every session's GameState in memory and serves
+them over TCP or a Unix socket. Requests and responses are JSON objects,
+one per line. Every request names a command:
+
+    create    {"cmd": "create", "stage": "Level3"} or {"cmd": "create", "level": "<level text>"}
+              (the default level when neither is given)
+    move      {"cmd": "move", "session": 1, "keys": "ddw"}   run lengths such as d3 are allowed;
+              moves stop when the game ends, and "played" says how many were made
+    pickup    {"cmd": "pickup", "session": 1, "player": 1}
+    restart   {"cmd": "restart", "session": 1}
+    snapshot  {"cmd": "snapshot", "session": 1}              board rows, players and counts
+    export    {"cmd": "export", "session": 1}                the terminal mode output file text
+    close     {"cmd": "close", "session": 1}
+
+Responses carry "ok", plus "error" when it is false. A request's "id", if
+it has one, is copied into its response.
+"""
+import json
+import asyncio
+from pathlib import Path
+from argparse import ArgumentParser
+
+from shroom_raider import GameState, MOVE_KEYS, load_level_file, expand_moves
+
+
+LEVELS_DIR = Path(__file__).resolve().parent / "levels"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_SESSIONS = 1000
+# Longest request line accepted, in bytes
+MAX_LINE = 1 << 20
+# Most moves played for one request, so a huge run length cannot stall other sessions
+MAX_MOVES_PER_REQUEST = 100_000
+# Characters a move request may contain: move keys, run lengths and spacing
+MOVE_CHARACTERS = set(MOVE_KEYS) | set("0123456789 \t\r\n")
+
+
+class RequestError(Exception):
+    """A request that cannot be carried out; reported back to the client"""
+
+
+class Session:
+    """One player's game and whether it has finished"""
+    def __init__(self, game):
+        self.game = game
+        self.result = None
+
+    def status(self):
+        game = self.game
+        return {
+            "result": self.result,
+            "moves": game.move_count,
+            "mushrooms_collected": game.total_mushrooms_collected,
+            "total_mushrooms": game.total_mushrooms,
+        }
+
+
+class GameServer:
+    """Sessions by id, and the commands that act on them"""
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, levels_dir=LEVELS_DIR):
+        self.max_sessions = max_sessions
+        self.levels_dir = Path(levels_dir)
+        self.sessions = {}
+        self.next_id = 1
+        self.commands = {
+            "create": self.create,
+            "move": self.move,
+            "pickup": self.pickup,
+            "restart": self.restart,
+            "snapshot": self.snapshot,
+            "export": self.export,
+            "close": self.close,
+        }
+
+    def handle(self, request):
+        """Carry out one decoded request and return the response"""
+        try:
+            if not isinstance(request, dict):
+                raise RequestError("Request must be a JSON object")
+            cmd = request.get("cmd")
+            command = self.commands.get(cmd) if isinstance(cmd, str) else None
+            if command is None:
+                raise RequestError(f"Unknown command {request.get('cmd')!r}; expected one of {sorted(self.commands)}")
+            response = {"ok": True, **command(request)}
+        except RequestError as error:
+            response = {"ok": False, "error": str(error)}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def handle_line(self, line):
+        """Carry out one request line and return the response line"""
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            response = {"ok": False, "error": f"Bad JSON: {error}"}
+        else:
+            response = self.handle(request)
+        return json.dumps(response) + "\n"
+
+    def session(self, request):
+        session_id = request.get("session")
+        # Ids are JSON integers; anything else, lists included, names no session
+        session = self.sessions.get(session_id) if type(session_id) is int else None
+        if session is None:
+            raise RequestError(f"No session {request.get('session')!r}")
+        return session
+
+    def load(self, request):
+        """Level data for a create request"""
+        if "level" in request:
+            if not isinstance(request["level"], str):
+                raise RequestError("level must be the level text")
+            return request["level"]
+        stage = request.get("stage")
+        if stage is None:
+            return None
+        # Only the shipped levels may be opened by name
+        if not isinstance(stage, str) or Path(stage).name != stage or \
+           not (self.levels_dir / f"{stage}.txt").is_file():
+            raise RequestError(f"No stage named {stage!r}")
+        return load_level_file(self.levels_dir / f"{stage}.txt")
+
+    def create(self, request):
+        if len(self.sessions) >= self.max_sessions:
+            raise RequestError(f"Server is full ({self.max_sessions} sessions)")
+        try:
+            game = GameState(self.load(request))
+        except (KeyError, ValueError, IndexError, TypeError) as error:
+            raise RequestError(f"Bad level: {error}") from error
+        session_id = self.next_id
+        self.next_id += 1
+        self.sessions[session_id] = Session(game)
+        return {"session": session_id, "rows": game.rows, "cols": game.cols, **self.sessions[session_id].status()}
+
+    def move(self, request):
+        session = self.session(request)
+        keys = request.get("keys")
+        if not isinstance(keys, str):
+            raise RequestError("move needs a string of keys")
+        keys = keys.lower()
+        unknown = set(keys) - MOVE_CHARACTERS
+        if unknown:
+            raise RequestError(f"Unknown move keys {''.join(sorted(unknown))!r}")
+        played = 0
+        for key in expand_moves(keys):
+            if session.result is not None or played == MAX_MOVES_PER_REQUEST:
+                break
+            result = session.game.move(*MOVE_KEYS[key])
+            played += 1
+            if result == 'win':
+                session.result = "Clear"
+            elif result == 'loss':
+                session.result = "No Clear"
+        return {"played": played, **session.status()}
+
+    def pickup(self, request):
+        session = self.session(request)
+        player = request.get("player", 1)
+        if player not in (1, 2):
+            raise RequestError("player must be 1 or 2")
+        picked = session.result is None and session.game.pickup_item(player)
+        return {"picked": picked, **session.status()}
+
+    def restart(self, request):
+        session = self.session(request)
+        session.game.restart()
+        session.result = None
+        return session.status()
+
+    def snapshot(self, request):
+        session = self.session(request)
+        game = session.game
+        players = [[player["yPos"], player["xPos"], player["axe"], player["flamethrower"]]
+                   for player in (game.player1, game.player2)]
+        return {"board": game.board_lines(), "players": players, **session.status()}
+
+    def export(self, request):
+        session = self.session(request)
+        return {"text": session.game.export_text(session.result or "No Clear")}
+
+    def close(self, request):
+        self.session(request)
+        del self.sessions[request["session"]]
+        return {}
+
+    async def serve_client(self, reader, writer):
+        """Answer one connection's requests in order until it closes"""
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than MAX_LINE; the stream cannot be resynchronised
+                    writer.write(b'{"ok": false, "error": "Request line too long"}\n')
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    writer.write(self.handle_line(line).encode('utf-8'))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        """Start listening and return the asyncio server"""
+        if unix_path:
+            return await asyncio.start_unix_server(self.serve_client, unix_path, limit=MAX_LINE)
+        return await asyncio.start_server(self.serve_client, host, port, limit=MAX_LINE)
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, max_sessions=DEFAULT_MAX_SESSIONS):
+    server = await GameServer(max_sessions).start(host, port, unix_path)
+    where = unix_path or ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    print(f"Serving Shroom Raider on {where}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = ArgumentParser(description="Serve Shroom Raider sessions over line-delimited JSON")
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='TCP port to listen on')
+    parser.add_argument('--unix', help='Listen on this Unix socket instead of TCP')
+    parser.add_argument('--max-sessions', type=int, default=DEFAULT_MAX_SESSIONS,
+                        help='Most sessions kept at once')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.max_sessions))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,27 @@
+import io
 import os
 import sys
-import copy
 import json
+import time
+import struct
+import mmap
+import hashlib
+from array import array
+from contextlib import contextmanager
+from itertools import repeat
+from bisect import insort
 from pathlib import Path
 from datetime import datetime
 from argparse import ArgumentParser
-from textual.app import App, ComposeResult
-from textual.screen import Screen
-from textual.widgets import Static, Button, Label, Header, Footer, Input
-from textual.containers import Container, Vertical, Horizontal, Grid, Center
-from textual.binding import Binding
-from rich.text import Text
-from rich.panel import Panel
-from rich.table import Table
+
+from output_writer import write_board, open_output, open_results
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl; lock the first byte of the lock file instead
+    fcntl = None
+    import msvcrt
 
 
 def parse_args():
@@ -20,833 +29,1609 @@ def parse_args():
     parser = ArgumentParser(description="Shroom Raider - Mushroom Collector Game")
     parser.add_argument('-f', '--file', help='Stage file path')
     parser.add_argument('-m', '--moves', help='String of moves')
-    parser.add_argument('-o', '--output', help='Output file path')
+    parser.add_argument('-M', '--moves-file',
+                        help='Read moves from this file ("-" for stdin), a chunk at a time')
+    parser.add_argument('--run-lengths', action='store_true',
+                        help='Let a count after a move repeat it, so d100w5 is a hundred d moves then five w moves')
+    parser.add_argument('-o', '--output', help='Output file path, "-" for stdout (batch summary file in batch mode)')
+    parser.add_argument('-b', '--batch', help='JSON Lines manifest of level/moves/output jobs')
+    parser.add_argument('-j', '--jobs', type=int, help='Number of worker processes for batch mode')
+    parser.add_argument('--results',
+                        help='In batch mode, gather every output into this one .zip or .jsonl file')
+    parser.add_argument('-r', '--replay', help='Record the terminal mode run to this replay file')
+    parser.add_argument('--stop-early', action='store_true',
+                        help='Stop as soon as the level can no longer be cleared; the output shows the board then')
+    parser.add_argument('--profile', action='store_true',
+                        help='Report terminal mode phase timings and engine counters on stderr')
+    parser.add_argument('--profile-json', metavar='FILE',
+                        help='Write the terminal mode profile as JSON to this file ("-" for stdout)')
     args = parser.parse_args()
-    
-    # Store the file path globally if provided for GUI mode
-    global STAGE_FILE_PATH
-    STAGE_FILE_PATH = args.file if args.file else None
-    
+    if args.profile_json == '-' and args.output == '-' and not args.batch:
+        parser.error('--profile-json - and -o - would both write to stdout')
     return args
 
-# Global variable to store stage file path
-STAGE_FILE_PATH = None
+
+def score_rank(entry):
+    """Sort key for leaderboard entries: fewest moves first"""
+    return entry["moves"]
 
 
 class LeaderboardManager:
-    """Manages the leaderboard system"""
-    def __init__(self, leaderboard_file="leaderboard/leaderboard.json"):
+    """Manages the leaderboard system.
+
+    Scores are kept in a JSON snapshot holding every level's full, sorted
+    history plus an append-only log of the scores recorded since. The log
+    opens with a digest of the snapshot it extends, so a log that was
+    already compacted into a newer snapshot is never replayed twice. New
+    scores are batched in memory and flushed to the log together. Several
+    processes can share one leaderboard directory: every flush takes a lock
+    file, first merges whatever other processes appended, and the snapshot
+    is only ever replaced with an atomic rename.
+    """
+    TOP_SCORES = 10
+    COMPACT_AFTER = 500
+
+    def __init__(self, leaderboard_file="leaderboard/leaderboard.json", flush_after=10, flush_interval=2.0):
         self.leaderboard_file = Path(leaderboard_file)
+        self.log_file = self.leaderboard_file.with_suffix(".log")
+        self.lock_file = self.leaderboard_file.with_suffix(".lock")
+        self.flush_after = flush_after
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.last_flush = time.monotonic()
         self.leaderboard_file.parent.mkdir(exist_ok=True)
-        self.load_leaderboard()
+        with self.locked():
+            self.load_leaderboard()
+    
+    @contextmanager
+    def locked(self):
+        """Hold the leaderboard's lock file for the duration of the block"""
+        with open(self.lock_file, 'a+b') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                else:
+                    lock.seek(0)
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+    
+    def snapshot_identity(self):
+        """Identifies the snapshot on disk, so a compaction by another process can be spotted"""
+        try:
+            stat = self.leaderboard_file.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
     
     def load_leaderboard(self):
-        """Load leaderboard from file"""
+        """Load the snapshot, then replay the log on top of it (call with the lock held)"""
         if self.leaderboard_file.exists():
-            with open(self.leaderboard_file, 'r') as f:
-                self.data = json.load(f)
+            with open(self.leaderboard_file, 'rb') as f:
+                content = f.read()
+            self.data = json.loads(content)
         else:
+            content = b""
             self.data = {}
+        self.snapshot_digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        for entries in self.data.values():
+            entries.sort(key=score_rank)
+        self.loaded_snapshot = self.snapshot_identity()
+        
+        self.log_offset = 0
+        self.logged_scores = 0
+        self.read_log()
+        for level_name, entry in self.pending:
+            self.insert_score(level_name, entry)
+    
+    def read_log(self):
+        """Merge log lines appended since the last read (call with the lock held)"""
+        if not self.log_file.exists():
+            return
+        stale = False
+        with open(self.log_file, 'rb') as f:
+            f.seek(self.log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A writer crashed mid-line; the next append terminates it
+                    break
+                self.log_offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "level" not in entry:
+                    if entry.get("snapshot") == self.snapshot_digest:
+                        continue
+                    # A compaction stopped before emptying the log, whose
+                    # scores are all in the snapshot already
+                    stale = True
+                    break
+                self.insert_score(entry.pop("level"), entry)
+                self.logged_scores += 1
+        if stale:
+            open(self.log_file, 'wb').close()
+            self.log_offset = 0
+    
+    def flush(self):
+        """Write batched scores to the log, merging scores other processes added"""
+        with self.locked():
+            if self.snapshot_identity() != self.loaded_snapshot or \
+               (self.log_file.exists() and self.log_file.stat().st_size < self.log_offset):
+                # Another process compacted the log; start again from its snapshot
+                self.load_leaderboard()
+            else:
+                self.read_log()
+            
+            if self.pending:
+                lines = "".join(json.dumps({"level": level_name, **entry}) + "\n"
+                                for level_name, entry in self.pending)
+                with open(self.log_file, 'ab') as f:
+                    if not f.tell():
+                        f.write(self.log_header())
+                    elif not self.ends_with_newline():
+                        f.write(b"\n")
+                    f.write(lines.encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self.log_offset = f.tell()
+                self.logged_scores += len(self.pending)
+                self.pending = []
+            
+            if self.logged_scores >= self.COMPACT_AFTER:
+                self.save_leaderboard()
+        self.last_flush = time.monotonic()
     
-    def save_leaderboard(self):
-        """Save leaderboard to file"""
-        with open(self.leaderboard_file, 'w') as f:
-            json.dump(self.data, f, indent=2)
+    def ends_with_newline(self):
+        """Whether the log's last byte ends a line"""
+        with open(self.log_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
     
-    def add_score(self, username, level_name, moves):
-        """Add a score to the leaderboard"""
-        if level_name not in self.data:
-            self.data[level_name] = []
-        
+    def log_header(self):
+        """First line of a log, naming the snapshot its scores go on top of"""
+        return (json.dumps({"snapshot": self.snapshot_digest}) + "\n").encode('utf-8')
+    
+    def save_leaderboard(self):
+        """Compact the log into the snapshot file (call with the lock held)"""
+        temp_file = self.leaderboard_file.with_suffix(f".{os.getpid()}.tmp")
+        content = json.dumps(self.data, indent=2).encode('utf-8')
+        with open(temp_file, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.leaderboard_file)
+        self.loaded_snapshot = self.snapshot_identity()
+        self.snapshot_digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        open(self.log_file, 'w').close()
+        self.log_offset = 0
+        self.logged_scores = 0
+    
+    def insert_score(self, level_name, entry):
+        """Insert an entry into a level's sorted history, after any equal scores"""
+        insort(self.data.setdefault(level_name, []), entry, key=score_rank)
+    
+    def add_score(self, username, level_name, moves, replay=None, stage=None):
+        """Add a score to the leaderboard.
+
+        `replay` is the key string that won the level, kept with the score so
+        the verifier can replay it later. `stage` is the stage file played,
+        for a level that is not one of the shipped ones.
+        """
         entry = {
             "username": username,
             "moves": moves,
             "timestamp": datetime.now().isoformat()
         }
+        if replay is not None:
+            entry["replay"] = replay
+        if stage is not None:
+            entry["stage"] = str(Path(stage).resolve())
         
-        self.data[level_name].append(entry)
-        self.data[level_name].sort(key=lambda x: x["moves"])
-        self.data[level_name] = self.data[level_name][:10]
-        self.save_leaderboard()
-    
-    def get_leaderboard(self, level_name):
-        """Get leaderboard for a specific level"""
-        return self.data.get(level_name, [])
+        self.insert_score(level_name, entry)
+        self.pending.append((level_name, entry))
+        if len(self.pending) >= self.flush_after or \
+           time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+    
+    def get_leaderboard(self, level_name, limit=TOP_SCORES):
+        """Get the best scores for a specific level"""
+        return self.data.get(level_name, [])[:limit]
+
+
+# ---------------------------- Tiles ---------------------------- #
+# Boards are stored as flat bytearrays of tile IDs. A tile's ID is simply its
+# character in the level file, so loading and exporting are byte copies and
+# the emoji are only produced when the board is rendered.
+
+EMPTY = ord(".")
+TREE = ord("T")
+MUSHROOM = ord("+")
+ROCK = ord("R")
+WATER = ord("~")
+PAVED = ord("-")
+AXE = ord("x")
+FLAMETHROWER = ord("*")
+PLAYER1 = ord("L")
+PLAYER2 = ord("O")
+
+TILE_EMOJI = {
+    EMPTY: "　",
+    TREE: "🌲",
+    MUSHROOM: "🍄",
+    ROCK: "🪨 ",
+    WATER: "🟦",
+    PAVED: "⬜",
+    AXE: "🪓",
+    FLAMETHROWER: "🔥",
+    PLAYER1: "🧑",
+    PLAYER2: "👩",
+}
+
+# Every byte that is not a tile is dropped while parsing a level line
+NON_TILE_BYTES = bytes(b for b in range(256) if b not in TILE_EMOJI)
+
+
+def make_tile_table(mapping, default):
+    """Build a 256-entry lookup table indexed by tile ID"""
+    table = [default] * 256
+    for tile, value in mapping.items():
+        table[tile] = value
+    return table
+
+
+# What happens when a player walks into a tile
+STEP, COLLECT, DROWN, PUSH, CHOP, BLOCK = range(6)
+MOVE_ACTION = make_tile_table({
+    EMPTY: STEP,
+    PAVED: STEP,
+    AXE: STEP,
+    FLAMETHROWER: STEP,
+    MUSHROOM: COLLECT,
+    WATER: DROWN,
+    ROCK: PUSH,
+    TREE: CHOP,
+}, BLOCK)
+
+# What the tile beyond a pushed rock becomes (0 means the push is blocked)
+PUSH_RESULT = make_tile_table({
+    EMPTY: ROCK,
+    PAVED: ROCK,
+    WATER: PAVED,
+}, 0)
+
+# What a tile from the initial board leaves behind once a player walks off it
+LEAVE_TILE = bytes(make_tile_table({
+    WATER: PAVED,
+    PAVED: PAVED,
+    AXE: AXE,
+    FLAMETHROWER: FLAMETHROWER,
+}, EMPTY))
+
+# --------------------------- Zobrist --------------------------- #
+# The state hash starts from a digest of the level and is updated by XOR-ing
+# keys in and out as single cells, positions and items change. Keys are
+# derived from (slot, value) with SplitMix64, so even huge maps need no table.
+
+MASK64 = (1 << 64) - 1
+RESTORE_KEYS = 256      # value offset for restore_board tiles
+POSITION_KEYS = 512     # value offset for player positions
+AXE_KEYS = 768          # value offset for axes held
+FLAMETHROWER_KEYS = 896 # value offset for flamethrowers held
+
+
+def zobrist_key(slot, value):
+    """Pseudo-random 64-bit key for one (slot, value) feature"""
+    z = (slot * 1024 + value + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+# Keys accepted in move strings
+MOVE_KEYS = {
+    'w': (-1, 0, 1),
+    's': (1, 0, 1),
+    'a': (0, -1, 1),
+    'd': (0, 1, 1),
+    'i': (-1, 0, 2),
+    'k': (1, 0, 2),
+    'j': (0, -1, 2),
+    'l': (0, 1, 2),
+}
+PICKUP_KEYS = {'p': 1, 'o': 2}
+# An action's code is its index in ACTION_KEYS
+ACTION_KEYS = "".join(MOVE_KEYS) + "".join(PICKUP_KEYS)
+STEP_KEYS = {move: key for key, move in MOVE_KEYS.items()}
+
+# Player fields, move count and mushrooms collected, ahead of the board and
+# restore_board bytes in an exported state
+STATE_FORMAT = struct.Struct('<10I')
+# Rows per chunk of a snapshot; unchanged chunks are shared between snapshots
+SNAPSHOT_CHUNK_ROWS = 32
+# A TreeLabels chunk holds 1 << LABEL_CHUNK_BITS cells
+LABEL_CHUNK_BITS = 10
+LABEL_CHUNK_MASK = (1 << LABEL_CHUNK_BITS) - 1
+
+DEFAULT_LEVEL = """r = 5; c = 10
+
+TTTTTTTTTT
+T........T
+T..L...O.T
+T..++....T
+TTTTTTTTTT"""
+
+
+# ------------------------ Compiled levels ----------------------- #
+# Parsing a level and labelling its trees is done once per level content.
+# The result is cached on disk as a flat binary file named after the
+# content hash, so replaying or reopening an unchanged level only maps that
+# file and copies its arrays. SHROOM_RAIDER_LEVEL_CACHE moves the cache
+# somewhere else, e.g. for test runs.
+
+LEVEL_CACHE_DIR = Path(os.environ.get("SHROOM_RAIDER_LEVEL_CACHE") or Path(__file__).resolve().parent / "level_cache")
+LEVEL_FORMAT = struct.Struct('<4sHIIIIIIIIII')
+LEVEL_MAGIC = b"SRLV"
+LEVEL_VERSION = 2
+# 1 for a tree and 0 for anything else
+TREE_WALL = bytes(make_tile_table({TREE: 1}, 0))
+COMPILED_LEVELS = {}
+COMPILED_LEVELS_KEPT = 64
+
+
+def grid_neighbours(index, rows, cols):
+    """Board indices orthogonally next to a board index"""
+    y, x = divmod(index, cols)
+    cells = []
+    if y > 0:
+        cells.append(index - cols)
+    if y < rows - 1:
+        cells.append(index + cols)
+    if x > 0:
+        cells.append(index - 1)
+    if x < cols - 1:
+        cells.append(index + 1)
+    return cells
+
+
+def label_tree_components(board, rows, cols):
+    """Label every connected group of trees on a board.
+
+    Returns an array mapping each cell to its group (0 for no tree) and a
+    list mapping each label to the cells it started with.
+    """
+    labels = array('I', bytes(4 * len(board)))
+    components = [()]
+    index = board.find(TREE)
+    while index != -1:
+        if not labels[index]:
+            label = len(components)
+            labels[index] = label
+            members = [index]
+            for cell in members:
+                for neighbour in grid_neighbours(cell, rows, cols):
+                    if board[neighbour] == TREE and not labels[neighbour]:
+                        labels[neighbour] = label
+                        members.append(neighbour)
+            components.append(tuple(members))
+        index = board.find(TREE, index + 1)
+    return labels, components
+
+
+class TreeLabels:
+    """The tree group label of every cell, split into chunks that copies share.
+
+    copy() shares every chunk, and the first write to a chunk copies only
+    that chunk, so relabelling a group after a cut or burn costs about the
+    group's cells, not the whole board. Snapshots keep the labels they were
+    taken with, so labels are copied before they are written.
+    """
+    __slots__ = ("chunks", "owned", "size")
+
+    def __init__(self, labels):
+        step = 1 << LABEL_CHUNK_BITS
+        self.chunks = [labels[start:start + step] for start in range(0, len(labels), step)]
+        # Chunks only this object holds, which it can write in place
+        self.owned = set()
+        self.size = len(labels)
+
+    def copy(self):
+        """Labels sharing every chunk with these"""
+        other = TreeLabels.__new__(TreeLabels)
+        other.chunks = list(self.chunks)
+        other.owned = set()
+        other.size = self.size
+        self.owned = set()
+        return other
+
+    def __getitem__(self, index):
+        return self.chunks[index >> LABEL_CHUNK_BITS][index & LABEL_CHUNK_MASK]
+
+    def __setitem__(self, index, label):
+        number = index >> LABEL_CHUNK_BITS
+        if number not in self.owned:
+            self.chunks[number] = self.chunks[number][:]
+            self.owned.add(number)
+        self.chunks[number][index & LABEL_CHUNK_MASK] = label
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+
+    def tobytes(self):
+        return b"".join(chunk.tobytes() for chunk in self.chunks)
+
+
+def find_dead_squares(board, rows, cols, has_tools, starts):
+    """Cells a rock can never be pushed out of, from the level's fixed walls alone.
+
+    Fixed walls are the board's edges, plus every tree when the level has no
+    axe or flamethrower to clear one, except under the players' starting
+    cells (a missing player starts in the corner, whatever is there). A rock
+    with a fixed wall on one side of both axes is stuck: the player can
+    never get behind it, or it can never go forward. Returns (fixed walls,
+    dead squares), one 0/1 byte per cell.
+    """
+    size = len(board)
+    walls = bytearray(board.translate(TREE_WALL) if not has_tools else bytes(size))
+    for y, x in starts:
+        walls[y * cols + x] = 0
+
+    # Treat each byte array as one big integer, so shifting by a byte moves
+    # every cell one column and shifting by a row moves it one row
+    def as_int(cells):
+        return int.from_bytes(cells, 'little')
+
+    shift = 8 * cols
+    wall = as_int(walls)
+    first_row = as_int(b"\x01" * cols + bytes(size - cols))
+    last_row = as_int(bytes(size - cols) + b"\x01" * cols)
+    first_col = as_int((b"\x01" + bytes(cols - 1)) * rows)
+    last_col = as_int((bytes(cols - 1) + b"\x01") * rows)
+
+    vertical = (wall << shift) | first_row | (wall >> shift) | last_row
+    # A cell on a row's edge picks up the next row's cell here, but it is marked blocked anyway
+    horizontal = (wall << 8) | first_col | (wall >> 8) | last_col
+    dead = vertical & horizontal & ~wall & as_int(b"\x01" * size)
+    return bytes(walls), dead.to_bytes(size, 'little')
+
+
+class CompiledLevel:
+    """A parsed level: its tiles plus everything worked out from them up front"""
+    def __init__(self, rows, cols, board, player1, player2, items, tree_labels, tree_components,
+                 fixed_walls, dead_squares):
+        self.rows = rows
+        self.cols = cols
+        self.board = board
+        self.player1 = player1
+        self.player2 = player2
+        self.mushrooms = board.count(MUSHROOM)
+        self.items = items
+        self.tree_labels = tree_labels
+        self.tree_components = tree_components
+        self.fixed_walls = fixed_walls
+        self.dead_squares = dead_squares
+
+    def to_bytes(self):
+        """Serialise the level: header, board, item cells, tree labels, tree groups, then rock tables"""
+        offsets = array('I', [0])
+        cells = array('I')
+        for component in self.tree_components[1:]:
+            cells.extend(component)
+            offsets.append(len(cells))
+        header = LEVEL_FORMAT.pack(LEVEL_MAGIC, LEVEL_VERSION, self.rows, self.cols,
+                                   *self.player1, *self.player2,
+                                   len(self.items), len(self.tree_components) - 1, len(cells), 0)
+        return b"".join((header, self.board, array('I', self.items).tobytes(),
+                         self.tree_labels.tobytes(), offsets.tobytes(), cells.tobytes(),
+                         self.fixed_walls, self.dead_squares))
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Rebuild a level from to_bytes() output without parsing any text"""
+        (magic, version, rows, cols, p1_y, p1_x, p2_y, p2_x,
+         item_count, component_count, cell_count, _) = LEVEL_FORMAT.unpack_from(buffer)
+        if magic != LEVEL_MAGIC or version != LEVEL_VERSION:
+            raise ValueError("Not a compiled level of this version")
+
+        view = memoryview(buffer)
+        position = LEVEL_FORMAT.size
+        size = rows * cols
+
+        def take(length, typecode=None):
+            nonlocal position
+            length *= 1 if typecode is None else 4
+            chunk = view[position:position + length]
+            position += length
+            if typecode is None:
+                return bytes(chunk)
+            values = array(typecode)
+            values.frombytes(chunk)
+            return values
+
+        board = take(size)
+        items = tuple(take(item_count, 'I'))
+        labels = take(size, 'I')
+        offsets = take(component_count + 1, 'I')
+        cells = take(cell_count, 'I')
+        fixed_walls = take(size)
+        dead_squares = take(size)
+        components = [()] + [tuple(cells[offsets[i]:offsets[i + 1]]) for i in range(component_count)]
+        view.release()
+        return cls(rows, cols, board, (p1_y, p1_x), (p2_y, p2_x), items, labels, components,
+                   fixed_walls, dead_squares)
+
+
+def compile_level(level_data):
+    """Parse level text into a CompiledLevel"""
+    rows = []
+    for line in level_data.strip().split('\n'):
+        if line.startswith('r ='):
+            continue
+        row = line.encode('utf-8').translate(None, NON_TILE_BYTES)
+        if row:
+            rows.append(row)
+
+    if not rows or any(len(row) != len(rows[0]) for row in rows):
+        raise ValueError("Level rows must all have the same width")
+
+    row_count = len(rows)
+    col_count = len(rows[0])
+    board = bytearray(b"".join(rows))
+
+    # Players are tracked on their own, not on the board itself; a missing
+    # player starts in the top-left corner
+    positions = []
+    for tile in (PLAYER1, PLAYER2):
+        index = board.rfind(tile)
+        if index == -1:
+            positions.append((0, 0))
+        else:
+            positions.append(divmod(index, col_count))
+            board[index] = EMPTY
+
+    board = bytes(board)
+    items = tuple(index for index, tile in enumerate(board) if tile == AXE or tile == FLAMETHROWER)
+    labels, components = label_tree_components(board, row_count, col_count)
+    fixed_walls, dead_squares = find_dead_squares(board, row_count, col_count, bool(items), positions)
+    return CompiledLevel(row_count, col_count, board, positions[0], positions[1], items, labels, components,
+                         fixed_walls, dead_squares)
+
+
+def load_level_file(stage_file, cache_dir=None):
+    """Load a level file, reusing its compiled copy for as long as its content is unchanged.
+
+    The compiled copy lives in cache_dir, LEVEL_CACHE_DIR by default; an
+    empty cache_dir skips the disk cache.
+    """
+    if cache_dir is None:
+        cache_dir = LEVEL_CACHE_DIR
+    with open(stage_file, 'rb') as f:
+        content = f.read()
+    digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+
+    level = COMPILED_LEVELS.get(digest)
+    if level is not None:
+        return level
+
+    cache_file = Path(cache_dir) / f"{digest}.lvl" if cache_dir else None
+    try:
+        with open(cache_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            level = CompiledLevel.from_buffer(mapped)
+    except (OSError, TypeError, ValueError, struct.error):
+        level = compile_level(content.decode('utf-8') or DEFAULT_LEVEL)
+        if cache_file:
+            try:
+                cache_file.parent.mkdir(exist_ok=True)
+                temp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+                temp_file.write_bytes(level.to_bytes())
+                os.replace(temp_file, cache_file)
+            except OSError:
+                # The cache is only a speed-up, so a read-only install just skips it
+                pass
+
+    if len(COMPILED_LEVELS) >= COMPILED_LEVELS_KEPT:
+        COMPILED_LEVELS.pop(next(iter(COMPILED_LEVELS)))
+    COMPILED_LEVELS[digest] = level
+    return level
+
+
+# --------------------------- Snapshots -------------------------- #
+# A snapshot keeps both boards as tuples of chunks, each chunk a tuple of
+# row bytes. The next snapshot of the same game only copies the rows that
+# changed since, plus the chunk tuples holding them, and shares every other
+# row and chunk, so a snapshot after a move costs about one row's width
+# rather than the whole board.
+
+def chunk_rows(buffer, rows, cols):
+    """A board buffer as a tuple of chunks of row bytes"""
+    row_bytes = [bytes(buffer[row * cols:(row + 1) * cols]) for row in range(rows)]
+    return tuple(tuple(row_bytes[start:start + SNAPSHOT_CHUNK_ROWS])
+                 for start in range(0, rows, SNAPSHOT_CHUNK_ROWS))
+
+
+def update_chunks(chunks, buffer, changed_rows, cols):
+    """Chunks with the changed rows read again from a board buffer, sharing the rest.
+
+    A changed row whose bytes came out the same keeps its old object, so it
+    stays shared too.
+    """
+    chunks = list(chunks)
+    edited = {}
+    for row in changed_rows:
+        number, offset = divmod(row, SNAPSHOT_CHUNK_ROWS)
+        chunk = edited.get(number)
+        if chunk is None:
+            chunk = edited[number] = list(chunks[number])
+        tiles = buffer[row * cols:(row + 1) * cols]
+        if tiles != chunk[offset]:
+            chunk[offset] = bytes(tiles)
+    for number, chunk in edited.items():
+        chunks[number] = tuple(chunk)
+    return tuple(chunks)
+
+
+def write_changed_rows(buffer, current, target, cols):
+    """Copy the rows of target that are not shared with current into a board buffer.
+
+    Returns the rows written.
+    """
+    written = []
+    for number, (old_chunk, new_chunk) in enumerate(zip(current, target)):
+        if old_chunk is new_chunk:
+            continue
+        for row, (old, new) in enumerate(zip(old_chunk, new_chunk), number * SNAPSHOT_CHUNK_ROWS):
+            if old is not new:
+                buffer[row * cols:(row + 1) * cols] = new
+                written.append(row)
+    return written
+
+
+class BoardSnapshot:
+    """Immutable state of a game, made by GameState.snapshot()"""
+    __slots__ = ("board", "restore_board", "scalars")
+
+    def __init__(self, board, restore_board, scalars):
+        self.board = board
+        self.restore_board = restore_board
+        # GameState.scalar_state() at the time of the snapshot
+        self.scalars = scalars
+
+    @property
+    def mushrooms_collected(self):
+        return self.scalars[9]
+
+    def board_bytes(self):
+        """The board as one flat bytes object"""
+        return b"".join(b"".join(chunk) for chunk in self.board)
 
 
 class GameState:
     """Manages the game state and logic"""
-    def __init__(self, level_data=None):
+    def __init__(self, level_data=None, journal=False):
         self.move_count = 0
         self.total_mushrooms_collected = 0
-        if level_data:
+        if isinstance(level_data, CompiledLevel):
+            self.load_compiled(level_data)
+        elif level_data:
             self.load_level(level_data)
         else:
             self.load_default_level()
-        
-        self.initial_player1 = copy.deepcopy(self.player1)
-        self.initial_player2 = copy.deepcopy(self.player2)
-        self.initial_board = copy.deepcopy(self.display_board)
-        self.toggle_board = copy.deepcopy(self.display_board)
+
+        self.initial_player1 = dict(self.player1)
+        self.initial_player2 = dict(self.player2)
+        self.initial_board = bytes(self.board)
+        # What each cell turns back into when a player leaves it; picking up
+        # an item clears its cell here
+        self.restore_board = bytearray(self.initial_board.translate(LEAVE_TILE))
         self.total_mushrooms = self.player1["win"]
-    
+        level_digest = hashlib.blake2b(self.initial_board, digest_size=8)
+        level_digest.update(struct.pack('<IIII', self.player1["yPos"], self.player1["xPos"],
+                                        self.player2["yPos"], self.player2["xPos"]))
+        self.initial_zobrist = int.from_bytes(level_digest.digest(), 'little')
+        self.zobrist = self.initial_zobrist
+        # Labels are copy-on-write, so every game state can share these
+        self.initial_tree_labels = TreeLabels(self.level.tree_labels)
+        self.tree_components = list(self.level.tree_components)
+        self.tree_labels = self.initial_tree_labels
+
+        # With a journal, every move or pickup records only the cells it
+        # changed, which gives undo/redo and restarts that cost O(changes)
+        self.history = [] if journal else None
+        self.future = []
+        # Whether undoing the whole journal gets back to the level start;
+        # import_state(), restore() and fork() begin a journal partway
+        # through a game
+        self.journal_from_start = True
+        self.step_cells = None
+
+        # Rows whose tiles or players changed since the renderer last looked
+        self.dirty_rows = set(range(self.rows))
+        # The last snapshot taken or restored, and the rows of either board
+        # changed since; the next snapshot only copies those rows
+        self.snapshot_base = None
+        self.changed_rows = set()
+
     def load_default_level(self):
         """Load the default level (Level 0)"""
-        self.player1 = {
-            "xPos": 2,
-            "yPos": 2,
-            "axe": 0,
-            "flamethrower": 0,
-            "win": 2
-        }
-        
-        self.player2 = {
-            "xPos": 7,
-            "yPos": 2,
-            "axe": 0,
-            "flamethrower": 0,
-            "win": 2
-        }
-        
-        self.display_board = [
-            ["🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲"],
-            ["🌲", "　", "　", "　", "　", "　", "　", "　", "　", "🌲"],
-            ["🌲", "　", "🧑", "　", "　", "　", "　", "👩", "　", "🌲"],
-            ["🌲", "　", "　", "　", "🍄", "🍄", "　", "　", "　", "🌲"],
-            ["🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲"]
-        ]
-    
+        self.load_level(DEFAULT_LEVEL)
+
     def load_level(self, level_data):
         """Load a level from string data"""
-        lines = level_data.strip().split('\n')
-        board_lines = [line for line in lines if line.strip() and not line.startswith('r =')]
-        
-        row = 0
-        display_board = []
-        mushroom_count = 0
-        
-        self.player1 = {
-            "xPos": 0,
-            "yPos": 0,
-            "axe": 0,
-            "flamethrower": 0,
-            "win": 0
-        }
-        
-        self.player2 = {
-            "xPos": 0,
-            "yPos": 0,
-            "axe": 0,
-            "flamethrower": 0,
-            "win": 0
-        }
-        
-        for line in board_lines:
-            col = 0
-            row_constructor = []
-            for char in line:
-                if char == "L":
-                    self.player1["xPos"] = col
-                    self.player1["yPos"] = row
-                    row_constructor.append("🧑")
-                elif char == "O":
-                    self.player2["xPos"] = col
-                    self.player2["yPos"] = row
-                    row_constructor.append("👩")
-                elif char == "+":
-                    mushroom_count += 1
-                    row_constructor.append("🍄")
-                elif char == ".":
-                    row_constructor.append("　")
-                elif char == "T":
-                    row_constructor.append("🌲")
-                elif char == "R":
-                    row_constructor.append("🪨 ")
-                elif char == "~":
-                    row_constructor.append("🟦")
-                elif char == "-":
-                    row_constructor.append("⬜")
-                elif char == "x":
-                    row_constructor.append("🪓")
-                elif char == "*":
-                    row_constructor.append("🔥")
-                col += 1
-            if row_constructor:
-                display_board.append(row_constructor)
-                row += 1
-        
-        self.player1["win"] = mushroom_count
-        self.player2["win"] = mushroom_count
-        self.display_board = display_board
-    
+        self.load_compiled(compile_level(level_data))
+
+    def load_compiled(self, level):
+        """Load an already compiled level"""
+        self.level = level
+        self.rows = level.rows
+        self.cols = level.cols
+        self.board = bytearray(level.board)
+        self.player1 = {"xPos": level.player1[1], "yPos": level.player1[0], "axe": 0, "flamethrower": 0, "win": level.mushrooms}
+        self.player2 = {"xPos": level.player2[1], "yPos": level.player2[0], "axe": 0, "flamethrower": 0, "win": level.mushrooms}
+
     def restart(self):
         """Reset the game to initial state"""
+        if self.history is not None:
+            if self.journal_from_start:
+                while self.undo():
+                    pass
+                self.future.clear()
+                return
+            self.history.clear()
+            self.future.clear()
+            self.journal_from_start = True
+        self.dirty_rows.update(range(self.rows))
         self.move_count = 0
         self.total_mushrooms_collected = 0
-        self.player1 = copy.deepcopy(self.initial_player1)
-        self.player2 = copy.deepcopy(self.initial_player2)
-        self.display_board = copy.deepcopy(self.initial_board)
-        self.toggle_board = copy.deepcopy(self.initial_board)
-    
+        self.player1 = dict(self.initial_player1)
+        self.player2 = dict(self.initial_player2)
+        self.board[:] = self.initial_board
+        self.restore_board[:] = self.initial_board.translate(LEAVE_TILE)
+        self.zobrist = self.initial_zobrist
+        self.tree_labels = self.initial_tree_labels
+        self.snapshot_base = None
+
+    def scalar_state(self):
+        """Everything a step can change apart from board cells"""
+        p1 = self.player1
+        p2 = self.player2
+        return (p1["yPos"], p1["xPos"], p1["axe"], p1["flamethrower"],
+                p2["yPos"], p2["xPos"], p2["axe"], p2["flamethrower"],
+                self.move_count, self.total_mushrooms_collected, self.zobrist, self.tree_labels)
+
+    def set_scalar_state(self, state):
+        """Put back values captured by scalar_state()"""
+        p1 = self.player1
+        p2 = self.player2
+        self.dirty_rows.update((p1["yPos"], p2["yPos"], state[0], state[4]))
+        p1["yPos"], p1["xPos"], p1["axe"], p1["flamethrower"] = state[0:4]
+        p2["yPos"], p2["xPos"], p2["axe"], p2["flamethrower"] = state[4:8]
+        self.move_count, self.total_mushrooms_collected, self.zobrist, self.tree_labels = state[8:]
+
+    def export_state(self):
+        """The whole game state as bytes, for import_state() on a game of the same level"""
+        p1 = self.player1
+        p2 = self.player2
+        fields = STATE_FORMAT.pack(p1["yPos"], p1["xPos"], p1["axe"], p1["flamethrower"],
+                                   p2["yPos"], p2["xPos"], p2["axe"], p2["flamethrower"],
+                                   self.move_count, self.total_mushrooms_collected)
+        return fields + bytes(self.board) + bytes(self.restore_board)
+
+    def import_state(self, data):
+        """Load a state made by export_state(), dropping any undo history"""
+        fields = STATE_FORMAT.unpack_from(data)
+        size = self.rows * self.cols
+        if len(data) != STATE_FORMAT.size + 2 * size:
+            raise ValueError("State does not match this level's size")
+        p1 = self.player1
+        p2 = self.player2
+        p1["yPos"], p1["xPos"], p1["axe"], p1["flamethrower"] = fields[0:4]
+        p2["yPos"], p2["xPos"], p2["axe"], p2["flamethrower"] = fields[4:8]
+        self.move_count, self.total_mushrooms_collected = fields[8:]
+        self.board[:] = data[STATE_FORMAT.size:STATE_FORMAT.size + size]
+        self.restore_board[:] = data[STATE_FORMAT.size + size:]
+
+        # A tree a player has cut stays drawn under them but no longer joins groups
+        trees = bytearray(self.board)
+        for player in (p1, p2):
+            index = player["yPos"] * self.cols + player["xPos"]
+            if trees[index] == TREE:
+                trees[index] = EMPTY
+        # New labels go after the existing ones, since old label arrays
+        # (such as the initial one) still point into tree_components
+        labels, components = label_tree_components(trees, self.rows, self.cols)
+        offset = len(self.tree_components) - 1
+        self.tree_labels = TreeLabels(array('I', (label + offset if label else 0 for label in labels)))
+        self.tree_components.extend(components[1:])
+        self.zobrist = self.compute_zobrist()
+        self.dirty_rows.update(range(self.rows))
+        self.snapshot_base = None
+        if self.history is not None:
+            self.history.clear()
+            self.future.clear()
+            self.journal_from_start = False
+
+    def compute_zobrist(self):
+        """Work the state hash out from scratch by comparing with the initial state"""
+        zobrist = self.initial_zobrist
+        for index, (old, new) in enumerate(zip(self.initial_board, self.board)):
+            if old != new:
+                zobrist ^= zobrist_key(index, old) ^ zobrist_key(index, new)
+        initial_restore = self.initial_board.translate(LEAVE_TILE)
+        for index, (old, new) in enumerate(zip(initial_restore, self.restore_board)):
+            if old != new:
+                zobrist ^= zobrist_key(index, RESTORE_KEYS + old) ^ zobrist_key(index, RESTORE_KEYS + new)
+        for slot, player, initial in ((1, self.player1, self.initial_player1), (2, self.player2, self.initial_player2)):
+            value = POSITION_KEYS + slot
+            zobrist ^= zobrist_key(initial["yPos"] * self.cols + initial["xPos"], value)
+            zobrist ^= zobrist_key(player["yPos"] * self.cols + player["xPos"], value)
+            zobrist ^= zobrist_key(slot, AXE_KEYS) ^ zobrist_key(slot, AXE_KEYS + player["axe"])
+            zobrist ^= zobrist_key(slot, FLAMETHROWER_KEYS) ^ zobrist_key(slot, FLAMETHROWER_KEYS + player["flamethrower"])
+        return zobrist
+
+    def begin_step(self):
+        """Start recording a move or pickup in the journal"""
+        if self.history is not None:
+            self.step_cells = []
+            self.step_start = self.scalar_state()
+
+    def end_step(self, result):
+        """Finish recording a step, keeping it only if it changed anything"""
+        if self.step_cells is None:
+            return
+        if result and result != 'blocked':
+            self.history.append((self.step_cells, self.step_start, self.scalar_state(), result))
+            self.future.clear()
+        self.step_cells = None
+
+    def undo(self):
+        """Take back the last journaled step, returning False if there is none"""
+        if not self.history:
+            return False
+        step = self.history.pop()
+        cells, before, _, _ = step
+        for buffer, index, old, _ in reversed(cells):
+            buffer[index] = old
+            self.dirty_rows.add(index // self.cols)
+            self.changed_rows.add(index // self.cols)
+        self.set_scalar_state(before)
+        self.future.append(step)
+        return True
+
+    def redo(self):
+        """Replay the last undone step, returning its original result or False if there is none"""
+        if not self.future:
+            return False
+        step = self.future.pop()
+        cells, _, after, result = step
+        for buffer, index, _, new in cells:
+            buffer[index] = new
+            self.dirty_rows.add(index // self.cols)
+            self.changed_rows.add(index // self.cols)
+        self.set_scalar_state(after)
+        self.history.append(step)
+        return result
+
+    def snapshot(self):
+        """An immutable BoardSnapshot of the current state.
+
+        Only the rows changed since the last snapshot are copied; the rest
+        are shared with it.
+        """
+        base = self.snapshot_base
+        if base is None:
+            board = chunk_rows(self.board, self.rows, self.cols)
+            restore_board = chunk_rows(self.restore_board, self.rows, self.cols)
+        elif self.changed_rows:
+            board = update_chunks(base.board, self.board, self.changed_rows, self.cols)
+            restore_board = update_chunks(base.restore_board, self.restore_board, self.changed_rows, self.cols)
+        else:
+            board = base.board
+            restore_board = base.restore_board
+        self.changed_rows.clear()
+        self.snapshot_base = BoardSnapshot(board, restore_board, self.scalar_state())
+        return self.snapshot_base
+
+    def restore(self, snapshot):
+        """Put the game back into a snapshot of it or of one of its forks, dropping any undo history.
+
+        Only rows that the snapshot does not share with the current state
+        are written.
+        """
+        current = self.snapshot()
+        for buffer, rows, target in ((self.board, current.board, snapshot.board),
+                                     (self.restore_board, current.restore_board, snapshot.restore_board)):
+            self.dirty_rows.update(write_changed_rows(buffer, rows, target, self.cols))
+        self.set_scalar_state(snapshot.scalars)
+        self.snapshot_base = snapshot
+        if self.history is not None:
+            self.history.clear()
+            self.future.clear()
+            self.journal_from_start = False
+
+    def fork(self):
+        """A separate game in this game's current state, for what-if play.
+
+        Both games start from the same snapshot, so their own snapshots keep
+        sharing the rows neither has changed.
+        """
+        snapshot = self.snapshot()
+        game = GameState(self.level, journal=self.history is not None)
+        game.board[:] = self.board
+        game.restore_board[:] = self.restore_board
+        # Labels are never reused, so forks can share one list of tree groups
+        # and restore each other's snapshots
+        game.tree_components = self.tree_components
+        game.set_scalar_state(snapshot.scalars)
+        game.snapshot_base = snapshot
+        game.journal_from_start = False
+        return game
+
+    def history_keys(self):
+        """The keys that replay the journaled steps from the start of the level.
+
+        Blocked moves and undone steps are left out, so this is the shortest
+        key string that reaches the current state the same way.
+        """
+        keys = []
+        for _, before, after, _ in self.history:
+            if before[0:2] != after[0:2]:
+                keys.append(STEP_KEYS[after[0] - before[0], after[1] - before[1], 1])
+            elif before[4:6] != after[4:6]:
+                keys.append(STEP_KEYS[after[4] - before[4], after[5] - before[5], 2])
+            else:
+                # A pickup only changes the items of the player who made it
+                keys.append('p' if before[2:4] != after[2:4] else 'o')
+        return "".join(keys)
+
+    def state_key(self):
+        """Compact immutable key for the current state: the Zobrist hash plus the exact player fields"""
+        p1 = self.player1
+        p2 = self.player2
+        return struct.pack('<QIIIIBBBB', self.zobrist,
+                           p1["yPos"], p1["xPos"], p2["yPos"], p2["xPos"],
+                           p1["axe"], p1["flamethrower"], p2["axe"], p2["flamethrower"])
+
+    def mirrored_state_key(self):
+        """state_key() of the same state with the two players swapped round"""
+        p1 = self.player1
+        p2 = self.player2
+        zobrist = self.zobrist
+        for slot, player, other in ((1, p1, p2), (2, p2, p1)):
+            index = player["yPos"] * self.cols + player["xPos"]
+            zobrist ^= zobrist_key(index, POSITION_KEYS + slot) ^ zobrist_key(index, POSITION_KEYS + 3 - slot)
+            if player["axe"] != other["axe"]:
+                zobrist ^= zobrist_key(slot, AXE_KEYS + player["axe"]) ^ zobrist_key(slot, AXE_KEYS + other["axe"])
+            if player["flamethrower"] != other["flamethrower"]:
+                zobrist ^= (zobrist_key(slot, FLAMETHROWER_KEYS + player["flamethrower"])
+                            ^ zobrist_key(slot, FLAMETHROWER_KEYS + other["flamethrower"]))
+        return struct.pack('<QIIIIBBBB', zobrist,
+                           p2["yPos"], p2["xPos"], p1["yPos"], p1["xPos"],
+                           p2["axe"], p2["flamethrower"], p1["axe"], p1["flamethrower"])
+
+    def set_tile(self, index, tile):
+        """Change one board cell, keeping the Zobrist hash in step"""
+        old_tile = self.board[index]
+        if old_tile != tile:
+            self.zobrist ^= zobrist_key(index, old_tile) ^ zobrist_key(index, tile)
+            self.board[index] = tile
+            self.dirty_rows.add(index // self.cols)
+            self.changed_rows.add(index // self.cols)
+            if self.step_cells is not None:
+                self.step_cells.append((self.board, index, old_tile, tile))
+
+    def set_item(self, player, item, count):
+        """Change how many of an item a player holds, keeping the Zobrist hash in step"""
+        slot = 1 if player is self.player1 else 2
+        offset = AXE_KEYS if item == "axe" else FLAMETHROWER_KEYS
+        self.zobrist ^= zobrist_key(slot, offset + player[item]) ^ zobrist_key(slot, offset + count)
+        player[item] = count
+
+    def neighbours(self, index):
+        """Board indices orthogonally next to a board index"""
+        return grid_neighbours(index, self.rows, self.cols)
+
+    def rock_stuck(self, index):
+        """Whether a rock at a board index can never be pushed again, in O(1).
+
+        Uses the level's dead squares, plus 2x2 blocks made only of rocks and
+        fixed walls: each rock in such a block has the block's other cells in
+        its way along both axes.
+        """
+        level = self.level
+        if level.dead_squares[index]:
+            return True
+        rows = self.rows
+        cols = self.cols
+        players = (self.player1["yPos"] * cols + self.player1["xPos"],
+                   self.player2["yPos"] * cols + self.player2["xPos"])
+
+        def blocks(y, x):
+            if not (0 <= y < rows and 0 <= x < cols):
+                return True
+            cell = y * cols + x
+            # A player may be standing on the cell a rock was just pushed off
+            return level.fixed_walls[cell] or (self.board[cell] == ROCK and cell not in players)
+
+        y, x = divmod(index, cols)
+        for dy in (-1, 1):
+            for dx in (-1, 1):
+                if blocks(y + dy, x) and blocks(y, x + dx) and blocks(y + dy, x + dx):
+                    return True
+        return False
+
+    def label_tree_components(self):
+        """Label every connected group of trees on the current board.
+
+        Labels are never reused, so an old labels array stays valid for
+        snapshots.
+        """
+        return label_tree_components(self.board, self.rows, self.cols)
+
     def burn_tree(self, i, j):
-        """Recursively burn adjacent trees"""
-        if i < 0 or j < 0 or i >= len(self.display_board) or j >= len(self.display_board[0]):
+        """Burn the whole group of trees connected to (i, j) at once"""
+        if i < 0 or j < 0 or i >= self.rows or j >= self.cols:
             return
-        if self.display_board[i][j] != "🌲":
+        label = self.tree_labels[i * self.cols + j]
+        if not label:
             return
-        self.display_board[i][j] = "　"
-        adjacent = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-        for dy, dx in adjacent:
-            self.burn_tree(i + dy, j + dx)
-    
+        # Copy on write: snapshots may still be holding the current labels
+        labels = self.tree_labels.copy()
+        for index in self.tree_components[label]:
+            if labels[index] == label:
+                labels[index] = 0
+                self.set_tile(index, EMPTY)
+        self.tree_labels = labels
+
+    def cut_tree(self, index):
+        """Remove a single tree, splitting its group if the cut disconnects it"""
+        label = self.tree_labels[index]
+        labels = self.tree_labels.copy()
+        labels[index] = 0
+        starts = [cell for cell in self.neighbours(index) if labels[cell] == label]
+        if len(starts) > 1:
+            self.split_tree_component(labels, label, starts)
+        self.tree_labels = labels
+
+    def split_tree_component(self, labels, label, starts):
+        """Relabel the pieces of a tree group that broke apart around a cut.
+
+        One search grows from each tree next to the cut, a cell at a time in
+        turn. Searches that meet are the same piece and merge. Once only one
+        search is still growing, every finished search has walked a whole
+        piece that broke off, so only the smaller pieces are ever visited.
+        """
+        owner = {}
+        searches = {}
+        for search, start in enumerate(starts):
+            owner[start] = search
+            searches[search] = ([start], [start])
+        finished = []
+
+        while len(searches) > 1:
+            for search in list(searches):
+                if search not in searches:
+                    continue
+                queue, cells = searches[search]
+                if not queue:
+                    finished.append(cells)
+                    del searches[search]
+                    continue
+                cell = queue.pop()
+                for neighbour in self.neighbours(cell):
+                    if labels[neighbour] != label:
+                        continue
+                    other = owner.get(neighbour)
+                    if other is None:
+                        owner[neighbour] = search
+                        queue.append(neighbour)
+                        cells.append(neighbour)
+                    elif other != search:
+                        # Same piece: fold the other search into this one
+                        other_queue, other_cells = searches.pop(other)
+                        for other_cell in other_cells:
+                            owner[other_cell] = search
+                        queue.extend(other_queue)
+                        cells.extend(other_cells)
+
+        for cells in finished:
+            new_label = len(self.tree_components)
+            for cell in cells:
+                labels[cell] = new_label
+            self.tree_components.append(tuple(cells))
+
     def clear_space(self, y_move, x_move, player):
         """Clear the current space before moving"""
-        space_tiles = ("　", "🍄", "🌲", "🪨 ", "🧑", "👩")
-        if self.initial_board[player["yPos"]][player["xPos"]] in space_tiles:
-            self.display_board[player["yPos"]][player["xPos"]] = "　"
-        elif self.initial_board[player["yPos"]][player["xPos"]] == "🟦":
-            self.display_board[player["yPos"]][player["xPos"]] = "⬜"
-        elif self.initial_board[player["yPos"]][player["xPos"]] == "🪓":
-            if self.toggle_board[player["yPos"]][player["xPos"]] == "/":
-                self.display_board[player["yPos"]][player["xPos"]] = "　"
-            else:
-                self.display_board[player["yPos"]][player["xPos"]] = "🪓"
-        elif self.initial_board[player["yPos"]][player["xPos"]] == "🔥":
-            if self.toggle_board[player["yPos"]][player["xPos"]] == "/":
-                self.display_board[player["yPos"]][player["xPos"]] = "　"
-            else:
-                self.display_board[player["yPos"]][player["xPos"]] = "🔥"
-        
+        index = player["yPos"] * self.cols + player["xPos"]
+        self.set_tile(index, self.restore_board[index])
+        self.dirty_rows.add(player["yPos"])
         player["yPos"] += y_move
         player["xPos"] += x_move
-        
-        if player["yPos"] < 0:
-            player["yPos"] = 0
-        if player["xPos"] < 0:
-            player["xPos"] = 0
-    
+        self.dirty_rows.add(player["yPos"])
+
+        value = POSITION_KEYS + (1 if player is self.player1 else 2)
+        self.zobrist ^= zobrist_key(index, value) ^ zobrist_key(index + y_move * self.cols + x_move, value)
+
     def move(self, y_move, x_move, player_num):
         """Execute a move for a specific player"""
+        self.begin_step()
+        result = self.apply_move(y_move, x_move, player_num)
+        self.end_step(result)
+        return result
+
+    def apply_move(self, y_move, x_move, player_num):
+        """Carry out a move without touching the journal"""
         player = self.player1 if player_num == 1 else self.player2
         other_player = self.player2 if player_num == 1 else self.player1
-        
-        try:
-            next_tile = self.display_board[player["yPos"] + y_move][player["xPos"] + x_move]
-        except IndexError:
+
+        next_y = player["yPos"] + y_move
+        next_x = player["xPos"] + x_move
+        if not (0 <= next_y < self.rows and 0 <= next_x < self.cols):
             return 'blocked'
-        
-        if (player["yPos"] + y_move == other_player["yPos"] and 
-            player["xPos"] + x_move == other_player["xPos"]):
+        if next_y == other_player["yPos"] and next_x == other_player["xPos"]:
             return 'blocked'
-        
-        skip_tiles = ("　", "⬜", "🪓", "🔥")
-        
-        if next_tile in skip_tiles:
+
+        action = MOVE_ACTION[self.board[next_y * self.cols + next_x]]
+
+        if action == STEP:
             self.clear_space(y_move, x_move, player)
             self.move_count += 1
             return 'moved'
-        
-        elif next_tile == "🍄":
+
+        elif action == COLLECT:
             self.total_mushrooms_collected += 1
             self.clear_space(y_move, x_move, player)
             self.move_count += 1
             if self.total_mushrooms_collected == self.total_mushrooms:
                 return 'win'
             return 'moved'
-        
-        elif next_tile == "🟦":
+
+        elif action == DROWN:
             self.clear_space(y_move, x_move, player)
             self.move_count += 1
             return 'loss'
-        
-        elif next_tile == "🪨 ":
-            avoid = ("🍄", "🪨 ", "🪓", "🔥", "🌲", "🧑", "👩")
-            try:
-                beyond_tile = self.display_board[player["yPos"] + (y_move * 2)][player["xPos"] + (x_move * 2)]
-                if (player["yPos"] + (y_move * 2) == other_player["yPos"] and 
-                    player["xPos"] + (x_move * 2) == other_player["xPos"]):
-                    return 'blocked'
-                
-                if beyond_tile not in avoid:
-                    if beyond_tile == "🟦":
-                        self.display_board[player["yPos"] + (y_move * 2)][player["xPos"] + (x_move * 2)] = "⬜"
-                    else:
-                        self.display_board[player["yPos"] + (y_move * 2)][player["xPos"] + (x_move * 2)] = "🪨 "
-                    self.clear_space(y_move, x_move, player)
-                    self.move_count += 1
-                    return 'moved'
-            except IndexError:
-                pass
+
+        elif action == PUSH:
+            beyond_y = next_y + y_move
+            beyond_x = next_x + x_move
+            if not (0 <= beyond_y < self.rows and 0 <= beyond_x < self.cols):
+                return 'blocked'
+            if beyond_y == other_player["yPos"] and beyond_x == other_player["xPos"]:
+                return 'blocked'
+
+            beyond = beyond_y * self.cols + beyond_x
+            pushed_tile = PUSH_RESULT[self.board[beyond]]
+            if pushed_tile:
+                self.set_tile(beyond, pushed_tile)
+                self.clear_space(y_move, x_move, player)
+                self.move_count += 1
+                return 'moved'
             return 'blocked'
-        
-        elif next_tile == "🌲":
+
+        elif action == CHOP:
             if player["axe"] > 0:
+                self.cut_tree(next_y * self.cols + next_x)
                 self.clear_space(y_move, x_move, player)
                 self.move_count += 1
-                player["axe"] -= 1
+                self.set_item(player, "axe", player["axe"] - 1)
                 return 'moved'
             elif player["flamethrower"] > 0:
-                next_y = player["yPos"] + y_move
-                next_x = player["xPos"] + x_move
                 self.burn_tree(next_y, next_x)
                 self.clear_space(y_move, x_move, player)
                 self.move_count += 1
-                player["flamethrower"] -= 1
+                self.set_item(player, "flamethrower", player["flamethrower"] - 1)
                 return 'moved'
             return 'blocked'
-        
+
         return 'blocked'
-    
+
+    def play_key(self, key):
+        """Play one key of a move string.
+
+        Returns the move result for movement keys, whether the pickup worked
+        for p/o, and None for any other key.
+        """
+        move = MOVE_KEYS.get(key)
+        if move is not None:
+            return self.move(*move)
+        player_num = PICKUP_KEYS.get(key)
+        if player_num is not None:
+            return self.pickup_item(player_num)
+        return None
+
     def pickup_item(self, player_num):
         """Try to pick up an item at current position for specific player"""
+        self.begin_step()
+        picked = self.apply_pickup(player_num)
+        self.end_step(picked)
+        return picked
+
+    def apply_pickup(self, player_num):
+        """Carry out a pickup without touching the journal"""
         player = self.player1 if player_num == 1 else self.player2
-        
+
         if player["axe"] == 0 and player["flamethrower"] == 0:
-            if self.initial_board[player["yPos"]][player["xPos"]] == "🪓" and \
-               self.toggle_board[player["yPos"]][player["xPos"]] != "/":
-                self.toggle_board[player["yPos"]][player["xPos"]] = "/"
-                player["axe"] += 1
-                return True
-            elif self.initial_board[player["yPos"]][player["xPos"]] == "🔥" and \
-                 self.toggle_board[player["yPos"]][player["xPos"]] != "/":
-                self.toggle_board[player["yPos"]][player["xPos"]] = "/"
-                player["flamethrower"] += 1
+            index = player["yPos"] * self.cols + player["xPos"]
+            item = self.restore_board[index]
+            if item == AXE or item == FLAMETHROWER:
+                self.restore_board[index] = EMPTY
+                self.changed_rows.add(player["yPos"])
+                if self.step_cells is not None:
+                    self.step_cells.append((self.restore_board, index, item, EMPTY))
+                self.zobrist ^= zobrist_key(index, RESTORE_KEYS + item) ^ zobrist_key(index, RESTORE_KEYS + EMPTY)
+                self.set_item(player, "axe" if item == AXE else "flamethrower", 1)
                 return True
         return False
-    
-    def position_players(self):
-        """Place both players on the board"""
-        self.display_board[self.player1["yPos"]][self.player1["xPos"]] = "🧑"
-        self.display_board[self.player2["yPos"]][self.player2["xPos"]] = "👩"
-    
+
+    def board_with_players(self):
+        """Copy of the board with both players placed on it"""
+        tiles = bytearray(self.board)
+        tiles[self.player1["yPos"] * self.cols + self.player1["xPos"]] = PLAYER1
+        tiles[self.player2["yPos"] * self.cols + self.player2["xPos"]] = PLAYER2
+        return tiles
+
+    @property
+    def display_board(self):
+        """The board as rows of emoji, with both players placed"""
+        tiles = self.board_with_players()
+        return [[TILE_EMOJI[tile] for tile in tiles[start:start + self.cols]]
+                for start in range(0, len(tiles), self.cols)]
+
+    def row_string(self, row):
+        """One board row as emoji, with any player on it placed"""
+        tiles = self.board[row * self.cols:(row + 1) * self.cols]
+        if self.player1["yPos"] == row:
+            tiles[self.player1["xPos"]] = PLAYER1
+        if self.player2["yPos"] == row:
+            tiles[self.player2["xPos"]] = PLAYER2
+        return " ".join([TILE_EMOJI[tile] for tile in tiles])
+
     def get_board_string(self):
         """Get the board as a formatted string"""
-        self.position_players()
-        return "\n".join(" ".join(line) for line in self.display_board)
-    
+        return "\n".join(self.row_string(row) for row in range(self.rows))
+
+    def take_dirty_rows(self):
+        """Rows that need redrawing since the last call"""
+        rows = self.dirty_rows
+        self.dirty_rows = set()
+        return rows
+
+    def board_lines(self):
+        """The board as rows of level characters, with both players placed"""
+        tiles = self.board_with_players()
+        return [tiles[start:start + self.cols].decode('ascii') for start in range(0, len(tiles), self.cols)]
+
+    def write_result(self, stream, result):
+        """Write the result and current board to a binary stream, a row at a time"""
+        cols = self.cols
+        players = ((self.player1["yPos"] * cols + self.player1["xPos"], PLAYER1),
+                   (self.player2["yPos"] * cols + self.player2["xPos"], PLAYER2))
+        return write_board(stream, result, self.rows, cols, self.board, players)
+
+    def export_text(self, result):
+        """The result and current board in the output file format"""
+        buffer = io.BytesIO()
+        self.write_result(buffer, result)
+        return buffer.getvalue().decode('utf-8')
+
     def export_to_file(self, output_file, result):
-        """Export current state to output file"""
-        self.position_players()
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(result + "\n")
-            f.write(f"r = {len(self.display_board)}; c = {len(self.display_board[0])}\n")
-            
-            for row in self.display_board:
-                line = ""
-                for cell in row:
-                    if cell == "🧑":
-                        line += "L"
-                    elif cell == "👩":
-                        line += "O"
-                    elif cell == "🍄":
-                        line += "+"
-                    elif cell == "　":
-                        line += "."
-                    elif cell == "🌲":
-                        line += "T"
-                    elif cell == "🪨 ":
-                        line += "R"
-                    elif cell == "🟦":
-                        line += "~"
-                    elif cell == "⬜":
-                        line += "-"
-                    elif cell == "🪓":
-                        line += "x"
-                    elif cell == "🔥":
-                        line += "*"
-                f.write(line + "\n")
-
-
-class GameScreen(Screen):
-    """The main game screen"""
-    
-    BINDINGS = [
-        Binding("w", "move_p1_up", "P1 Up", show=False),
-        Binding("s", "move_p1_down", "P1 Down", show=False),
-        Binding("a", "move_p1_left", "P1 Left", show=False),
-        Binding("d", "move_p1_right", "P1 Right", show=False),
-        Binding("i", "move_p2_up", "P2 Up", show=False),
-        Binding("k", "move_p2_down", "P2 Down", show=False),
-        Binding("j", "move_p2_left", "P2 Left", show=False),
-        Binding("l", "move_p2_right", "P2 Right", show=False),
-        Binding("p", "pickup_p1", "P1 Pickup", show=False),
-        Binding("o", "pickup_p2", "P2 Pickup", show=False),
-        Binding("r", "restart", "Restart", show=True),
-        Binding("escape", "back_to_menu", "Menu", show=True),
-    ]
-    
-    def __init__(self, level_data=None, level_name="Level 1"):
-        super().__init__()
-        self.game_state = GameState(level_data)
-        # If no level data provided, this is Level 0
-        if level_data is None:
-            self.level_name = "Level 0"
-        else:
-            self.level_name = level_name
-        self.game_over = False
-    
-    def compose(self) -> ComposeResult:
-        yield Header()
-        with Center():
-            with Container(id="game_container"):
-                yield Label(self.level_name, id="level_title")
-                yield Static(id="game_board")
-                yield Static(id="game_info")
-        yield Footer()
-    
-    def on_mount(self) -> None:
-        self.update_display()
-    
-    def update_display(self):
-        """Update the game board and info display"""
-        board_widget = self.query_one("#game_board", Static)
-        info_widget = self.query_one("#game_info", Static)
-        
-        board_text = Text(self.game_state.get_board_string(), justify="center")
-        board_widget.update(Panel(board_text, border_style="bright_cyan", title="🍄 Shroom Raider 🍄", 
-                                   title_align="center"))
-        
-        p1 = self.game_state.player1
-        p2 = self.game_state.player2
-        
-        mushroom_progress = f"{self.game_state.total_mushrooms_collected}/{self.game_state.total_mushrooms}"
-        
-        info_text = Text()
-        info_text.append("═" * 50 + "\n", style="bold bright_cyan")
-        info_text.append(f"  🎯 Total Progress: ", style="bold yellow")
-        info_text.append(f"{mushroom_progress} Mushrooms  ", style="bold bright_green")
-        info_text.append(f"  📊 Moves: {self.game_state.move_count}\n", style="bold bright_blue")
-        info_text.append("═" * 50 + "\n\n", style="bold bright_cyan")
-        
-        info_text.append("🧑 Player 1 (WASD)\n", style="bold bright_green")
-        if p1["axe"] > 0:
-            info_text.append("  Item: 🪓 Axe\n", style="bright_yellow")
-        elif p1["flamethrower"] > 0:
-            info_text.append("  Item: 🔥 Flamethrower\n", style="bright_red")
-        else:
-            info_text.append("  Item: None\n", style="dim")
-        
-        info_text.append("\n👩 Player 2 (IJKL)\n", style="bold bright_magenta")
-        if p2["axe"] > 0:
-            info_text.append("  Item: 🪓 Axe\n", style="bright_yellow")
-        elif p2["flamethrower"] > 0:
-            info_text.append("  Item: 🔥 Flamethrower\n", style="bright_red")
-        else:
-            info_text.append("  Item: None\n", style="dim")
-        
-        info_widget.update(info_text)
-    
-    def action_move_p1_up(self):
-        if not self.game_over:
-            result = self.game_state.move(-1, 0, 1)
-            self.handle_move_result(result)
-    
-    def action_move_p1_down(self):
-        if not self.game_over:
-            result = self.game_state.move(1, 0, 1)
-            self.handle_move_result(result)
-    
-    def action_move_p1_left(self):
-        if not self.game_over:
-            result = self.game_state.move(0, -1, 1)
-            self.handle_move_result(result)
-    
-    def action_move_p1_right(self):
-        if not self.game_over:
-            result = self.game_state.move(0, 1, 1)
-            self.handle_move_result(result)
-    
-    def action_pickup_p1(self):
-        if not self.game_over:
-            self.game_state.pickup_item(1)
-            self.update_display()
-    
-    def action_move_p2_up(self):
-        if not self.game_over:
-            result = self.game_state.move(-1, 0, 2)
-            self.handle_move_result(result)
-    
-    def action_move_p2_down(self):
-        if not self.game_over:
-            result = self.game_state.move(1, 0, 2)
-            self.handle_move_result(result)
-    
-    def action_move_p2_left(self):
-        if not self.game_over:
-            result = self.game_state.move(0, -1, 2)
-            self.handle_move_result(result)
-    
-    def action_move_p2_right(self):
-        if not self.game_over:
-            result = self.game_state.move(0, 1, 2)
-            self.handle_move_result(result)
-    
-    def action_pickup_p2(self):
-        if not self.game_over:
-            self.game_state.pickup_item(2)
-            self.update_display()
-    
-    def action_restart(self):
-        self.game_over = False
-        self.game_state.restart()
-        self.update_display()
-    
-    def action_back_to_menu(self):
-        self.app.pop_screen()
-    
-    def handle_move_result(self, result):
-        """Handle the result of a move"""
-        self.update_display()
-        
-        if result == 'win':
-            self.game_over = True
-            self.app.push_screen(WinScreen(self.level_name, self.game_state.move_count))
-        elif result == 'loss':
-            self.game_over = True
-            self.app.push_screen(LossScreen())
+        """Export current state to a file ("-" for stdout, or an open binary stream); return the bytes written"""
+        with open_output(output_file) as stream:
+            return self.write_result(stream, result)
 
 
-class WinScreen(Screen):
-    """Screen shown when players win"""
-    
-    BINDINGS = [
-        Binding("r", "play_again", "Play Again", show=False),
-        Binding("escape", "to_menu", "Menu", show=False),
-    ]
-    
-    def __init__(self, level_name, move_count):
-        super().__init__()
-        self.level_name = level_name
-        self.move_count = move_count
-    
-    def compose(self) -> ComposeResult:
-        with Center():
-            with Container(id="modal_container"):
-                yield Label("🎉 VICTORY! 🎉", id="modal_title")
-                yield Label(f"Completed in {self.move_count} moves!", id="modal_message")
-                yield Label("Enter username for leaderboard:", id="username_label")
-                yield Input(placeholder="Username (optional)", id="username_input")
-                with Horizontal(id="modal_buttons"):
-                    yield Button("💾 Save", id="save_score", variant="success")
-                    yield Button("⏭️ Next", id="next_level", variant="default")
-                    yield Button("🏠 Menu", id="menu", variant="primary")
-    
-    def on_button_pressed(self, event: Button.Pressed) -> None:
-        if event.button.id == "save_score":
-            username_input = self.query_one("#username_input", Input)
-            username = username_input.value.strip()
-            if username:
-                self.app.leaderboard.add_score(username, self.level_name, self.move_count)
-            # Go to main menu after saving
-            self.app.pop_screen()
-            self.app.pop_screen()
-        elif event.button.id == "next_level":
-            self.action_next_level()
-        elif event.button.id == "menu":
-            self.action_to_menu()
-    
-    def action_next_level(self):
-        """Load the next level"""
-        # Extract level number from level name
-        if self.level_name.startswith("Level "):
-            try:
-                current_level = int(self.level_name.split()[1])
-                next_level = current_level + 1
-                
-                if next_level > 15:
-                    # After level 15, go to menu
-                    self.app.pop_screen()
-                    self.app.pop_screen()
-                else:
-                    # Load next level
-                    level_file = Path(f"levels/Level{next_level}.txt")
-                    if level_file.exists():
-                        with open(level_file, 'r', encoding='utf-8') as f:
-                            level_data = f.read()
-                        self.app.pop_screen()
-                        game_screen = self.app.screen_stack[-1]
-                        if isinstance(game_screen, GameScreen):
-                            # Replace current game screen with new level
-                            self.app.pop_screen()
-                            self.app.push_screen(GameScreen(level_data, f"Level {next_level}"))
-                    else:
-                        # If file doesn't exist, go to menu
-                        self.app.pop_screen()
-                        self.app.pop_screen()
-            except (ValueError, IndexError):
-                # If level name format is unexpected, go to menu
-                self.app.pop_screen()
-                self.app.pop_screen()
-        else:
-            # If not a numbered level, go to menu
-            self.app.pop_screen()
-            self.app.pop_screen()
-    
-    def action_play_again(self):
-        self.app.pop_screen()
-        game_screen = self.app.screen_stack[-1]
-        if isinstance(game_screen, GameScreen):
-            game_screen.action_restart()
-    
-    def action_to_menu(self):
-        self.app.pop_screen()
-        self.app.pop_screen()
+# ------------------------- Move streams ------------------------- #
+# Streams are read a chunk at a time, so moves never have to fit in argv
+# or in memory. With run lengths on (--run-lengths), a count after a key
+# repeats it, so d100w5 is a hundred d moves and then five w moves;
+# otherwise every character is a key, as in a plain move string.
 
+MOVE_CHUNK_SIZE = 1 << 16
 
-class LossScreen(Screen):
-    """Screen shown when a player loses"""
-    
-    BINDINGS = [
-        Binding("r", "try_again", "Try Again", show=False),
-        Binding("escape", "to_menu", "Menu", show=False),
-    ]
-    
-    def compose(self) -> ComposeResult:
-        with Center():
-            with Container(id="modal_container"):
-                yield Label("💀 GAME OVER 💀", id="modal_title")
-                yield Label("A player drowned!", id="modal_message")
-                with Horizontal(id="modal_buttons"):
-                    yield Button("🔄 Try Again", id="try_again", variant="warning")
-                    yield Button("🏠 Menu", id="menu", variant="primary")
-    
-    def on_button_pressed(self, event: Button.Pressed) -> None:
-        if event.button.id == "try_again":
-            self.action_try_again()
-        elif event.button.id == "menu":
-            self.action_to_menu()
-    
-    def action_try_again(self):
-        self.app.pop_screen()
-        game_screen = self.app.screen_stack[-1]
-        if isinstance(game_screen, GameScreen):
-            game_screen.action_restart()
-    
-    def action_to_menu(self):
-        self.app.pop_screen()
-        self.app.pop_screen()
 
+def read_moves(stream, chunk_size=MOVE_CHUNK_SIZE, run_lengths=False):
+    """Yield the keys of a text stream of moves, expanding run lengths if asked to"""
+    if not run_lengths:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            yield from chunk
+    key = None
+    count = None
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        for char in chunk:
+            if char.isdigit():
+                # A count may be split across chunks, so it is only used once the next key turns up
+                if key is not None:
+                    count = int(char) if count is None else count * 10 + int(char)
+            elif not char.isspace():
+                if key is not None:
+                    yield from repeat(key, 1 if count is None else count)
+                key = char
+                count = None
+    if key is not None:
+        yield from repeat(key, 1 if count is None else count)
 
-class LeaderboardScreen(Screen):
-    """Screen showing leaderboard for a specific level"""
-    
-    BINDINGS = [
-        Binding("escape", "back", "Back", show=True),
-    ]
-    
-    def __init__(self, level_name):
-        super().__init__()
-        self.level_name = level_name
-    
-    def compose(self) -> ComposeResult:
-        yield Header()
-        with Center():
-            with Container(id="leaderboard_container"):
-                yield Label(f"🏆 {self.level_name} Leaderboard 🏆", id="leaderboard_title")
-                yield Static(id="leaderboard_table")
-                with Center():
-                    yield Button("⬅️ Back", id="back", variant="primary", classes="centered_button")
-        yield Footer()
-    
-    def on_mount(self):
-        self.update_leaderboard()
-    
-    def update_leaderboard(self):
-        """Update the leaderboard display"""
-        table = Table(title="🌟 Top 10 Scores 🌟", border_style="bright_cyan", show_header=True, 
-                     title_style="bold bright_yellow")
-        table.add_column("Rank", style="bold yellow", justify="center", width=8)
-        table.add_column("Username", style="bold bright_green", width=20)
-        table.add_column("Moves", style="bold bright_cyan", justify="center", width=10)
-        
-        scores = self.app.leaderboard.get_leaderboard(self.level_name)
-        
-        if scores:
-            for i, score in enumerate(scores, 1):
-                rank_emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-                table.add_row(rank_emoji, score["username"], str(score["moves"]))
-        else:
-            table.add_row("—", "No scores yet", "—")
-        
-        self.query_one("#leaderboard_table", Static).update(table)
-    
-    def on_button_pressed(self, event: Button.Pressed) -> None:
-        if event.button.id == "back":
-            self.action_back()
-    
-    def action_back(self):
-        self.app.pop_screen()
 
+def expand_moves(moves):
+    """Keys of a move string, with run lengths expanded"""
+    return read_moves(io.StringIO(moves), run_lengths=True)
 
-class LevelSelectScreen(Screen):
-    """Screen for selecting levels"""
-    
-    BINDINGS = [
-        Binding("escape", "back", "Back", show=True),
-    ]
-    
-    def compose(self) -> ComposeResult:
-        yield Header()
-        with Center():
-            with Container(id="level_select_container"):
-                yield Label("🎮 SELECT LEVEL 🎮", id="level_select_title")
-                with Grid(id="level_grid"):
-                    # Add Level 0 (Tutorial)
-                    with Vertical(classes="level_card"):
-                        yield Button("🍄 Level 0", id=f"level_0", variant="success", classes="level_button")
-                        yield Button("🏆", id=f"leaderboard_0", variant="default", classes="leaderboard_btn")
-                    # Add Levels 1-15
-                    for i in range(1, 16):
-                        with Vertical(classes="level_card"):
-                            yield Button(f"🍄 Level {i}", id=f"level_{i}", variant="primary", classes="level_button")
-                            yield Button("🏆", id=f"leaderboard_{i}", variant="default", classes="leaderboard_btn")
-                with Center():
-                    yield Button("⬅️ Back to Menu", id="back", variant="default", classes="centered_button")
-        yield Footer()
-    
-    def on_button_pressed(self, event: Button.Pressed) -> None:
-        button_id = event.button.id
-        
-        if button_id == "back":
-            self.action_back()
-        elif button_id.startswith("leaderboard_"):
-            level_num = int(button_id.split("_")[1])
-            level_name = f"Level {level_num}"
-            self.app.push_screen(LeaderboardScreen(level_name))
-        elif button_id.startswith("level_"):
-            level_num = int(button_id.split("_")[1])
-            level_name = f"Level {level_num}"
-            level_file = Path(f"levels/Level{level_num}.txt")
-            
-            if level_file.exists():
-                with open(level_file, 'r', encoding='utf-8') as f:
-                    level_data = f.read()
-                self.app.push_screen(GameScreen(level_data, level_name))
-            else:
-                self.app.push_screen(GameScreen(None, level_name))
-    
-    def action_back(self):
-        self.app.pop_screen()
 
+def stream_moves(moves_file, chunk_size=MOVE_CHUNK_SIZE, run_lengths=False):
+    """Keys read from a moves file, or from stdin when the file is '-'"""
+    if moves_file == '-':
+        yield from read_moves(sys.stdin, chunk_size, run_lengths)
+        return
+    with open(moves_file, 'r', encoding='utf-8') as f:
+        yield from read_moves(f, chunk_size, run_lengths)
 
-class MainMenuScreen(Screen):
-    """Main menu screen"""
-    
-    BINDINGS = [
-        Binding("q", "quit_app", "Exit", show=True),
-    ]
-    
-    def compose(self) -> ComposeResult:
-        yield Header()
-        with Center():
-            with Container(id="menu_container"):
-                yield Label("🍄 SHROOM RAIDER 🍄", id="menu_title")
-                yield Label("Cooperative Mushroom Collector", id="menu_subtitle")
-                with Vertical(id="menu_buttons"):
-                    yield Button("🎮 Play", id="play", variant="success")
-                    yield Button("📋 Levels", id="levels", variant="primary")
-                    yield Button("🚪 Exit", id="exit", variant="error")
-        yield Footer()
-    
-    def on_button_pressed(self, event: Button.Pressed) -> None:
-        if event.button.id == "play":
-            # Check if a stage file was provided via command line
-            if STAGE_FILE_PATH:
-                try:
-                    with open(STAGE_FILE_PATH, 'r', encoding='utf-8') as f:
-                        level_data = f.read()
-                    level_name = Path(STAGE_FILE_PATH).stem
-                    self.app.push_screen(GameScreen(level_data, level_name))
-                except FileNotFoundError:
-                    self.app.push_screen(GameScreen())
-            else:
-                self.app.push_screen(GameScreen())
-        elif event.button.id == "levels":
-            self.app.push_screen(LevelSelectScreen())
-        elif event.button.id == "exit":
-            self.app.exit()
-    
-    def action_quit_app(self):
-        self.app.exit()
 
+# -------------------------- Profiling -------------------------- #
+# --profile times each phase of a terminal mode run and counts the engine's
+# hot-path calls. Counting wraps methods on the one game being profiled, so
+# unprofiled games run exactly the code they always did. The phases and
+# counters mean the same as in the base game's --profile:
+#   parse          reading the command line
+#   load_level     reading the stage file and building the game from it
+#   move_loop      playing the moves
+#   export         writing the result
+#   blocked_moves  movement keys that left the player where it was
+#   board_copies   whole boards copied, when loading (or restarting) a level
 
-class MushroomGame(App):
-    """Main application"""
-    
-    CSS_PATH = "game_styles.tcss"
-    
-    BINDINGS = [
-        Binding("q", "quit", "Quit", show=False, priority=True),
-    ]
-    
+PROFILE_PHASES = ("parse", "load_level", "move_loop", "export")
+PROFILE_COUNTERS = ("moves", "blocked_moves", "clear_space", "burn_cells", "board_copies", "bytes_written")
+
+
+class Profiler:
+    """Phase timings and engine counters for one terminal mode run"""
     def __init__(self):
-        super().__init__()
-        self.leaderboard = LeaderboardManager()
-    
-    def on_mount(self) -> None:
-        self.push_screen(MainMenuScreen())
+        self.timings = dict.fromkeys(PROFILE_PHASES, 0.0)
+        self.counters = dict.fromkeys(PROFILE_COUNTERS, 0)
 
+    @contextmanager
+    def phase(self, name):
+        """Add the time spent in the block to a phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
 
-def run_terminal_mode(stage_file, moves, output_file):
-    """Run game in terminal mode and output to file"""
-    # Load stage file
-    with open(stage_file, 'r', encoding='utf-8') as f:
-        level_data = f.read()
-    
-    # Create game state
-    game = GameState(level_data)
-    
-    # Process moves
-    for move in moves.lower():
-        if move == 'w':
-            result = game.move(-1, 0, 1)
-        elif move == 's':
-            result = game.move(1, 0, 1)
-        elif move == 'a':
-            result = game.move(0, -1, 1)
-        elif move == 'd':
-            result = game.move(0, 1, 1)
-        elif move == 'i':
-            result = game.move(-1, 0, 2)
-        elif move == 'k':
-            result = game.move(1, 0, 2)
-        elif move == 'j':
-            result = game.move(0, -1, 2)
-        elif move == 'l':
-            result = game.move(0, 1, 2)
-        elif move == 'p':
-            game.pickup_item(1)
-            continue
-        elif move == 'o':
-            game.pickup_item(2)
-            continue
+    def attach(self, game):
+        """Count clear_space calls, burnt cells and board copies on a freshly loaded game"""
+        counters = self.counters
+        clear_space = game.clear_space
+        burn_tree = game.burn_tree
+        restart = game.restart
+        # Loading copied the level's board into the game's board and restore board
+        counters["board_copies"] += 2
+
+        def counted_clear_space(*args):
+            counters["clear_space"] += 1
+            return clear_space(*args)
+
+        def counted_burn_tree(i, j):
+            if 0 <= i < game.rows and 0 <= j < game.cols:
+                label = game.tree_labels[i * game.cols + j]
+                if label:
+                    counters["burn_cells"] += len(game.tree_components[label])
+            return burn_tree(i, j)
+
+        def counted_restart():
+            # A journaled restart only undoes the steps taken
+            if game.history is None or not game.journal_from_start:
+                counters["board_copies"] += 2
+            return restart()
+
+        game.clear_space = counted_clear_space
+        game.burn_tree = counted_burn_tree
+        game.restart = counted_restart
+
+    def as_dict(self):
+        return {"timings": dict(self.timings), "counters": dict(self.counters)}
+
+    def report(self):
+        """The profile as readable text"""
+        lines = ["Profile"]
+        lines += [f"  {name:<14}{seconds * 1000:>12.3f} ms" for name, seconds in self.timings.items()]
+        lines += [f"  {name:<14}{count:>12}" for name, count in self.counters.items()]
+        return "\n".join(lines)
+
+    def write(self, json_file=None):
+        """Print the report to stderr, or write it as JSON to a file ("-" for stdout)"""
+        if json_file is None:
+            print(self.report(), file=sys.stderr)
+        elif json_file == '-':
+            print(json.dumps(self.as_dict(), indent=2))
         else:
-            continue
-        
+            with open(json_file, 'w', encoding='utf-8') as f:
+                json.dump(self.as_dict(), f, indent=2)
+                f.write("\n")
+
+
+def play_moves(play, moves, counters=None, analyzer=None):
+    """Play keys until the game is won or lost; return the result for the output file.
+
+    With a DeadStateAnalyzer, play also stops as soon as the game can no
+    longer be won.
+    """
+    if analyzer is not None and analyzer.dead:
+        return "No Clear"
+    for move in moves:
+        result = play(move.lower())
+        if counters is not None and result is not None:
+            counters["moves"] += 1
+            if result == 'blocked':
+                counters["blocked_moves"] += 1
+
         # Check for win/loss
         if result == 'win':
-            game.export_to_file(output_file, "Clear")
-            return
+            return "Clear"
         elif result == 'loss':
-            game.export_to_file(output_file, "No Clear")
-            return
-    
+            return "No Clear"
+        elif result and result != 'blocked' and analyzer is not None and analyzer.update():
+            return "No Clear"
+
     # If moves ran out
-    game.export_to_file(output_file, "No Clear")
+    return "No Clear"
+
+
+def run_terminal_mode(stage_file, moves, output_file, replay_file=None, profiler=None, stop_early=False):
+    """Run game in terminal mode, output to file and return the result.
+
+    `moves` is a move string or any iterable of keys, such as stream_moves().
+    Pass a Profiler to have the run timed and counted. With stop_early, the
+    run ends as soon as the level can no longer be cleared, and the output
+    shows the board at that point.
+    """
+    counters = None if profiler is None else profiler.counters
+    # Timing the phases costs next to nothing, so it is done either way
+    profiler = profiler or Profiler()
+
+    # Load the stage file and create the game state
+    with profiler.phase("load_level"):
+        game = GameState(load_level_file(stage_file))
+    if counters is not None:
+        profiler.attach(game)
+
+    # Record the run if asked to; the replay module is only needed then
+    recorder = None
+    play = game.play_key
+    if replay_file:
+        from replay import ReplayRecorder
+        recorder = ReplayRecorder(replay_file, game)
+        play = recorder.play
+
+    analyzer = None
+    if stop_early:
+        from reachability import DeadStateAnalyzer
+        analyzer = DeadStateAnalyzer(game)
+
+    try:
+        with profiler.phase("move_loop"):
+            result = play_moves(play, moves, counters, analyzer)
+        with profiler.phase("export"):
+            written = game.export_to_file(output_file, result)
+        profiler.counters["bytes_written"] += written
+        return result
+    finally:
+        if recorder:
+            recorder.close()
+
+
+def load_manifest(manifest_file):
+    """Load batch jobs from a JSON Lines manifest of level/moves/output objects.
+
+    A job may also name a replay file and set stop_early.
+    """
+    jobs = []
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            missing = {"level", "moves", "output"} - job.keys()
+            if missing:
+                raise ValueError(f"{manifest_file}:{line_number}: missing {', '.join(sorted(missing))}")
+            jobs.append(job)
+    return jobs
+
+
+def run_batch_job(job, output=None):
+    """Run one manifest job, reporting a bad level as an error result"""
+    try:
+        return run_terminal_mode(job["level"], job["moves"], output or job["output"], job.get("replay"),
+                                 stop_early=job.get("stop_early", False))
+    except (OSError, ValueError) as error:
+        return f"Error: {error}"
+
+
+def run_collected_job(job):
+    """Run one manifest job into memory and return (result, output bytes or None)"""
+    buffer = io.BytesIO()
+    result = run_batch_job(job, buffer)
+    return result, buffer.getvalue() if buffer.tell() else None
+
+
+def run_batch_mode(manifest_file, summary_file=None, workers=None, stop_early=False, results_file=None):
+    """Replay every job in a manifest across a process pool and write a summary.
+
+    With a results file (.zip or .jsonl), every job's output goes into that
+    one file under the job's output name, instead of into a file of its own.
+    """
+    # Only batch mode needs a process pool, so single runs don't import it
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = load_manifest(manifest_file)
+    if stop_early:
+        for job in jobs:
+            job.setdefault("stop_early", True)
+    
+    # Hand each worker a few large chunks so thousands of short jobs don't
+    # pay a round trip each
+    pool_size = workers or os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (pool_size * 4))
+    with ProcessPoolExecutor(max_workers=pool_size) as pool:
+        if results_file:
+            # Workers hand their output back, and only this process writes the results file
+            results = []
+            with open_results(results_file) as collected:
+                for job, (result, data) in zip(jobs, pool.map(run_collected_job, jobs, chunksize=chunksize)):
+                    if data is not None:
+                        collected.add(job["output"], data)
+                    results.append(result)
+        else:
+            results = list(pool.map(run_batch_job, jobs, chunksize=chunksize))
+    
+    summary = [f"{job['output']}\t{result}\n" for job, result in zip(jobs, results)]
+    if summary_file:
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.writelines(summary)
+    else:
+        sys.stdout.writelines(summary)
+    return results
 
 
 def main():
     """Main entry point for the application"""
-    args = parse_args()
-    
-    if args.file and args.moves and args.output:
+    # Timing costs next to nothing, so the command line is timed before
+    # knowing whether --profile was given
+    profiler = Profiler()
+    with profiler.phase("parse"):
+        args = parse_args()
+
+    if args.batch:
+        # Batch mode
+        run_batch_mode(args.batch, args.output, args.jobs, args.stop_early, args.results)
+    elif args.file and (args.moves or args.moves_file) and args.output:
         # Terminal mode
-        run_terminal_mode(args.file, args.moves, args.output)
+        if args.moves_file:
+            moves = stream_moves(args.moves_file, run_lengths=args.run_lengths)
+        else:
+            moves = expand_moves(args.moves) if args.run_lengths else args.moves
+        profiler = profiler if args.profile or args.profile_json else None
+        run_terminal_mode(args.file, moves, args.output, args.replay, profiler, args.stop_early)
+        if profiler:
+            profiler.write(args.profile_json)
     else:
-        # GUI mode
-        app = MushroomGame()
+        # GUI mode; Textual is only imported here so the headless modes start fast
+        from game_ui import MushroomGame
+        app = MushroomGame(args.file)
         app.run()
+        app.leaderboard.flush()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,581 @@
+"""Optimal-move solver for Shroom Raider levels.
+
+Runs an A* search over game states, using GameState.move and
+GameState.pickup_item to generate successors. Only moves count towards the
+path cost (pickups are free, like in the move counter), and the heuristic
+is a spanning-tree bound over the mushrooms left, so the first win found
+uses the fewest moves. When trees wall mushrooms off, the tree also takes
+in the fewest tools that can clear them, reached around the rocks caging
+each tool. A second bound plays out, for a few walled-off areas at a time,
+every order in which the players could fetch tools, open the areas and
+collect from them; the heuristic is the larger of the two.
+
+Both players follow the same rules, so a state and its mirror image (the
+players swapped round) are searched only once, and the moves along a path
+are swapped back when it is rebuilt.
+
+Pushes that leave a rock stuck for good are checked with the level's
+precomputed dead-square tables, and the successor is dropped if the stuck
+rock has cut a mushroom off.
+"""
+import heapq
+from argparse import ArgumentParser
+from itertools import combinations
+
+from shroom_raider import (GameState, MUSHROOM, ROCK, AXE, FLAMETHROWER, MOVE_KEYS, PICKUP_KEYS, STEP_KEYS,
+                           grid_neighbours, load_level_file)
+from reachability import is_dead
+
+
+# Solutions use the game's own move-string keys
+MOVES = MOVE_KEYS
+PICKUPS = PICKUP_KEYS
+ACTIONS = tuple(MOVES) + tuple(PICKUPS)
+# The same action done by the other player
+MIRRORED = {key: STEP_KEYS[(y_move, x_move, 3 - player_num)] for key, (y_move, x_move, player_num) in MOVES.items()}
+MIRRORED.update({key: other for key, player_num in PICKUPS.items()
+                 for other, other_num in PICKUPS.items() if other_num == 3 - player_num})
+
+DEFAULT_MAX_STATES = 200_000
+# Distance to a cell no route can reach
+UNREACHABLE = 1 << 20
+# opening_chains() tries every way of sharing out the openings and tools, so only when there are few
+MAX_OPENINGS = 3
+MAX_CHAIN_TOOLS = 6
+
+
+class SearchLimitReached(Exception):
+    """Raised when the solver visits more states than it is allowed to keep"""
+
+
+def tree_regions(game, cache=None):
+    """The open areas trees split the board into, for the current trees.
+
+    Returns each cell's area (0 for a tree) and, for every area, the set of
+    tree groups bordering it. Rocks and water count as open. Trees only
+    change when one is cut or burnt, which replaces the labels array, so
+    results are cached by that array, and by its contents for the copies
+    made when different states cut the same tree.
+    """
+    labels = game.tree_labels
+    if cache is not None:
+        cached = cache.get(id(labels))
+        # The array is kept alongside, so its id cannot be reused meanwhile
+        if cached is not None and cached[0] is labels:
+            return cached[1], cached[2]
+        cached = cache.get(labels.tobytes())
+        if cached is not None:
+            cache[id(labels)] = (labels, *cached)
+            return cached
+    rows = game.rows
+    cols = game.cols
+    regions = [0] * (rows * cols)
+    borders = [set()]
+    for start in range(rows * cols):
+        if labels[start] or regions[start]:
+            continue
+        region = len(borders)
+        trees = set()
+        regions[start] = region
+        cells = [start]
+        for cell in cells:
+            for neighbour in grid_neighbours(cell, rows, cols):
+                if labels[neighbour]:
+                    trees.add(labels[neighbour])
+                elif not regions[neighbour]:
+                    regions[neighbour] = region
+                    cells.append(neighbour)
+        borders.append(trees)
+    if cache is not None:
+        cache[id(labels)] = (labels, regions, borders)
+        cache[labels.tobytes()] = (regions, borders)
+    return regions, borders
+
+
+def walled_off_areas(game, mushrooms, cache=None):
+    """The tree groups the players can get at, and the mushrooms of each open area they cannot.
+
+    Returns the set of tree groups bordering the players' open areas and a
+    dict from each walled-off area to the board indices of its mushrooms.
+    """
+    regions, borders = tree_regions(game, cache)
+    labels = game.tree_labels
+    cols = game.cols
+    reached = set()
+    reached_trees = set()
+    for player in (game.player1, game.player2):
+        index = player["yPos"] * cols + player["xPos"]
+        if labels[index]:
+            # A player left standing in a tree group can step out of it either way
+            reached_trees.add(labels[index])
+            reached.update(regions[cell] for cell in grid_neighbours(index, game.rows, cols))
+        else:
+            reached.add(regions[index])
+    reached.discard(0)
+    walled_off = {}
+    for y, x in mushrooms:
+        region = regions[y * cols + x]
+        if region not in reached:
+            walled_off.setdefault(region, []).append(y * cols + x)
+    for region in reached:
+        reached_trees |= borders[region]
+    return reached_trees, walled_off
+
+
+def tools_needed(game, areas, cache=None):
+    """Lower bound on the axes and flamethrowers still to be picked up.
+
+    A mushroom outside the players' open areas needs a tree cleared. One
+    tool clears at most one tree group, so one is only enough when a single
+    group borders both the players' areas and every walled-off mushroom;
+    otherwise at least two are. Tools the players hold count against this.
+    `areas` is what walled_off_areas() gives for the mushrooms left.
+    """
+    reached_trees, walled_off = areas
+    if not walled_off:
+        return 0
+    borders = tree_regions(game, cache)[1]
+    needed = 1 if reached_trees.intersection(*(borders[region] for region in walled_off)) else 2
+    held = sum(player["axe"] > 0 or player["flamethrower"] > 0 for player in (game.player1, game.player2))
+    return max(0, needed - held)
+
+
+def fence_distances(game, trees, areas=None, cache=None):
+    """Manhattan distance from every cell to the nearest tree of the given tree groups.
+
+    With `areas`, only the trees next to one of those open areas count.
+    Cached by tree layout, the same way as tree_regions().
+    """
+    labels = game.tree_labels
+    regions = tree_regions(game, cache)[0]
+    # The regions list is shared by every copy of the same labels and kept in the cache
+    key = ("fence", id(regions), trees, areas)
+    if cache is not None and key in cache:
+        return cache[key]
+    rows = game.rows
+    cols = game.cols
+    distances = [UNREACHABLE] * (rows * cols)
+    cells = [index for index in range(rows * cols) if labels[index] in trees]
+    if areas is not None:
+        cells = [index for index in cells
+                 if any(regions[neighbour] in areas for neighbour in grid_neighbours(index, rows, cols))]
+    for index in cells:
+        distances[index] = 0
+    for cell in cells:
+        for neighbour in grid_neighbours(cell, rows, cols):
+            if distances[neighbour] == UNREACHABLE:
+                distances[neighbour] = distances[cell] + 1
+                cells.append(neighbour)
+    if cache is not None:
+        cache[key] = distances
+    return distances
+
+
+def opening_chains(game, areas, cache=None):
+    """Lower bound on the moves needed to open every walled-off area and walk into it.
+
+    Opening an area means walking into a tree with a tool in hand: with a
+    flamethrower, into any tree of a group bordering the area, and with an
+    axe, into one of the trees right next to it, since it only clears the
+    tree it cuts. A player carries one tool at a time, so each
+    player's route passes through a chain of stops: tools it has not used
+    yet, each followed by a fence it opens with it, and the mushrooms of
+    areas already opened. Legs between one player's stops don't overlap,
+    and the players use different tools, so all the legs add up; this is
+    the cheapest way of sharing the stops out between the players. Areas
+    whose fences share a tree group may be opened together, so they count
+    once. Gives 0 when there are too many openings or tools to try them
+    all, and UNREACHABLE when no tool is left to open some area.
+    `areas` is what walled_off_areas() gives for the mushrooms left.
+    """
+    walled_off = areas[1]
+    if not walled_off:
+        return 0
+    tools = [index for index in game.level.items
+             if game.restore_board[index] == AXE or game.restore_board[index] == FLAMETHROWER]
+    if len(tools) > MAX_CHAIN_TOOLS:
+        return 0
+    regions, borders = tree_regions(game, cache)
+    cols = game.cols
+    starts = tuple(player["yPos"] * cols + player["xPos"] for player in (game.player1, game.player2))
+    holding = tuple(player["axe"] > 0 or player["flamethrower"] > 0 for player in (game.player1, game.player2))
+    to_tools = [item_distances(game, tool, cache) for tool in tools]
+    # Only the players' legs to the tools depend on rocks; the rest is fixed by the trees
+    key = ("chains", id(regions), starts, holding, tuple(tools), tuple(map(tuple, walled_off.values())),
+           tuple(to_tool[start] for to_tool in to_tools for start in starts))
+    if cache is not None and key in cache:
+        return cache[key]
+
+    openings = []
+    for region, cells in walled_off.items():
+        trees = set(borders[region])
+        areas = {region}
+        for opening in [opening for opening in openings if opening[0] & trees]:
+            openings.remove(opening)
+            trees |= opening[0]
+            areas |= opening[1]
+            cells = cells + opening[2]
+        openings.append((trees, areas, cells))
+    if len(openings) > MAX_OPENINGS:
+        if cache is not None:
+            cache[key] = 0
+        return 0
+
+    # After an opening, a player is somewhere on the burnable fence, which takes in the cuttable one
+    fences = [fence_distances(game, frozenset(trees), cache=cache) for trees, _, _ in openings]
+    cut_fences = [fence_distances(game, frozenset(trees), frozenset(areas), cache) for trees, areas, _ in openings]
+
+    def manhattan(a, b):
+        return abs(a // cols - b // cols) + abs(a % cols - b % cols)
+
+    # Stops are numbered: the two starts, then each opening's fence, then its mushrooms.
+    # A fence or a group of mushrooms is reached at whichever of its cells is nearest.
+    count = len(openings)
+    to_tool = [[to_tools[number][start] for number in range(len(tools))] for start in starts]
+    to_mushrooms = [[min(manhattan(start, cell) for cell in cells) for _, _, cells in openings] for start in starts]
+    for fence in fences:
+        to_tool.append([fence[tool] for tool in tools])
+        to_mushrooms.append([min(fence[cell] for cell in cells) for _, _, cells in openings])
+    for _, _, cells in openings:
+        to_tool.append([min(manhattan(cell, tool) for cell in cells) for tool in tools])
+        to_mushrooms.append([min(manhattan(cell, other) for cell in cells for other in other_cells)
+                             for _, _, other_cells in openings])
+    tool_to_fence = [[(cut_fence if game.restore_board[tool] == AXE else fence)[tool]
+                      for fence, cut_fence in zip(fences, cut_fences)] for tool in tools]
+    # Legs to a fence opened with the tool a player started out holding, from its
+    # start or from mushrooms it went to first (it never gets one back once it opens)
+    to_fence = []
+    for player in (game.player1, game.player2):
+        held_fences = cut_fences if player["axe"] > 0 else fences
+        legs = [[fence[start] for fence in held_fences] for start in starts]
+        legs += [[UNREACHABLE] * count for _ in fences]
+        legs += [[min(fence[cell] for cell in cells) for fence in held_fences] for _, _, cells in openings]
+        to_fence.append(legs)
+    known = {}
+
+    def cheapest(closed, unvisited, used, at, held):
+        # `closed` and `unvisited` are bit masks of openings, `used` of tools
+        if not closed and not unvisited:
+            return 0
+        state = (closed, unvisited, used, at, held)
+        if state in known:
+            return known[state]
+        best = UNREACHABLE
+        for player in (0, 1):
+            here = at[player]
+            for number in range(count):
+                bit = 1 << number
+                if closed & bit:
+                    moved = at[:player] + (2 + number,) + at[player + 1:]
+                    dropped = held[:player] + (False,) + held[player + 1:]
+                    if held[player]:
+                        leg = to_fence[player][here][number]
+                        if leg < best:
+                            best = min(best, leg + cheapest(closed & ~bit, unvisited, used, moved, dropped))
+                    # A tool picked up while holding one means the held one was used up on the way
+                    for tool in range(len(tools)):
+                        if used >> tool & 1:
+                            continue
+                        leg = to_tool[here][tool] + tool_to_fence[tool][number]
+                        if leg < best:
+                            best = min(best, leg + cheapest(closed & ~bit, unvisited, used | 1 << tool, moved, dropped))
+                elif unvisited & bit:
+                    leg = to_mushrooms[here][number]
+                    if leg < best:
+                        moved = at[:player] + (2 + count + number,) + at[player + 1:]
+                        best = min(best, leg + cheapest(closed, unvisited & ~bit, used, moved, held))
+        known[state] = best
+        return best
+
+    every = (1 << count) - 1
+    bound = cheapest(every, every, 0, (0, 1), holding)
+    if bound > UNREACHABLE:
+        bound = UNREACHABLE
+    if cache is not None:
+        cache[key] = bound
+    return bound
+
+
+def caged_rocks(game, item):
+    """Rocks that cannot move before someone reaches the item at board index `item`.
+
+    A push needs free cells on both sides of the rock along the push. Until
+    someone reaches the item, its cell is as blocked as the board edge, so a
+    set of rocks each blocked on both axes by the edge, the item or another
+    rock of the set can never have a first rock move. This is the largest
+    such set.
+    """
+    rows = game.rows
+    cols = game.cols
+    board = game.board
+    occupied = {game.player1["yPos"] * cols + game.player1["xPos"],
+                game.player2["yPos"] * cols + game.player2["xPos"]}
+    caged = set()
+    index = board.find(ROCK)
+    while index != -1:
+        # The cell a player stands on still shows the rock they pushed off it
+        if index not in occupied:
+            caged.add(index)
+        index = board.find(ROCK, index + 1)
+
+    def blocked(y, x):
+        if not (0 <= y < rows and 0 <= x < cols):
+            return True
+        index = y * cols + x
+        return index == item or index in caged
+
+    changed = True
+    while changed:
+        changed = False
+        for index in list(caged):
+            y, x = divmod(index, cols)
+            if not (blocked(y - 1, x) or blocked(y + 1, x)) or not (blocked(y, x - 1) or blocked(y, x + 1)):
+                caged.discard(index)
+                changed = True
+    return caged
+
+
+def item_distances(game, item, cache=None):
+    """Fewest moves from every cell to the item at board index `item`, going around caged_rocks().
+
+    Cells that cannot reach it are UNREACHABLE. Only valid until someone
+    first reaches the item; cached by board and item, and by the cage
+    itself, since most pushes leave the cage as it was.
+    """
+    cols = game.cols
+    # A rock shown under a player is not really there
+    stale = tuple(index for index in (game.player1["yPos"] * cols + game.player1["xPos"],
+                                      game.player2["yPos"] * cols + game.player2["xPos"])
+                  if game.board[index] == ROCK)
+    key = (bytes(game.board), item, stale)
+    if cache is not None and key in cache:
+        return cache[key]
+    caged = caged_rocks(game, item)
+    cage_key = (item, frozenset(caged))
+    if cache is not None and cage_key in cache:
+        cache[key] = cache[cage_key]
+        return cache[key]
+    distances = [UNREACHABLE] * (game.rows * game.cols)
+    distances[item] = 0
+    cells = [item]
+    for cell in cells:
+        for neighbour in grid_neighbours(cell, game.rows, game.cols):
+            if distances[neighbour] == UNREACHABLE and neighbour not in caged:
+                distances[neighbour] = distances[cell] + 1
+                cells.append(neighbour)
+    if cache is not None:
+        cache[key] = cache[cage_key] = distances
+    return distances
+
+
+def spanning_tree(game, players, mushrooms, tools=(), cache=None):
+    """Weight of a spanning tree of the mushrooms and tools hanging off a root made of both players.
+
+    Each player's route visits terminals one after another, so routes are
+    spanning paths and their weight is at least this tree's. Legs are
+    Manhattan distances, except a leg that first reaches a tool, which has
+    to go around that tool's caged rocks.
+    """
+    cols = game.cols
+    terminals = [(y, x, None) for y, x in mushrooms]
+    terminals += [(*divmod(tool, cols), item_distances(game, tool, cache)) for tool in tools]
+
+    def leg(a, b):
+        ay, ax, to_a = a
+        by, bx, to_b = b
+        distance = abs(ay - by) + abs(ax - bx)
+        if to_a is not None and to_b is not None:
+            # Whichever tool is reached second was still caged on the way
+            distance = max(distance, min(to_a[by * cols + bx], to_b[ay * cols + ax]))
+        return distance
+
+    # Prim's algorithm, starting with every terminal hanging off the root
+    distance = []
+    for y, x, to_terminal in terminals:
+        if to_terminal is None:
+            distance.append(min(abs(y - py) + abs(x - px) for py, px in players))
+        else:
+            distance.append(min(to_terminal[py * cols + px] for py, px in players))
+    total = 0
+    while terminals:
+        nearest = min(range(len(terminals)), key=distance.__getitem__)
+        total += distance[nearest]
+        terminal = terminals.pop(nearest)
+        distance.pop(nearest)
+        distance = [min(d, leg(terminal, other)) for d, other in zip(distance, terminals)]
+    return total
+
+
+def heuristic(game, cache=None):
+    """Lower bound on the moves still needed to collect every mushroom.
+
+    Both players' paths together form a forest rooted at the two players
+    that touches every mushroom, so merging the players into one root gives
+    a spanning tree: its MST weight can never exceed the moves left. When
+    trees wall mushrooms off, the forest also has to touch the tools that
+    clear them, so the cheapest choice of those tools joins the tree.
+    """
+    players = ((game.player1["yPos"], game.player1["xPos"]),
+               (game.player2["yPos"], game.player2["xPos"]))
+    mushrooms = []
+    index = game.board.find(MUSHROOM)
+    while index != -1:
+        position = divmod(index, game.cols)
+        # A mushroom under a player has already been collected
+        if position not in players:
+            mushrooms.append(position)
+        index = game.board.find(MUSHROOM, index + 1)
+
+    if not mushrooms:
+        return 0
+    areas = walled_off_areas(game, mushrooms, cache)
+    needed = tools_needed(game, areas, cache)
+    if not needed:
+        bound = spanning_tree(game, players, mushrooms)
+    else:
+        tools = [index for index in game.level.items
+                 if game.restore_board[index] == AXE or game.restore_board[index] == FLAMETHROWER]
+        bound = min(spanning_tree(game, players, mushrooms, chosen, cache)
+                    for chosen in combinations(tools, min(needed, len(tools))))
+    return max(bound, opening_chains(game, areas, cache))
+
+
+def pushed_into_deadlock(game, action):
+    """Whether the move just made pushed a rock where it is stuck and walls off a mushroom"""
+    y_move, x_move, player_num = MOVES[action]
+    player = game.player1 if player_num == 1 else game.player2
+    index = player["yPos"] * game.cols + player["xPos"]
+    # A player that pushed a rock ends up standing on the rock's old cell
+    if game.board[index] != ROCK:
+        return False
+    beyond = index + y_move * game.cols + x_move
+    # Only stuck rocks (an O(1) table lookup) are worth the full reachability check
+    return game.board[beyond] == ROCK and game.rock_stuck(beyond) and is_dead(game)
+
+
+def canonical_key(game):
+    """The state key shared by a state and its mirror image, and whether the state is the mirror one.
+
+    Both players follow the same rules, so swapping them round leaves as
+    many moves to go; the search only has to visit one of the two.
+    """
+    key = game.state_key()
+    mirrored = game.mirrored_state_key()
+    if mirrored < key:
+        return mirrored, True
+    return key, False
+
+
+def solve(game, max_states=DEFAULT_MAX_STATES, prune_deadlocks=True):
+    """Return the shortest winning move string, or None if the level cannot be won.
+
+    Raises SearchLimitReached if more than max_states states would have to
+    be kept in memory to finish the search.
+    """
+    start = game.snapshot()
+    start_key, start_mirrored = canonical_key(game)
+    # state key -> (moves so far, parent state key, action that led here,
+    # whether the action was made from the parent's mirror image, whether it
+    # led to this state's mirror image); full snapshots are only kept for
+    # states still on the frontier
+    seen = {start_key: (0, None, None, None, start_mirrored)}
+    # Open areas of each tree layout and item distances of each board met,
+    # shared by the heuristic calls
+    regions = {}
+    frontier = [(heuristic(game, regions), 0, 0, start_key, start_mirrored, start)]
+    counter = 0
+
+    try:
+        while frontier:
+            _, negative_cost, _, key, mirrored, state = heapq.heappop(frontier)
+            cost = -negative_cost
+            if cost > seen[key][0]:
+                continue
+            if state.mushrooms_collected == game.total_mushrooms:
+                return reconstruct(seen, key)
+
+            for action in ACTIONS:
+                game.restore(state)
+                if action in PICKUPS:
+                    if not game.pickup_item(PICKUPS[action]):
+                        continue
+                    next_cost = cost
+                else:
+                    result = game.move(*MOVES[action])
+                    if result == 'blocked' or result == 'loss':
+                        continue
+                    if prune_deadlocks and pushed_into_deadlock(game, action):
+                        continue
+                    next_cost = cost + 1
+
+                next_key, next_mirrored = canonical_key(game)
+                known = seen.get(next_key)
+                if known is not None and known[0] <= next_cost:
+                    continue
+                if known is None and len(seen) >= max_states:
+                    raise SearchLimitReached(f"more than {max_states} states needed")
+
+                seen[next_key] = (next_cost, key, action, mirrored, next_mirrored)
+                next_state = game.snapshot()
+                counter += 1
+                heapq.heappush(frontier, (next_cost + heuristic(game, regions), -next_cost, counter,
+                                          next_key, next_mirrored, next_state))
+        return None
+    finally:
+        game.restore(start)
+
+
+def reconstruct(seen, key):
+    """Follow parent links back to the start and return the action string.
+
+    A state's path may have been replaced by one reaching its mirror image
+    after its children were found, so the actions are replayed from the
+    start, swapping the players round wherever the path so far has ended
+    up on the mirror image of the state an action was made from.
+    """
+    steps = []
+    while True:
+        _, parent, action, from_mirrored, to_mirrored = seen[key]
+        if parent is None:
+            mirrored = to_mirrored
+            break
+        steps.append((action, from_mirrored, to_mirrored))
+        key = parent
+    actions = []
+    for action, from_mirrored, to_mirrored in reversed(steps):
+        if mirrored == from_mirrored:
+            actions.append(action)
+            mirrored = to_mirrored
+        else:
+            actions.append(MIRRORED[action])
+            mirrored = not to_mirrored
+    return "".join(actions)
+
+
+def solve_level_file(stage_file, max_states=DEFAULT_MAX_STATES):
+    """Solve a level file, returning the winning move string or None"""
+    return solve(GameState(load_level_file(stage_file)), max_states)
+
+
+def main():
+    parser = ArgumentParser(description="Find the minimum-move solution of a Shroom Raider level")
+    parser.add_argument('-f', '--file', required=True, help='Stage file path')
+    parser.add_argument('--max-states', type=int, default=DEFAULT_MAX_STATES,
+                        help='Give up after keeping this many states in memory')
+    args = parser.parse_args()
+
+    try:
+        solution = solve_level_file(args.file, args.max_states)
+    except SearchLimitReached as error:
+        print(f"Gave up: {error}")
+        return
+    if solution is None:
+        print("No solution")
+    else:
+        moves = sum(action in MOVES for action in solution)
+        print(f"Par: {moves} moves")
+        print(solution)
+
+
+if __name__ == "__main__":
+    main()
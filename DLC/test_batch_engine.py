@@ -0,0 +1,82 @@
+import random
+import pytest
+import shroom_raider
+import level_generator
+
+np = pytest.importorskip("numpy")
+import batch_engine
+
+
+RESULTS = {"moved": batch_engine.MOVED, "blocked": batch_engine.BLOCKED,
+           "win": batch_engine.WIN, "loss": batch_engine.LOSS}
+MOVES = shroom_raider.MOVE_KEYS
+
+
+def play(game, key):
+    """Play one key on a GameState and return the batch engine's result code"""
+    if key in "po":
+        picked = game.pickup_item(1 if key == "p" else 2)
+        return batch_engine.PICKED if picked else batch_engine.BLOCKED
+    return RESULTS[game.move(*MOVES[key])]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_batch_matches_game_state(seed):
+    text, _ = level_generator.generate_level(10, 12, 2, mushrooms=4, trees=0.4, water=0.1,
+                                             rocks=0.15, items=0.15, seed=seed)
+    count = 32
+    batch = batch_engine.BatchGame(text, count)
+    games = [shroom_raider.GameState(text) for _ in range(count)]
+    rng = random.Random(seed)
+
+    for _ in range(150):
+        keys = "".join(rng.choice("wsadikjlpopo") for _ in range(count))
+        results = batch.step(batch_engine.encode_actions(keys))
+        tiles = batch.board_with_players()
+        for number, (game, key) in enumerate(zip(games, keys)):
+            if batch.status[number] != batch_engine.PLAYING and results[number] == batch_engine.BLOCKED:
+                continue
+            assert results[number] == play(game, key)
+            assert bytes(tiles[number]) == bytes(game.board_with_players())
+            assert bytes(batch.restore_board[number]) == bytes(game.restore_board)
+            assert batch.axes[number].tolist() == [game.player1["axe"], game.player2["axe"]]
+            assert batch.mushrooms_collected[number] == game.total_mushrooms_collected
+
+
+def test_burn_skips_cut_tree_under_player():
+    text = """r = 4; c = 7
+
+TTTTTTT
+T.x*..T
+TL...OT
+TTTTTTT"""
+    batch = batch_engine.BatchGame(text, 1)
+    game = shroom_raider.GameState(text)
+    # L cuts into the top wall and stays there while O burns the rest of it
+    for key in "wdpwjjioi":
+        assert batch.step(batch_engine.encode_actions(key))[0] == play(game, key)
+    assert bytes(batch.board_with_players()[0]) == bytes(game.board_with_players())
+    assert batch.board[0, 2] == shroom_raider.TREE
+    assert batch.board[0, 0] == batch.board[0, 3 * 7 + 6] == shroom_raider.EMPTY
+
+
+def test_finished_games_stay_put_until_reset():
+    batch = batch_engine.BatchGame(None, 2)
+    assert batch.step(batch_engine.encode_actions("sa")).tolist() == [batch_engine.MOVED] * 2
+    assert batch.step(batch_engine.encode_actions("da")).tolist() == [batch_engine.WIN, batch_engine.MOVED]
+    assert batch.status.tolist() == [batch_engine.WON, batch_engine.PLAYING]
+
+    position = batch.positions[0].tolist()
+    assert batch.step(batch_engine.encode_actions("aw")).tolist() == [batch_engine.BLOCKED, batch_engine.MOVED]
+    assert batch.positions[0].tolist() == position
+
+    batch.reset(batch.status != batch_engine.PLAYING)
+    assert batch.status.tolist() == [batch_engine.PLAYING] * 2
+    assert batch.positions[0].tolist() == batch.initial_positions.tolist()
+    assert batch.move_count.tolist() == [0, 3]
+
+
+def test_encode_actions_rejects_unknown_keys():
+    assert batch_engine.encode_actions("wP").tolist() == [0, 8]
+    with pytest.raises(ValueError):
+        batch_engine.encode_actions("wq")
@@ -0,0 +1,29 @@
+import benchmark
+import shroom_raider
+
+
+def test_synthetic_level_is_playable():
+    game = shroom_raider.GameState(benchmark.synthetic_level(12, 20))
+    assert (game.rows, game.cols) == (12, 20)
+    assert game.player1["yPos"] < game.player2["yPos"]
+    assert game.total_mushrooms == 1
+
+
+def test_run_benchmarks_reports_every_engine(tmp_path):
+    results = benchmark.run_benchmarks(sizes=(10,), min_time=0.001, repeats=1,
+                                       only="synthetic10x10", report=lambda line: None)
+    assert {key.split("[")[0] for key in results} >= {
+        "base.input_handler", "dlc.move", "dlc.rocks_and_burns", "dlc.load_level",
+        "dlc.get_board_string", "dlc.export_to_file", "base.term_print",
+    }
+    assert all(rate > 0 for rate in results.values())
+
+    baseline = tmp_path / "baseline.json"
+    benchmark.save_baseline(results, baseline)
+    assert benchmark.load_baseline(baseline) == results
+
+
+def test_compare_flags_slowdowns():
+    lines, regressions = benchmark.compare({"a": 50.0, "b": 95.0, "c": 1.0}, {"a": 100.0, "b": 100.0})
+    assert regressions == ["a"]
+    assert lines[2].endswith("(new)")
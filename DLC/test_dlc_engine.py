@@ -0,0 +1,560 @@
+import io
+import sys
+import json
+import random
+import subprocess
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import shroom_raider
+
+
+LEVEL = """r = 5; c = 6
+
+TTTTTT
+T.+x~T
+TLR..T
+T*.O.T
+TTTTTT"""
+
+
+@pytest.fixture
+def game():
+    return shroom_raider.GameState(LEVEL)
+
+
+# ----------------- BASIC STRUCTURAL TESTS -----------------
+
+def test_load_level_finds_players_and_mushrooms(game):
+    assert (game.player1["yPos"], game.player1["xPos"]) == (2, 1)
+    assert (game.player2["yPos"], game.player2["xPos"]) == (3, 3)
+    assert game.total_mushrooms == 1
+    assert (game.rows, game.cols) == (5, 6)
+
+
+def test_board_string_renders_emoji(game):
+    lines = game.get_board_string().split("\n")
+    assert lines[2].split(" ")[:2] == ["🌲", "🧑"]
+    assert "🪨" in lines[2]
+    assert "👩" in lines[3]
+
+
+def test_export_matches_level_format(game, tmp_path):
+    output = tmp_path / "output.txt"
+    game.export_to_file(output, "No Clear")
+    assert output.read_text(encoding="utf-8") == "No Clear\n" + LEVEL.replace("\n\n", "\n") + "\n"
+
+
+def test_restart_resets_player_and_board(game):
+    game.move(-1, 0, 1)
+    game.move(0, 1, 1)
+    game.restart()
+    assert game.board == shroom_raider.GameState(LEVEL).board
+    assert game.player1 == game.initial_player1
+    assert game.move_count == 0
+
+
+# ----------------- MOVEMENT TESTS -----------------
+
+def test_move_into_mushroom_wins(game):
+    assert game.move(-1, 0, 1) == 'moved'
+    assert game.move(0, 1, 1) == 'win'
+    assert game.total_mushrooms_collected == 1
+
+
+def test_players_block_each_other(game):
+    game.move(1, 0, 1)
+    assert game.move(0, 1, 1) == 'moved'
+    assert game.move(0, 1, 1) == 'blocked'
+
+
+def test_rock_push_and_paving(game):
+    assert game.move(0, 1, 1) == 'moved'
+    assert game.board[2 * game.cols + 3] == shroom_raider.ROCK
+
+
+def test_move_off_board_edge_is_blocked():
+    game = shroom_raider.GameState("L.\n..")
+    assert game.move(-1, 0, 1) == 'blocked'
+    assert game.move(0, -1, 1) == 'blocked'
+
+
+def test_water_triggers_loss(game):
+    game.player1.update(yPos=1, xPos=3)
+    assert game.move(0, 1, 1) == 'loss'
+
+
+# ----------------- ITEM TESTS -----------------
+
+def test_pickup_item_clears_tile_after_leaving(game):
+    game.player1.update(yPos=1, xPos=3)
+    assert game.pickup_item(1)
+    assert not game.pickup_item(1)
+    game.move(1, 0, 1)
+    assert game.board[1 * game.cols + 3] == shroom_raider.EMPTY
+    assert game.player1["axe"] == 1
+
+
+def test_flamethrower_burns_connected_trees(game):
+    game.move(1, 0, 1)
+    assert game.pickup_item(1)
+    assert game.move(0, -1, 1) == 'moved'
+    assert shroom_raider.TREE not in game.board
+
+
+# ----------------- LEVEL CACHE TESTS -----------------
+
+def test_compiled_level_round_trips(game):
+    level = shroom_raider.compile_level(LEVEL)
+    copy = shroom_raider.CompiledLevel.from_buffer(level.to_bytes())
+
+    assert copy.board == level.board
+    assert (copy.player1, copy.player2) == ((2, 1), (3, 3))
+    assert (copy.mushrooms, copy.items) == (1, (9, 19))
+    assert copy.tree_labels == level.tree_labels
+    assert copy.tree_components == level.tree_components
+    assert (copy.fixed_walls, copy.dead_squares) == (level.fixed_walls, level.dead_squares)
+    assert shroom_raider.GameState(copy).state_key() == game.state_key()
+
+
+def test_dead_squares_need_fixed_walls_on_both_axes():
+    # Without tools the trees are fixed walls; the player's start never is
+    level = shroom_raider.compile_level("""r = 4; c = 5
+
+TTTTT
+TL..T
+T..OT
+TTTTT""")
+    dead = [index for index, flag in enumerate(level.dead_squares) if flag]
+    assert dead == [6, 8, 11, 13]
+    assert not level.fixed_walls[6]
+    with_axe = shroom_raider.compile_level("r = 1; c = 3\n\nLx.")
+    assert not any(with_axe.fixed_walls)
+    assert list(with_axe.dead_squares) == [1, 0, 1]
+
+
+def test_rocks_in_a_two_by_two_block_are_stuck():
+    game = shroom_raider.GameState("""r = 5; c = 6
+
+......
+.RR...
+.RR.R.
+L.....
+......""")
+    assert game.rock_stuck(1 * 6 + 1) and game.rock_stuck(2 * 6 + 2)
+    assert not game.rock_stuck(2 * 6 + 4)
+
+
+def test_level_cache_reuses_and_invalidates(tmp_path, monkeypatch):
+    stage = tmp_path / "stage.txt"
+    stage.write_text(LEVEL, encoding="utf-8")
+    cache = tmp_path / "cache"
+    first = shroom_raider.load_level_file(stage, cache)
+    assert len(list(cache.glob("*.lvl"))) == 1
+
+    # A fresh process has no in-memory copy and has to read the cached file
+    monkeypatch.setattr(shroom_raider, "COMPILED_LEVELS", {})
+    monkeypatch.setattr(shroom_raider, "compile_level", None)
+    cached = shroom_raider.load_level_file(stage, cache)
+    assert cached is not first and cached.board == first.board
+
+    monkeypatch.undo()
+    stage.write_text(LEVEL.replace("+", "."), encoding="utf-8")
+    changed = shroom_raider.load_level_file(stage, cache)
+    assert changed.mushrooms == 0
+    assert len(list(cache.glob("*.lvl"))) == 2
+
+
+# ----------------- BATCH MODE TESTS -----------------
+
+def test_batch_mode_writes_outputs_and_summary(tmp_path):
+    stage = tmp_path / "stage.txt"
+    stage.write_text(LEVEL, encoding="utf-8")
+    manifest = tmp_path / "jobs.jsonl"
+    jobs = [
+        {"level": str(stage), "moves": "wd", "output": str(tmp_path / "win.txt")},
+        {"level": str(stage), "moves": "s", "output": str(tmp_path / "stuck.txt")},
+        {"level": str(tmp_path / "missing.txt"), "moves": "w", "output": str(tmp_path / "x.txt")},
+    ]
+    manifest.write_text("\n".join(json.dumps(job) for job in jobs), encoding="utf-8")
+    summary = tmp_path / "summary.txt"
+
+    results = shroom_raider.run_batch_mode(manifest, summary, workers=2)
+
+    assert results[:2] == ["Clear", "No Clear"]
+    assert results[2].startswith("Error")
+    assert (tmp_path / "win.txt").read_text(encoding="utf-8").startswith("Clear\n")
+    assert summary.read_text(encoding="utf-8").splitlines()[1] == f"{tmp_path / 'stuck.txt'}\tNo Clear"
+
+
+def test_read_moves_expands_run_lengths_across_chunks():
+    stream = io.StringIO("d1\n2W 3p0s")
+    assert "".join(shroom_raider.read_moves(stream, chunk_size=2, run_lengths=True)) == "d" * 12 + "WWW" + "s"
+
+
+def test_digits_are_plain_keys_without_run_lengths(tmp_path):
+    assert "".join(shroom_raider.read_moves(io.StringIO("d12\n"), chunk_size=2)) == "d12\n"
+    stage = tmp_path / "stage.txt"
+    stage.write_text(LEVEL, encoding="utf-8")
+    # Expanded, a2 would walk into the wall twice and the level would be cleared
+    assert shroom_raider.run_terminal_mode(stage, "s0a2w1d1", tmp_path / "out.txt") == "No Clear"
+
+
+def test_terminal_mode_streams_moves_from_stdin(tmp_path, level_cache):
+    stage = tmp_path / "stage.txt"
+    stage.write_text(LEVEL, encoding="utf-8")
+    output = tmp_path / "out.txt"
+    subprocess.run([sys.executable, Path(__file__).with_name("shroom_raider.py"), "-f", str(stage), "-M", "-", "--run-lengths",
+                    "-o", str(output)],
+                   input="s0a2\nw1d1\n", text=True, check=True)
+    assert output.read_text(encoding="utf-8").startswith("Clear\n")
+    assert len(list(level_cache.glob("*.lvl"))) == 1
+
+
+def test_profiler_times_phases_and_counts_engine_work(tmp_path):
+    stage = tmp_path / "stage.txt"
+    stage.write_text(LEVEL, encoding="utf-8")
+    profiler = shroom_raider.Profiler()
+
+    # A failed pickup is not a blocked move, as in the base game
+    result = shroom_raider.run_terminal_mode(stage, "paswwd", tmp_path / "out.txt", profiler=profiler)
+
+    assert result == "Clear"
+    assert set(profiler.timings) == set(shroom_raider.PROFILE_PHASES)
+    assert profiler.counters["moves"] == 6
+    assert profiler.counters["blocked_moves"] == 1
+    assert profiler.counters["clear_space"] == 4
+    assert profiler.counters["bytes_written"] == (tmp_path / "out.txt").stat().st_size
+    # Only loading copies whole boards; the output is written a row at a time straight from the board
+    assert json.loads(json.dumps(profiler.as_dict()))["counters"]["board_copies"] == 2
+
+
+def test_profile_json_and_output_cannot_share_stdout(tmp_path):
+    stage = tmp_path / "stage.txt"
+    stage.write_text(LEVEL, encoding="utf-8")
+    run = subprocess.run([sys.executable, Path(__file__).with_name("shroom_raider.py"), "-f", str(stage),
+                          "-m", "d", "-o", "-", "--profile-json", "-"], capture_output=True, text=True)
+    assert run.returncode == 2
+    assert "stdout" in run.stderr and not run.stdout
+
+
+def test_headless_modes_do_not_import_textual():
+    code = "import sys, shroom_raider; print('textual' in sys.modules or 'rich' in sys.modules)"
+    imported = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                              cwd=shroom_raider.Path(shroom_raider.__file__).parent, check=True)
+    assert imported.stdout.strip() == "False"
+
+
+# ----------------- STATE KEY TESTS -----------------
+
+def recomputed_zobrist(game):
+    key = shroom_raider.zobrist_key
+    zobrist = game.initial_zobrist
+    for index, (old, new) in enumerate(zip(game.initial_board, game.board)):
+        if old != new:
+            zobrist ^= key(index, old) ^ key(index, new)
+    initial_restore = game.initial_board.translate(shroom_raider.LEAVE_TILE)
+    for index, (old, new) in enumerate(zip(initial_restore, game.restore_board)):
+        if old != new:
+            zobrist ^= key(index, shroom_raider.RESTORE_KEYS + old) ^ key(index, shroom_raider.RESTORE_KEYS + new)
+    for slot, player, initial in ((1, game.player1, game.initial_player1), (2, game.player2, game.initial_player2)):
+        value = shroom_raider.POSITION_KEYS + slot
+        zobrist ^= key(initial["yPos"] * game.cols + initial["xPos"], value)
+        zobrist ^= key(player["yPos"] * game.cols + player["xPos"], value)
+        zobrist ^= key(slot, shroom_raider.AXE_KEYS) ^ key(slot, shroom_raider.AXE_KEYS + player["axe"])
+        zobrist ^= key(slot, shroom_raider.FLAMETHROWER_KEYS) ^ key(slot, shroom_raider.FLAMETHROWER_KEYS + player["flamethrower"])
+    return zobrist
+
+
+def test_zobrist_matches_full_recompute(game):
+    # Rock push, flamethrower pickup and burn, then player 2 moving
+    for y_move, x_move, player_num in ((0, 1, 1), (1, 0, 1), (0, -1, 1), (0, -1, 1), (-1, 0, 2), (0, 1, 2)):
+        game.move(y_move, x_move, player_num)
+        game.pickup_item(player_num)
+        assert game.zobrist == recomputed_zobrist(game)
+    assert shroom_raider.TREE not in game.board
+
+
+def test_state_key_ignores_move_order(game):
+    other = shroom_raider.GameState(LEVEL)
+    game.move(1, 0, 1)
+    game.move(0, 1, 2)
+    other.move(0, 1, 2)
+    other.move(1, 0, 1)
+    assert game.state_key() == other.state_key()
+    game.move(-1, 0, 1)
+    assert game.state_key() != other.state_key()
+
+
+def test_mirrored_state_key_swaps_players(game):
+    # Player 1 picks up the axe, so the tools have to swap round as well
+    for key in "dwdp":
+        game.play_key(key)
+    mirrored = game.mirrored_state_key()
+    game.player1, game.player2 = game.player2, game.player1
+    game.zobrist = game.compute_zobrist()
+    assert game.state_key() == mirrored
+
+
+def test_restart_restores_state_key(game):
+    start = game.state_key()
+    game.move(0, 1, 1)
+    game.restart()
+    assert game.state_key() == start
+
+
+# ----------------- TREE COMPONENT TESTS -----------------
+
+def partition(game, labels):
+    groups = {}
+    for index, label in enumerate(labels):
+        if label:
+            groups.setdefault(label, set()).add(index)
+    return sorted(sorted(group) for group in groups.values())
+
+
+def test_cut_tree_splits_components():
+    random.seed(11)
+    rows = ["".join(random.choice("TTT.") for _ in range(12)) for _ in range(10)]
+    game = shroom_raider.GameState("\n".join(rows))
+    trees = [index for index, tile in enumerate(game.board) if tile == shroom_raider.TREE]
+    random.shuffle(trees)
+    for index in trees[:60]:
+        game.cut_tree(index)
+        game.board[index] = shroom_raider.EMPTY
+        assert partition(game, game.tree_labels) == partition(game, game.label_tree_components()[0])
+
+
+def test_burn_large_forest_without_recursion():
+    size = 120
+    forest = ["T" * size for _ in range(size)]
+    forest[0] = "L*" + "T" * (size - 2)
+    game = shroom_raider.GameState("\n".join(forest))
+    game.move(0, 1, 1)
+    game.pickup_item(1)
+    assert game.move(1, 0, 1) == 'moved'
+    assert shroom_raider.TREE not in game.board
+    game.restart()
+    assert game.board.count(shroom_raider.TREE) == size * size - 2
+
+
+def test_cut_copies_only_the_labels_it_changes():
+    # Rows of trees; the cut splits row 11, which lies inside one chunk of labels
+    size = 120
+    game = shroom_raider.GameState("\n".join(("T" if row % 2 else ".") * size if row else "L" + "." * (size - 1)
+                                             for row in range(size)))
+    cut = 11 * size + 60
+    before = game.tree_labels
+    game.cut_tree(cut)
+    game.board[cut] = shroom_raider.EMPTY
+    after = game.tree_labels
+    assert before[cut] and not after[cut]
+    assert sum(old is not new for old, new in zip(before.chunks, after.chunks)) == 1
+    assert partition(game, after) == partition(game, game.label_tree_components()[0])
+
+
+# ----------------- JOURNAL TESTS -----------------
+
+def test_undo_redo_round_trip():
+    game = shroom_raider.GameState(LEVEL, journal=True)
+    states = [(bytes(game.board), bytes(game.restore_board), game.state_key(), game.move_count)]
+    # Rock push, flamethrower pickup and burn, then player 2 moving
+    for y_move, x_move, player_num in ((0, 1, 1), (1, 0, 1), (0, -1, 1), (0, 0, 0), (0, -1, 1), (0, 1, 2)):
+        if player_num:
+            assert game.move(y_move, x_move, player_num) == 'moved'
+        else:
+            assert game.pickup_item(1)
+        states.append((bytes(game.board), bytes(game.restore_board), game.state_key(), game.move_count))
+
+    for state in reversed(states[:-1]):
+        assert game.undo()
+        assert (bytes(game.board), bytes(game.restore_board), game.state_key(), game.move_count) == state
+    assert not game.undo()
+
+    for state in states[1:]:
+        assert game.redo()
+        assert (bytes(game.board), bytes(game.restore_board), game.state_key(), game.move_count) == state
+    assert not game.redo()
+
+
+def test_blocked_moves_are_not_journaled():
+    game = shroom_raider.GameState(LEVEL, journal=True)
+    assert game.move(0, -1, 1) == 'blocked'
+    assert not game.pickup_item(1)
+    assert game.history == []
+
+
+def test_journaled_restart_only_undoes_changes():
+    game = shroom_raider.GameState(LEVEL, journal=True)
+    start = game.state_key()
+    game.move(0, 1, 1)
+    game.move(-1, 0, 2)
+    game.restart()
+    assert game.state_key() == start
+    assert game.board == game.initial_board
+    assert game.history == [] and game.future == []
+
+
+def test_redo_reports_winning_step():
+    game = shroom_raider.GameState(LEVEL, journal=True)
+    game.move(-1, 0, 1)
+    assert game.move(0, 1, 1) == 'win'
+    game.undo()
+    assert game.redo() == 'win'
+
+
+def test_snapshot_shares_unchanged_rows():
+    game = shroom_raider.GameState(LEVEL)
+    first = game.snapshot()
+    game.move(0, 1, 1)
+    second = game.snapshot()
+    assert second.board_bytes() == bytes(game.board)
+    # Only the pushed rock's and player's row is copied
+    changed = [row for row, (old, new) in enumerate(zip(first.board[0], second.board[0])) if old is not new]
+    assert changed == [2]
+    # Items left behind did not change, so every row of them is shared
+    assert all(old is new for old, new in zip(first.restore_board[0], second.restore_board[0]))
+
+
+def test_restore_and_fork_round_trip():
+    game = shroom_raider.GameState(LEVEL, journal=True)
+    start = game.snapshot()
+    start_key = game.state_key()
+    fork = game.fork()
+    assert fork.move(1, 0, 1) == 'moved'
+    assert fork.pickup_item(1)
+    assert game.state_key() == start_key
+
+    game.move(0, 1, 1)
+    game.restore(fork.snapshot())
+    assert game.state_key() == fork.state_key()
+    assert game.board == fork.board and game.restore_board == fork.restore_board
+    assert game.history == []
+
+    game.restore(start)
+    assert game.state_key() == start_key
+    assert game.board == game.initial_board
+    assert game.move_count == 0
+
+
+def test_journaled_restart_after_restore_and_fork():
+    game = shroom_raider.GameState(LEVEL, journal=True)
+    start = game.state_key()
+    game.move(0, 1, 1)
+    moved = game.snapshot()
+    game.restart()
+    game.restore(moved)
+    game.move(-1, 0, 2)
+    game.restart()
+    assert game.state_key() == start
+    assert game.board == game.initial_board
+    assert game.history == [] and game.future == []
+
+    game.move(0, 1, 1)
+    fork = game.fork()
+    fork.restart()
+    assert fork.state_key() == start
+    assert fork.board == fork.initial_board
+    assert fork.move_count == 0
+
+
+def test_journaled_restart_after_import():
+    game = shroom_raider.GameState(LEVEL, journal=True)
+    start = game.state_key()
+    game.move(0, 1, 1)
+    state = game.export_state()
+    game.restart()
+    game.import_state(state)
+    game.restart()
+    assert game.state_key() == start
+    assert game.board == game.initial_board
+    assert game.move_count == 0
+
+
+# ----------------- RENDERING TESTS -----------------
+
+def test_dirty_rows_track_moves(game):
+    assert game.take_dirty_rows() == set(range(game.rows))
+    assert game.take_dirty_rows() == set()
+    game.move(-1, 0, 1)
+    assert game.take_dirty_rows() == {1, 2}
+    game.move(0, -1, 1)
+    assert game.take_dirty_rows() == set()
+
+
+def test_row_strings_match_board_string(game):
+    game.move(0, 1, 1)
+    rows = [game.row_string(row) for row in range(game.rows)]
+    assert "\n".join(rows) == game.get_board_string()
+    assert rows[2].split(" ")[:3] == ["🌲", "　", "🧑"]
+
+
+# ----------------- LEADERBOARD TESTS -----------------
+
+def test_leaderboard_keeps_full_sorted_history(tmp_path):
+    leaderboard = shroom_raider.LeaderboardManager(tmp_path / "leaderboard.json")
+    for moves in (30, 12, 40, 12, 25, 8, 50, 60, 70, 80, 90, 100):
+        leaderboard.add_score(f"p{moves}", "Level 1", moves)
+    top = leaderboard.get_leaderboard("Level 1")
+    assert [entry["moves"] for entry in top] == [8, 12, 12, 25, 30, 40, 50, 60, 70, 80]
+    assert len(leaderboard.get_leaderboard("Level 1", limit=None)) == 12
+
+
+def test_leaderboard_batches_and_survives_torn_lines(tmp_path):
+    path = tmp_path / "leaderboard.json"
+    leaderboard = shroom_raider.LeaderboardManager(path, flush_after=2, flush_interval=60)
+    leaderboard.add_score("a", "Level 2", 9)
+    assert not leaderboard.log_file.exists()
+    leaderboard.add_score("b", "Level 2", 7)
+    with open(leaderboard.log_file, 'a', encoding='utf-8') as f:
+        f.write('{"level": "Level 2", "user')
+    leaderboard.add_score("c", "Level 2", 8)
+    leaderboard.flush()
+
+    reloaded = shroom_raider.LeaderboardManager(path)
+    assert [entry["username"] for entry in reloaded.get_leaderboard("Level 2")] == ["b", "c", "a"]
+
+
+def test_leaderboard_merges_concurrent_writers(tmp_path):
+    path = tmp_path / "leaderboard.json"
+    first = shroom_raider.LeaderboardManager(path, flush_after=1)
+    second = shroom_raider.LeaderboardManager(path, flush_after=1)
+    first.COMPACT_AFTER = 3
+    for moves in range(4):
+        first.add_score("first", "Level 3", moves)
+        second.add_score("second", "Level 3", moves)
+    second.flush()
+    assert len(second.get_leaderboard("Level 3", limit=None)) == 8
+    assert len(shroom_raider.LeaderboardManager(path).get_leaderboard("Level 3", limit=None)) == 8
+
+
+def test_leaderboard_compaction_crash_does_not_double_count(tmp_path):
+    path = tmp_path / "leaderboard.json"
+    leaderboard = shroom_raider.LeaderboardManager(path, flush_after=1)
+    for moves in range(3):
+        leaderboard.add_score("a", "Level 5", moves)
+    log = leaderboard.log_file.read_bytes()
+    with leaderboard.locked():
+        leaderboard.save_leaderboard()
+    # As if the process died after replacing the snapshot but before emptying the log
+    leaderboard.log_file.write_bytes(log)
+
+    reloaded = shroom_raider.LeaderboardManager(path, flush_after=1)
+    assert len(reloaded.get_leaderboard("Level 5", limit=None)) == 3
+    reloaded.add_score("b", "Level 5", 9)
+    assert len(shroom_raider.LeaderboardManager(path).get_leaderboard("Level 5", limit=None)) == 4
+
+
+def add_scores(path):
+    leaderboard = shroom_raider.LeaderboardManager(path, flush_after=3)
+    leaderboard.COMPACT_AFTER = 7
+    for moves in range(20):
+        leaderboard.add_score("worker", "Level 4", moves)
+    leaderboard.flush()
+
+
+def test_leaderboard_is_safe_across_processes(tmp_path):
+    path = tmp_path / "leaderboard.json"
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        list(pool.map(add_scores, [path] * 4))
+    assert len(shroom_raider.LeaderboardManager(path).get_leaderboard("Level 4", limit=None)) == 80
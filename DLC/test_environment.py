@@ -0,0 +1,59 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+import batch_engine
+import environment
+
+
+def test_board_observation_is_a_live_view():
+    env = environment.ShroomRaiderEnv()
+    observation, info = env.reset()
+    board = observation["board"]
+    assert board.shape == (5, 10)
+    assert board.base is not None and not board.flags.writeable
+    assert info["total_mushrooms"] == 2
+
+    observation, reward, terminated, truncated, info = env.step(batch_engine.encode_actions("s")[0])
+    assert observation["board"] is board
+    assert observation["players"][0].tolist() == [3, 3]
+    assert (reward, terminated, truncated) == (1.0, False, False)
+
+    # Stepping off the mushroom leaves an empty cell behind, visible through the old view
+    env.step(batch_engine.encode_actions("w")[0])
+    assert board[3, 3] == ord(".")
+    env.reset()
+    assert board[3, 3] == ord("+")
+
+
+def test_step_many_stops_when_game_ends():
+    env = environment.ShroomRaiderEnv()
+    env.reset()
+    observation, rewards, terminated, truncated, info = env.step_many(batch_engine.encode_actions("sdddd"))
+    assert rewards.tolist() == [1.0, 1.0]
+    assert terminated and not truncated
+    assert info["result"] == "win"
+
+
+def test_drowning_and_truncation():
+    env = environment.ShroomRaiderEnv("""r = 3; c = 5
+
+TTTTT
+TL~+T
+TTTTT""", max_steps=3)
+    env.reset()
+    _, reward, terminated, _, info = env.step(batch_engine.encode_actions("d")[0])
+    assert (reward, terminated, info["result"]) == (-1.0, True, "loss")
+
+    env.reset()
+    _, rewards, terminated, truncated, _ = env.step_many(batch_engine.encode_actions("wwww"))
+    assert rewards.tolist() == [0.0, 0.0, 0.0]
+    assert truncated and not terminated
+
+
+def test_action_space_covers_moves_and_pickups():
+    env = environment.ShroomRaiderEnv()
+    env.reset(seed=3)
+    assert env.action_space.n == len("wsadikjlpo")
+    samples = {env.action_space.sample() for _ in range(200)}
+    assert samples == set(range(10))
+    assert env.action_space.contains(9) and not env.action_space.contains(10)
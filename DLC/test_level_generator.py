@@ -0,0 +1,36 @@
+import pytest
+import shroom_raider
+import level_generator
+
+
+@pytest.mark.parametrize("players", [1, 2])
+@pytest.mark.parametrize("seed", range(5))
+def test_witness_clears_generated_level(tmp_path, players, seed):
+    text, witness = level_generator.generate_level(9 + seed, 14, players, mushrooms=6, trees=0.3,
+                                                   water=0.2, rocks=0.2, items=0.05, seed=seed)
+    stage = tmp_path / "stage.txt"
+    stage.write_text(text, encoding="utf-8")
+    assert shroom_raider.run_terminal_mode(stage, witness, tmp_path / "out.txt") == "Clear"
+
+
+def test_generated_level_matches_requested_shape():
+    text, _ = level_generator.generate_level(40, 60, players=2, mushrooms=25, seed=1)
+    assert text.startswith("r = 40; c = 60\n")
+    game = shroom_raider.GameState(text)
+    assert (game.rows, game.cols) == (40, 60)
+    assert game.total_mushrooms == 25
+    assert game.board.count(b"L") == game.board.count(b"O") == 0
+
+
+def test_same_seed_gives_same_level():
+    assert level_generator.generate_level(20, 20, seed=7) == level_generator.generate_level(20, 20, seed=7)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"rows": 5, "cols": 5, "players": 2},
+    {"rows": 10, "cols": 10, "trees": 0.8, "water": 0.3},
+    {"rows": 4, "cols": 4, "mushrooms": 10},
+])
+def test_rejects_impossible_requests(kwargs):
+    with pytest.raises(ValueError):
+        level_generator.generate_level(**kwargs)
@@ -0,0 +1,65 @@
+import io
+import json
+import zipfile
+import pytest
+import shroom_raider
+from output_writer import write_board, open_output, open_results
+
+
+LEVEL = """r = 3; c = 4
+
+TTTT
+TL+T
+TTTT"""
+
+
+def test_write_board_places_players_row_by_row():
+    buffer = io.BytesIO()
+    written = write_board(buffer, "No Clear", 2, 3, b"..T+..", [(1, ord("L")), (5, ord("O"))])
+    assert buffer.getvalue() == b"No Clear\nr = 2; c = 3\n.LT\n+.O\n"
+    assert written == len(buffer.getvalue())
+
+
+def test_export_to_stdout(capsysbinary):
+    game = shroom_raider.GameState(LEVEL)
+    game.export_to_file("-", "Clear")
+    assert capsysbinary.readouterr().out == b"Clear\nr = 3; c = 4\nOTTT\nTL+T\nTTTT\n"
+
+
+def test_open_output_leaves_given_streams_open():
+    buffer = io.BytesIO()
+    with open_output(buffer) as stream:
+        stream.write(b"x")
+    assert not buffer.closed
+
+
+@pytest.mark.parametrize("suffix", [".zip", ".jsonl"])
+def test_batch_mode_gathers_results_into_one_file(tmp_path, suffix):
+    stage = tmp_path / "stage.txt"
+    stage.write_text(LEVEL, encoding="utf-8")
+    manifest = tmp_path / "jobs.jsonl"
+    jobs = [
+        {"level": str(stage), "moves": "d", "output": "win.txt"},
+        {"level": str(stage), "moves": "a", "output": "stuck.txt"},
+        {"level": str(tmp_path / "missing.txt"), "moves": "w", "output": "bad.txt"},
+    ]
+    manifest.write_text("\n".join(json.dumps(job) for job in jobs), encoding="utf-8")
+    results_file = tmp_path / f"results{suffix}"
+
+    results = shroom_raider.run_batch_mode(manifest, tmp_path / "summary.txt", workers=2, results_file=results_file)
+
+    assert results[:2] == ["Clear", "No Clear"]
+    assert not (tmp_path / "win.txt").exists()
+    if suffix == ".zip":
+        with zipfile.ZipFile(results_file) as archive:
+            assert archive.namelist() == ["win.txt", "stuck.txt"]
+            assert archive.read("stuck.txt").decode().splitlines() == ["No Clear", "r = 3; c = 4", "OTTT", "TL+T", "TTTT"]
+    else:
+        records = [json.loads(line) for line in results_file.read_text(encoding="utf-8").splitlines()]
+        assert [(record["output"], record["result"]) for record in records] == [("win.txt", "Clear"), ("stuck.txt", "No Clear")]
+        assert records[0]["board"][1] == "T.LT"
+
+
+def test_results_file_needs_a_known_format(tmp_path):
+    with pytest.raises(ValueError):
+        open_results(tmp_path / "results.txt")
@@ -0,0 +1,103 @@
+import random
+import pytest
+import shroom_raider
+import solver
+from reachability import DeadStateAnalyzer, is_dead, unreachable_mushrooms
+
+
+POCKET = """r = 4; c = 6
+
+TTTTTT
+TL.R.T
+TTTT+T
+TTTTTT"""
+
+
+def test_rock_frozen_in_front_of_mushroom_is_dead():
+    game = shroom_raider.GameState(POCKET)
+    analyzer = DeadStateAnalyzer(game)
+    assert not analyzer.dead
+    game.play_key('d')
+    assert not analyzer.update()
+    game.play_key('d')
+    assert analyzer.update()
+    assert unreachable_mushrooms(game) == [2 * 6 + 4]
+
+
+def test_trees_only_wall_off_once_tools_are_gone():
+    game = shroom_raider.GameState("""r = 4; c = 7
+
+TTTTTTT
+TLx.T+T
+T.TTTTT
+TTTTTTT""")
+    analyzer = DeadStateAnalyzer(game)
+    assert not analyzer.dead
+    game.play_key('d')
+    game.play_key('p')
+    assert not analyzer.update()
+    # The axe goes on a tree that does not lead anywhere
+    game.play_key('s')
+    assert game.player1["axe"] == 0
+    assert analyzer.update()
+
+
+def test_water_stays_open_while_a_rock_can_pave_it():
+    game = shroom_raider.GameState("""r = 3; c = 7
+
+TTTTTTT
+TLR.~+T
+TTTTTTT""")
+    assert not is_dead(game)
+    game.play_key('d')
+    game.play_key('d')
+    # The rock now sits against the water with nothing left to push it in
+    assert not is_dead(game)
+
+
+def test_terminal_mode_stops_early(tmp_path):
+    stage = tmp_path / "stage.txt"
+    stage.write_text(POCKET, encoding="utf-8")
+    profiler = shroom_raider.Profiler()
+    result = shroom_raider.run_terminal_mode(stage, "dd" + "a" * 1000, tmp_path / "out.txt",
+                                             profiler=profiler, stop_early=True)
+    assert result == "No Clear"
+    assert profiler.counters["moves"] == 2
+    assert (tmp_path / "out.txt").read_text(encoding="utf-8").splitlines()[3] == "T..LRT"
+
+
+def test_terminal_mode_stops_after_pickup_then_chop(tmp_path):
+    stage = tmp_path / "stage.txt"
+    stage.write_text("""r = 4; c = 7
+
+TTTTTTT
+TLx.T+T
+T.TTTTT
+TTTTTTT""", encoding="utf-8")
+    profiler = shroom_raider.Profiler()
+    result = shroom_raider.run_terminal_mode(stage, "dps" + "w" * 1000, tmp_path / "out.txt",
+                                             profiler=profiler, stop_early=True)
+    assert result == "No Clear"
+    assert profiler.counters["moves"] == 3
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_dead_states_are_unsolvable(seed):
+    rng = random.Random(seed)
+    checked = 0
+    while checked < 10:
+        cells = rng.choices(".TR~x+", [6, 3, 3, 1, 0.3, 1], k=20)
+        cells[rng.randrange(20)] = 'L'
+        game = shroom_raider.GameState("r = 4; c = 5\n\n" + "\n".join("".join(cells[r * 5:r * 5 + 5]) for r in range(4)))
+        if game.total_mushrooms == 0 or game.player1 == game.player2:
+            continue
+        analyzer = DeadStateAnalyzer(game)
+        for _ in range(30):
+            if analyzer.dead:
+                assert analyzer.dead == is_dead(game)
+                assert solver.solve(game, 20000) is None
+                checked += 1
+                break
+            if game.play_key(rng.choice("wsadp")) in ('win', 'loss'):
+                break
+            analyzer.update()
@@ -0,0 +1,75 @@
+import random
+import pytest
+import shroom_raider
+import level_generator
+import replay
+
+
+def record_states(path, text, keys, interval):
+    """Record keys into a replay, returning the exported state after every action"""
+    game = shroom_raider.GameState(text)
+    states = [game.export_state()]
+    with replay.ReplayRecorder(path, game, snapshot_interval=interval) as recorder:
+        for key in keys:
+            recorder.play(key)
+            if key in replay.ACTION_CODES:
+                states.append(game.export_state())
+    return states
+
+
+def test_seek_matches_recorded_states(tmp_path):
+    text, _ = level_generator.generate_level(12, 15, 2, mushrooms=3, trees=0.4, rocks=0.2, items=0.15, seed=4)
+    rng = random.Random(4)
+    keys = "".join(rng.choice("wsadikjlpoq") for _ in range(500))
+    states = record_states(tmp_path / "run.srr", text, keys, interval=32)
+
+    player = replay.ReplayPlayer(tmp_path / "run.srr")
+    assert len(player) == len(states) - 1
+    assert player.keys() == keys.replace("q", "")
+    for moves in [len(states) - 1, 0, 200, 31, 32, 33, 199] + rng.sample(range(len(states)), 30):
+        game = player.seek(moves)
+        assert game.export_state() == states[moves]
+        assert game.zobrist == game.compute_zobrist()
+    player.close()
+
+
+def test_level_without_second_player_round_trips(tmp_path):
+    text = """r = 3; c = 5
+
+TTTTT
+TL.+T
+TTTTT"""
+    states = record_states(tmp_path / "run.srr", text, "dd", interval=1)
+    player = replay.ReplayPlayer(tmp_path / "run.srr")
+    assert player.seek(0).initial_board == shroom_raider.GameState(text).initial_board
+    assert player.seek(2).export_state() == states[2]
+    player.close()
+
+
+def test_replay_is_compact(tmp_path):
+    keys = "dsawpo" * 2000
+    record_states(tmp_path / "run.srr", shroom_raider.DEFAULT_LEVEL, keys, interval=1024)
+    level_size = len(shroom_raider.DEFAULT_LEVEL)
+    # Half a byte per action, plus a little for the header and 11 snapshots
+    assert (tmp_path / "run.srr").stat().st_size < level_size + len(keys) // 2 + 1000
+
+
+def test_terminal_mode_records_replay(tmp_path):
+    stage = tmp_path / "stage.txt"
+    stage.write_text(shroom_raider.DEFAULT_LEVEL, encoding="utf-8")
+    result = shroom_raider.run_terminal_mode(stage, "xsdw", tmp_path / "out.txt", tmp_path / "run.srr")
+    assert result == "Clear"
+
+    player = replay.ReplayPlayer(tmp_path / "run.srr")
+    assert player.keys() == "sd"
+    assert player.seek(1).total_mushrooms_collected == 1
+    assert player.seek(2).total_mushrooms_collected == 2
+
+
+def test_unfinished_replay_is_rejected(tmp_path):
+    recorder = replay.ReplayRecorder(tmp_path / "run.srr", shroom_raider.GameState())
+    recorder.play("d")
+    recorder.file.flush()
+    with pytest.raises(ValueError):
+        replay.ReplayPlayer(tmp_path / "run.srr")
+    recorder.close()
@@ -0,0 +1,81 @@
+import json
+import asyncio
+import pytest
+from server import GameServer
+
+
+LEVEL = """r = 5; c = 6
+
+TTTTTT
+T.+x~T
+TLR..T
+T*.O.T
+TTTTTT"""
+
+
+@pytest.fixture
+def server():
+    return GameServer(max_sessions=2)
+
+
+def test_session_plays_to_a_clear(server):
+    session = server.handle({"cmd": "create", "level": LEVEL, "id": 7})
+    assert session["ok"] and session["id"] == 7
+    assert session["total_mushrooms"] == 1
+
+    response = server.handle({"cmd": "move", "session": session["session"], "keys": "w1d3"})
+    assert (response["played"], response["result"], response["mushrooms_collected"]) == (2, "Clear", 1)
+
+    text = server.handle({"cmd": "export", "session": session["session"]})["text"]
+    assert text.splitlines()[:3] == ["Clear", "r = 5; c = 6", "TTTTTT"]
+
+    server.handle({"cmd": "restart", "session": session["session"]})
+    snapshot = server.handle({"cmd": "snapshot", "session": session["session"]})
+    assert snapshot["board"][2] == "TLR..T"
+    assert snapshot["players"][0] == [2, 1, 0, 0]
+    assert snapshot["result"] is None
+
+
+def test_sessions_are_independent(server):
+    first = server.handle({"cmd": "create", "level": LEVEL})["session"]
+    second = server.handle({"cmd": "create", "level": LEVEL})["session"]
+    server.handle({"cmd": "move", "session": first, "keys": "s"})
+    assert server.handle({"cmd": "pickup", "session": first})["picked"]
+    assert server.handle({"cmd": "snapshot", "session": second})["players"][0] == [2, 1, 0, 0]
+
+
+def test_bad_requests_are_reported(server):
+    assert not server.handle({"cmd": "fly"})["ok"]
+    assert not server.handle({"cmd": "move", "session": 99, "keys": "w"})["ok"]
+    assert not server.handle({"cmd": "create", "stage": "../shroom_raider"})["ok"]
+    assert json.loads(server.handle_line(b"{not json"))["ok"] is False
+    assert "Unknown command []" in json.loads(server.handle_line(b'{"cmd": []}'))["error"]
+    assert not server.handle({"cmd": "snapshot", "session": {"a": 1}})["ok"]
+
+    session = server.handle({"cmd": "create", "stage": "Level0"})["session"]
+    assert "Unknown move keys 'q'" in server.handle({"cmd": "move", "session": session, "keys": "dq"})["error"]
+    assert server.handle({"cmd": "snapshot", "session": session})["moves"] == 0
+
+    server.handle({"cmd": "create"})
+    assert "full" in server.handle({"cmd": "create"})["error"]
+    server.handle({"cmd": "close", "session": session})
+    assert server.handle({"cmd": "create"})["ok"]
+
+
+def test_socket_round_trip(tmp_path):
+    async def talk():
+        server = await GameServer().start(unix_path=str(tmp_path / "game.sock"))
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(str(tmp_path / "game.sock"))
+            responses = []
+            for request in ({"cmd": "create", "level": LEVEL}, {"cmd": "move", "session": 1, "keys": "wd"}):
+                writer.write(json.dumps(request).encode() + b"\n")
+                await writer.drain()
+                responses.append(json.loads(await reader.readline()))
+            writer.close()
+            await writer.wait_closed()
+            return responses
+
+    created, moved = asyncio.run(talk())
+    assert created["session"] == 1
+    assert moved["result"] == "Clear"
@@ -0,0 +1,113 @@
+from pathlib import Path
+
+import pytest
+import shroom_raider
+import solver
+
+LEVELS = Path(__file__).with_name("levels")
+
+
+def test_solver_finds_minimum_moves():
+    game = shroom_raider.GameState()
+    solution = solver.solve(game)
+    assert len(solution) == 2
+    for action in solution:
+        result = game.move(*solver.MOVES[action])
+    assert result == 'win'
+
+
+def test_solver_uses_items():
+    game = shroom_raider.GameState("""r = 3; c = 7
+
+TTTTTTT
+TL*T+TT
+TTTTTTT""")
+    solution = solver.solve(game)
+    assert solution == "dpdd"
+
+
+def test_solver_restores_game_after_search():
+    game = shroom_raider.GameState()
+    before = (bytes(game.board), bytes(game.restore_board), game.scalar_state())
+    solver.solve(game)
+    assert (bytes(game.board), bytes(game.restore_board), game.scalar_state()) == before
+
+
+def test_solver_proves_unsolvable():
+    game = shroom_raider.GameState("""r = 3; c = 5
+
+TTTTT
+TLT+T
+TTTTT""")
+    assert solver.solve(game) is None
+
+
+def test_solver_respects_state_limit():
+    with pytest.raises(solver.SearchLimitReached):
+        solver.solve_level_file(LEVELS / "Level1.txt", max_states=100)
+
+
+def test_solver_prunes_pushes_into_deadlock():
+    # The rock gets stuck in the corner either way, but only the first level needs the cell behind it
+    walled_off = shroom_raider.GameState("""r = 4; c = 6
+
+TTTTTT
+TL.R.T
+TTTT+T
+TTTTTT""")
+    detour = shroom_raider.GameState("""r = 5; c = 6
+
+TTTTTT
+TL.R.T
+TT.T+T
+TT...T
+TTTTTT""")
+    for game, deadlocked in ((walled_off, True), (detour, False)):
+        game.move(0, 1, 1)
+        game.move(0, 1, 1)
+        assert game.rock_stuck(1 * 6 + 4)
+        assert solver.pushed_into_deadlock(game, 'd') == deadlocked
+        game.restart()
+    assert solver.solve(walled_off) is None
+    assert solver.solve(detour) == "dssddw"
+
+
+def test_heuristic_counts_the_trip_to_a_tool():
+    # The mushroom is two steps away, but only behind a tree the axe has to cut first
+    game = shroom_raider.GameState("""r = 3; c = 8
+
+TTTTTTTT
+T+TL..xT
+TTTTTTTT""")
+    assert solver.heuristic(game) == 8
+    assert solver.solve(game) == "dddpaaaaa"
+
+
+def test_reconstruct_swaps_players_after_a_mirror_image():
+    # The second state's path was replaced by one reaching its mirror image,
+    # so the move made from it has to be made by the other player
+    seen = {
+        "start": (0, None, None, None, False),
+        "first": (1, "start", "d", False, True),
+        "second": (2, "first", "w", False, False),
+    }
+    assert solver.reconstruct(seen, "second") == "di"
+
+
+def test_solver_solves_level15_quickly():
+    solution = solver.solve_level_file(LEVELS / "Level15.txt", max_states=1000)
+    assert sum(action in solver.MOVES for action in solution) == 6
+
+
+@pytest.mark.slow
+def test_solver_solves_caged_tools_within_default_budget():
+    # Both mushrooms are walled off and both tools are caged in by rocks
+    solution = solver.solve_level_file(LEVELS / "Level11.txt")
+    assert sum(action in solver.MOVES for action in solution) == 31
+    game = shroom_raider.GameState(shroom_raider.load_level_file(LEVELS / "Level11.txt"))
+    for action in solution:
+        if action in solver.PICKUPS:
+            assert game.pickup_item(solver.PICKUPS[action])
+        else:
+            result = game.move(*solver.MOVES[action])
+    assert result == 'win'
@@ -0,0 +1,97 @@
+import json
+import pytest
+import shroom_raider
+import verifier
+
+
+LEVEL = """r = 3; c = 6
+
+TTTTTT
+TLx+.T
+TTTTTT"""
+
+
+@pytest.fixture
+def levels_dir(tmp_path):
+    levels = tmp_path / "levels"
+    levels.mkdir()
+    (levels / "Level1.txt").write_text(LEVEL, encoding="utf-8")
+    return levels
+
+
+@pytest.mark.parametrize("keys, claimed, expected", [
+    ("dpd", 2, (2, None)),
+    ("dwpadd", None, (4, None)),
+    ("dpd", 1, (None, "Claims 1 moves but the replay takes 2")),
+    ("dpdd", None, (None, "Level is cleared after 3 of 4 keys")),
+    ("dp", None, (None, "Replay does not clear the level")),
+    ("", 2, (None, "Score has no replay")),
+    ("dq", 2, (None, "Unknown keys 'q' in replay")),
+])
+def test_check_score(levels_dir, keys, claimed, expected):
+    assert verifier.check_score(("Level 1", keys, claimed, levels_dir)) == expected
+
+
+@pytest.mark.parametrize("level_name", ["Level 9", "../levels/Level1", None])
+def test_only_shipped_levels_can_be_named(levels_dir, level_name):
+    moves, reason = verifier.check_score((level_name, "dpd", None, levels_dir))
+    assert moves is None and reason.startswith("No level named")
+
+
+def test_history_keys_replay_the_winning_line(levels_dir):
+    game = shroom_raider.GameState(LEVEL, journal=True)
+    for key in "wdpaud":
+        if key == "u":
+            game.undo()
+        else:
+            game.play_key(key)
+    assert game.history_keys() == "dpd"
+    assert verifier.check_score(("Level 1", game.history_keys(), game.move_count, levels_dir)) == (2, None)
+
+
+def test_add_scores_keeps_only_verified_scores(tmp_path, levels_dir):
+    leaderboard = shroom_raider.LeaderboardManager(tmp_path / "board" / "leaderboard.json")
+    submissions = [("ann", "Level 1", "dpd", 2), ("bob", "Level 1", "dpd", 1), ("cy", "Level 1", "ad", 1)] * 4
+    with verifier.ScoreVerifier(workers=2, levels_dir=levels_dir) as scores:
+        results = scores.add_scores(leaderboard, submissions)
+    assert [reason is None for _, reason in results] == [True, False, False] * 4
+    assert [entry["username"] for entry in leaderboard.get_leaderboard("Level 1")] == ["ann"] * 4
+    assert leaderboard.get_leaderboard("Level 1")[0]["replay"] == "dpd"
+
+
+def test_verify_all_drops_and_reranks(tmp_path, levels_dir):
+    leaderboard_file = tmp_path / "board" / "leaderboard.json"
+    leaderboard_file.parent.mkdir()
+    leaderboard_file.write_text(json.dumps({"Level 1": [
+        {"username": "legacy", "moves": 1},
+        {"username": "fudged", "moves": 1, "replay": "dwpadd"},
+        {"username": "honest", "moves": 2, "replay": "dpd"},
+        {"username": "cheat", "moves": 1, "replay": "dp"},
+    ]}), encoding="utf-8")
+
+    verified, unverified, dropped = verifier.verify_all(leaderboard_file, workers=2, levels_dir=levels_dir,
+                                                        dry_run=True)
+    assert (verified, unverified) == (2, 1) and [entry["username"] for _, entry, _ in dropped] == ["cheat"]
+    assert "cheat" in leaderboard_file.read_text(encoding="utf-8")
+
+    verifier.verify_all(leaderboard_file, workers=2, levels_dir=levels_dir)
+    entries = json.loads(leaderboard_file.read_text(encoding="utf-8"))["Level 1"]
+    # Scores from before replays were kept stay, marked unverified
+    assert [(entry["username"], entry["moves"], entry.get("verified")) for entry in entries] == [
+        ("legacy", 1, False), ("honest", 2, None), ("fudged", 4, None)]
+
+
+def test_scores_are_checked_against_the_stage_played(tmp_path, levels_dir):
+    # A custom stage named like a shipped level, where the mushroom is one step closer
+    custom = tmp_path / "custom" / "Level1.txt"
+    custom.parent.mkdir()
+    custom.write_text(LEVEL.replace("TLx+.T", "TL+..T"), encoding="utf-8")
+    level = shroom_raider.load_level_file(custom)
+    assert verifier.check_score((level, "d", 1, levels_dir)) == (1, None)
+    assert verifier.check_score(("Level 1", "d", 1, levels_dir))[1] is not None
+
+    leaderboard_file = tmp_path / "board" / "leaderboard.json"
+    leaderboard = shroom_raider.LeaderboardManager(leaderboard_file)
+    leaderboard.add_score("ann", "Level1", 1, "d", stage=custom)
+    leaderboard.flush()
+    assert verifier.verify_all(leaderboard_file, workers=1, levels_dir=levels_dir)[:2] == (1, 0)
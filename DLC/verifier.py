@@ -0,0 +1,209 @@
+"""Replay verification for leaderboard scores.
+
+A score carries the keys that won its level, as GameState.history_keys()
+gives them. Verifying the score replays those keys on a fresh headless
+GameState: it only stands if the keys clear the level on their last step,
+and the move count that counts is the one the replay reaches, not the one
+that was submitted.
+
+A score made in the game is checked against the very level that was
+played. Later on, levels are found by their leaderboard name ("Level 3"
+is levels/Level3.txt), except for scores on a stage played straight from
+a file, which keep that file's path.
+
+ScoreVerifier replays many scores at once across a process pool that
+stays up between calls, for the bursts of submissions at the end of a
+tournament. Workers keep the levels they have compiled, so only level
+names and keys go between processes. Run as a script, verify-all
+re-checks a whole leaderboard. Scores saved before replays were kept
+have nothing to replay, so they stay, marked unverified:
+
+    python verifier.py verify-all [--leaderboard leaderboard/leaderboard.json] [-j 8] [--dry-run]
+"""
+import os
+from pathlib import Path
+from argparse import ArgumentParser
+
+from shroom_raider import GameState, LeaderboardManager, CompiledLevel, ACTION_KEYS, load_level_file, score_rank
+
+
+LEVELS_DIR = Path(__file__).resolve().parent / "levels"
+# Longest key string replayed for one score
+MAX_REPLAY_KEYS = 1_000_000
+REPLAY_CHARACTERS = frozenset(ACTION_KEYS)
+
+
+class ScoreRejected(Exception):
+    """A score whose replay does not hold up"""
+
+
+def level_file(level_name, levels_dir=LEVELS_DIR):
+    """The level file a leaderboard name stands for"""
+    name = level_name.replace(" ", "") if isinstance(level_name, str) else ""
+    path = Path(levels_dir) / f"{name}.txt"
+    # Only the shipped levels can be named
+    if not name or Path(name).name != name or not path.is_file():
+        raise ScoreRejected(f"No level named {level_name!r}")
+    return path
+
+
+def played_level(level, levels_dir=LEVELS_DIR):
+    """The compiled level a score was made on.
+
+    `level` is the CompiledLevel itself, the path of the stage file that
+    was played, or the leaderboard name of a shipped level.
+    """
+    if isinstance(level, CompiledLevel):
+        return level
+    path = level if isinstance(level, os.PathLike) else level_file(level, levels_dir)
+    try:
+        return load_level_file(path)
+    except (OSError, ValueError) as error:
+        raise ScoreRejected(f"Cannot load {str(level)!r}: {error}") from error
+
+
+def score_level(level_name, entry):
+    """What a leaderboard entry's replay has to be checked against, for played_level()"""
+    stage = entry.get("stage")
+    return Path(stage) if isinstance(stage, str) else level_name
+
+
+def replay_score(level, keys, levels_dir=LEVELS_DIR):
+    """Replay a score's keys on a played_level() and return the move count it clears the level in"""
+    if not isinstance(keys, str) or not keys:
+        raise ScoreRejected("Score has no replay")
+    if len(keys) > MAX_REPLAY_KEYS:
+        raise ScoreRejected(f"Replay is longer than {MAX_REPLAY_KEYS} keys")
+    unknown = set(keys) - REPLAY_CHARACTERS
+    if unknown:
+        raise ScoreRejected(f"Unknown keys {''.join(sorted(unknown))!r} in replay")
+    game = GameState(played_level(level, levels_dir))
+
+    last = len(keys) - 1
+    for step, key in enumerate(keys):
+        result = game.play_key(key)
+        if result == 'win':
+            if step != last:
+                raise ScoreRejected(f"Level is cleared after {step + 1} of {len(keys)} keys")
+            return game.move_count
+        if result == 'loss':
+            raise ScoreRejected(f"A player drowns at key {step + 1}")
+    raise ScoreRejected("Replay does not clear the level")
+
+
+def check_score(submission):
+    """Verify one (level, keys, claimed moves, levels dir) submission.
+
+    Returns (moves, None) for a score that holds up and (None, reason) for
+    one that does not. A claimed move count of None takes whatever the
+    replay reaches.
+    """
+    level, keys, claimed, levels_dir = submission
+    try:
+        moves = replay_score(level, keys, levels_dir)
+    except ScoreRejected as error:
+        return None, str(error)
+    if claimed is not None and claimed != moves:
+        return None, f"Claims {claimed} moves but the replay takes {moves}"
+    return moves, None
+
+
+class ScoreVerifier:
+    """Replays scores across a process pool"""
+    def __init__(self, workers=None, levels_dir=LEVELS_DIR):
+        # Only verification needs a process pool, so the game doesn't import it
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.workers = workers or os.cpu_count() or 1
+        self.levels_dir = levels_dir
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+    def check(self, submissions):
+        """(moves, reason) for each (level, keys, claimed moves) submission, in order"""
+        jobs = [(level, keys, claimed, self.levels_dir) for level, keys, claimed in submissions]
+        # A few large chunks per worker, so a burst of short replays doesn't
+        # pay a round trip each
+        chunksize = max(1, len(jobs) // (self.workers * 4))
+        return list(self.pool.map(check_score, jobs, chunksize=chunksize))
+
+    def add_scores(self, leaderboard, submissions):
+        """Verify (username, level name, keys, claimed moves) submissions and add the ones that hold up.
+
+        Returns (moves, reason) for each submission, in order.
+        """
+        results = self.check([(level_name, keys, claimed) for _, level_name, keys, claimed in submissions])
+        for (username, level_name, keys, _), (moves, reason) in zip(submissions, results):
+            if reason is None:
+                leaderboard.add_score(username, level_name, moves, keys)
+        return results
+
+
+def verify_all(leaderboard_file="leaderboard/leaderboard.json", workers=None, levels_dir=LEVELS_DIR, dry_run=False):
+    """Replay every score on a leaderboard.
+
+    Scores that fail are dropped, and the rest are re-ranked by the move
+    counts their replays reach. Scores without a replay are kept with
+    "verified": false. Returns the number of scores verified, the number
+    left unverified and (level name, entry, reason) for every score
+    dropped. A dry run leaves the leaderboard as it is.
+    """
+    leaderboard = LeaderboardManager(leaderboard_file)
+    with leaderboard.locked():
+        # Pick up anything logged since the manager loaded, and keep other
+        # processes from logging until the checked leaderboard is saved
+        leaderboard.load_leaderboard()
+        data = {level_name: [] for level_name in leaderboard.data}
+        scores = []
+        unverified = 0
+        for level_name, entries in leaderboard.data.items():
+            for entry in entries:
+                if "replay" in entry:
+                    scores.append((level_name, entry))
+                else:
+                    data[level_name].append({**entry, "verified": False})
+                    unverified += 1
+        with ScoreVerifier(workers, levels_dir) as verifier:
+            results = verifier.check([(score_level(level_name, entry), entry["replay"], None)
+                                      for level_name, entry in scores])
+
+        dropped = []
+        for (level_name, entry), (moves, reason) in zip(scores, results):
+            if reason is None:
+                data[level_name].append({**entry, "moves": moves})
+            else:
+                dropped.append((level_name, entry, reason))
+        if not dry_run:
+            for entries in data.values():
+                entries.sort(key=score_rank)
+            leaderboard.data = data
+            leaderboard.save_leaderboard()
+    return len(scores) - len(dropped), unverified, dropped
+
+
+def main():
+    parser = ArgumentParser(description="Verify Shroom Raider leaderboard scores by replaying them")
+    commands = parser.add_subparsers(dest='command', required=True)
+    verify = commands.add_parser('verify-all', help='Replay every score and drop the ones that fail')
+    verify.add_argument('--leaderboard', default="leaderboard/leaderboard.json", help='Leaderboard snapshot file')
+    verify.add_argument('-j', '--jobs', type=int, help='Number of worker processes')
+    verify.add_argument('--dry-run', action='store_true', help='Only report the scores that fail')
+    args = parser.parse_args()
+
+    verified, unverified, dropped = verify_all(args.leaderboard, args.jobs, dry_run=args.dry_run)
+    for level_name, entry, reason in dropped:
+        print(f"{level_name}\t{entry.get('username')}\t{entry.get('moves')}\t{reason}")
+    print(f"{verified} scores verified, {unverified} without a replay kept unverified, "
+          f"{len(dropped)} {'failed' if args.dry_run else 'dropped'}")
+
+
+if __name__ == "__main__":
+    main()
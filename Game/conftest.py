@@ -0,0 +1,22 @@
+"""Make this folder's shroom_raider the one its tests use.
+
+DLC/ and Game/ both ship a shroom_raider module. When pytest runs both
+folders at once, the import cache holds only one of them, so each folder
+puts its own back before collecting and before running each of its tests
+(worker processes look functions up there by module name).
+"""
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+cached = sys.modules.get("shroom_raider")
+if cached is not None and Path(cached.__file__).resolve().parent != HERE:
+    del sys.modules["shroom_raider"]
+sys.path.insert(0, str(HERE))
+
+import shroom_raider
+
+
+def pytest_runtest_setup(item):
+    sys.modules["shroom_raider"] = shroom_raider
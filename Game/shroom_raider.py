@@ -1,35 +1,160 @@
+import io
 import os
-import copy
-from argparse import ArgumentParser
+import sys
+import json
+import time
+from itertools import repeat
 
-def main():
+#----------------------Variables-----------------------#
+#nothing is loaded at import time; load_stage() builds the boards and run() plays them
+
+Emojify = {
+        "T": "🌲",
+        "L": "🧑",
+        "+": "🍄",
+        "R": "🪨",
+        "~": "🟦",
+        "-": "⬜",
+        ".": "　",
+        "x": "🪓",
+        "*": "🔥",
+    }
+
+DefaultStage = """5 10
+TTTTTTTTTT
+T........T
+T.L....+.T
+T........T
+TTTTTTTTTT"""
+
+#turns a board row of emoji back into stage characters
+BoardText = str.maketrans({emoji: tile for tile, emoji in Emojify.items()})
+
+#moves are read this many characters at a time
+MoveChunkSize = 1 << 16
+
+#phase timings and counters for --profile
+ProfilePhases = ("parse", "load_level", "move_loop", "export")
+ProfileCounters = ("moves", "blocked_moves", "clear_space", "burn_cells", "board_copies", "bytes_written")
+
+def NewSession(Output="Output.txt", Size=(5, 10), StopEarly=False, Profile=False, ProfileJson=None):
+    #the settings of one run, handed down to everything that plays or writes out a stage:
+    #  output      terminal mode results go here (the -o argument); "-" writes them to stdout
+    #  size        the r c the stage file declares, written as the result header; run() sets it from load_stage()
+    #  stop_early  with --stop-early, terminal mode gives up as soon as the stage can no longer be cleared
+    #  profile     phase timings and counters; stays None (and nothing is counted) unless profiling
+    return {
+        "output": Output,
+        "size": Size,
+        "stop_early": StopEarly,
+        "profile": StartProfile() if Profile or ProfileJson else None,
+        "profile_json": ProfileJson,
+    }
+
+def parse_args(argv=None):
+    #argparse is only needed when the game is started from the command line
+    from argparse import ArgumentParser
     parser = ArgumentParser()
 
     parser.add_argument('-f', '--file')
     parser.add_argument('-m', '--moves')
+    parser.add_argument('-M', '--moves-file')
+    parser.add_argument('--run-lengths', action='store_true')
     parser.add_argument('-o', '--output')
-
-    args = parser.parse_args()
-
-    if args.file and args.moves and args.output:
-        with open(args.file, encoding='utf-8') as f:
-            stage_data = f.read()
-        return stage_data, args.moves, args.output
+    parser.add_argument('--stop-early', action='store_true')
+    parser.add_argument('--profile', action='store_true')
+    parser.add_argument('--profile-json')
+
+    args = parser.parse_args(argv)
+    if args.profile_json == "-" and args.output == "-":
+        parser.error("--profile-json - and -o - would both write to stdout")
+    Session = NewSession(args.output or "Output.txt", StopEarly=args.stop_early, Profile=args.profile, ProfileJson=args.profile_json)
+
+    #the stage file itself is read by run(), as part of loading the level
+    if args.file and (args.moves or args.moves_file) and args.output:
+        if args.moves_file:
+            moves = StreamMoves(args.moves_file, args.run_lengths)
+        elif args.run_lengths:
+            moves = ReadMoves(io.StringIO(args.moves), RunLengths=True)
+        else:
+            moves = args.moves
+        return args.file, moves, Session
     elif args.file:
-        with open(args.file, encoding='utf-8') as f:
-            stage_data = f.read()
-        return stage_data, None, None
+        return args.file, None, Session
     else:
-        return None, None, None
-    
-
-#----------------------Variables-----------------------#
-
-data = main()
-if data[0] != None:
-    board = data[0].splitlines()[1:]
-    r = int(data[0].split()[0])
-    c = int(data[0].split()[1])
+        return None, None, Session
+
+def StartProfile():
+    return {"timings": dict.fromkeys(ProfilePhases, 0.0), "counters": dict.fromkeys(ProfileCounters, 0)}
+
+def Count(Session, name, amount=1):
+    if Session is not None and Session["profile"] is not None:
+        Session["profile"]["counters"][name] += amount
+
+def Timed(Session, name, start):
+    #adds the time since start to a phase and returns the new start
+    now = time.perf_counter()
+    if Session is not None and Session["profile"] is not None:
+        Session["profile"]["timings"][name] += now - start
+    return now
+
+def WriteProfile(Session):
+    #prints the profile to stderr, or writes it as JSON to the --profile-json file ("-" for stdout)
+    Profile, ProfileJson = Session["profile"], Session["profile_json"]
+    if ProfileJson is None:
+        lines = ["Profile"]
+        lines += [f"  {name:<14}{seconds * 1000:>12.3f} ms" for name, seconds in Profile["timings"].items()]
+        lines += [f"  {name:<14}{count:>12}" for name, count in Profile["counters"].items()]
+        print("\n".join(lines), file=sys.stderr)
+    elif ProfileJson == "-":
+        print(json.dumps(Profile, indent=2))
+    else:
+        with open(ProfileJson, "w", encoding='utf-8') as f:
+            json.dump(Profile, f, indent=2)
+            f.write("\n")
+
+def ReadMoves(stream, ChunkSize=MoveChunkSize, RunLengths=False):
+    #yields moves one at a time, reading the stream in chunks
+    #with RunLengths (--run-lengths) a count after a move repeats it, so d100w5 is 100 d's then 5 w's
+    if not RunLengths:
+        while True:
+            chunk = stream.read(ChunkSize)
+            if not chunk:
+                return
+            yield from chunk
+    Key = None
+    Count = None
+    while True:
+        chunk = stream.read(ChunkSize)
+        if not chunk:
+            break
+        for char in chunk:
+            if char.isdigit():
+                #a count can be split between chunks, so it is only used once the next move shows up
+                if Key is not None:
+                    Count = int(char) if Count is None else Count * 10 + int(char)
+            elif not char.isspace():
+                if Key is not None:
+                    yield from repeat(Key, 1 if Count is None else Count)
+                Key = char
+                Count = None
+    if Key is not None:
+        yield from repeat(Key, 1 if Count is None else Count)
+
+def StreamMoves(path, RunLengths=False):
+    #"-" reads the moves from stdin
+    if path == "-":
+        yield from ReadMoves(sys.stdin, RunLengths=RunLengths)
+        return
+    with open(path, encoding='utf-8') as f:
+        yield from ReadMoves(f, RunLengths=RunLengths)
+
+def load_stage(stage_data=None, Session=None):
+    #builds the player and the boards for a stage (the default stage if none is given)
+    if stage_data is None:
+        stage_data = DefaultStage
+    board = stage_data.splitlines()[1:]
+    r, c = (int(n) for n in stage_data.split()[:2])
 
     Player = {
         "xPos": 0,
@@ -40,18 +165,6 @@ if data[0] != None:
         "flamethrower": 0,
     }
 
-    Emojify = {
-            "T": "🌲",
-            "L": "🧑",
-            "+": "🍄",
-            "R": "🪨",
-            "~": "🟦",
-            "-": "⬜",
-            ".": "　",
-            "x": "🪓",
-            "*": "🔥",
-        }
-    
     DisplayBoard = []
     for yPos, row in enumerate(board):
         RowConstuctor = []
@@ -64,29 +177,11 @@ if data[0] != None:
             RowConstuctor.append(Emojify[cell])
         DisplayBoard.append(RowConstuctor)
 
-else:
-    WaitTime = 1
-
-    Player = {
-        "xPos": 2,
-        "yPos": 2,
-        "mushroom": 0,
-        "win": 1,
-        "axe": 0,
-        "flamethrower": 0
-    }
-    
-    DisplayBoard = [
-    ["🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲"],
-    ["🌲", "　", "　", "　", "　", "　", "　", "　", "　", "🌲"],
-    ["🌲", "　", "🧑", "　", "　", "　", "　", "🍄", "　", "🌲"],
-    ["🌲", "　", "　", "　", "　", "　", "　", "　", "　", "🌲"],
-    ["🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲", "🌲"]
-    ]
-
-InitialPlayer = copy.deepcopy(Player)
-InitialBoard = copy.deepcopy(DisplayBoard)
-ToggleBoard = copy.deepcopy(DisplayBoard)
+    InitialPlayer = dict(Player)
+    InitialBoard = [row[:] for row in DisplayBoard]
+    ToggleBoard = [row[:] for row in DisplayBoard]
+    Count(Session, "board_copies", 2)
+    return Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, (r, c)
 
 #--------------Functions-------------------------#
 
@@ -100,11 +195,13 @@ def clearConsole():
 def Position(Board, Player):
     Board[Player["yPos"]][Player["xPos"]] = "🧑"
 
-def Restart(Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard):
+def Restart(Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Session=None):
+    #tiles are immutable strings, so copying each row is enough (deepcopy walks every cell)
     Player.clear()
-    Player.update(copy.deepcopy(InitialPlayer))
-    DisplayBoard[:] = copy.deepcopy(InitialBoard)
-    ToggleBoard[:] = copy.deepcopy(InitialBoard)
+    Player.update(InitialPlayer)
+    DisplayBoard[:] = [row[:] for row in InitialBoard]
+    ToggleBoard[:] = [row[:] for row in InitialBoard]
+    Count(Session, "board_copies", 2)
 
 def Win(Player, DisplayBoard):
     clearConsole()
@@ -121,49 +218,65 @@ def Loss(Player, DisplayBoard):
     print("\nMushrooms Collected:", Player["mushroom"], "out of", Player["win"])
     quit()
 
-def TermWin(Player, DisplayBoard):
+def TermWin(Player, DisplayBoard, Session):
     Position(DisplayBoard, Player)
-    TermPrint(DisplayBoard, "Clear")
+    TermPrint(DisplayBoard, "Clear", Session["output"], Session["size"], Session)
     quit()
 
-def TermLoss(Player, DisplayBoard):
+def TermLoss(Player, DisplayBoard, Session):
     Position(DisplayBoard, Player)
-    TermPrint(DisplayBoard, "No Clear")
+    TermPrint(DisplayBoard, "No Clear", Session["output"], Session["size"], Session)
     quit()
 
-def NoMoves(Player, DisplayBoard):
+def NoMoves(Player, DisplayBoard, Session):
     Position(DisplayBoard, Player)
-    TermPrint(DisplayBoard, "No Clear")
+    TermPrint(DisplayBoard, "No Clear", Session["output"], Session["size"], Session)
     quit()
 
-def TermPrint(DisplayBoard, Cleared):
-    with open("Output.txt", "w", encoding='utf-8') as file:
-        file.write(Cleared)
-        file.write("\n" + str(r) + " " + str(c) + "\n")
-        Convert = {
-            "🌲" : "T",
-            "🧑" : "L",
-            "🍄" : "+",
-            "🪨" : "R",
-            "🟦" : "~",
-            "⬜" : "-",
-            "　" : ".",
-            "🪓" : "x",
-            "🔥" : "*",
-        }
-        file.write("\n".join("".join(Convert[y] for y in row) for row in DisplayBoard))
-
-def InputHandler(moveset, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal):
+def TermPrint(DisplayBoard, Cleared, Target, Size, Session=None):
+    #writes the result to the -o file ("-" for stdout), a row at a time, under the declared r c
+    start = time.perf_counter()
+    r, c = Size
+    File = sys.stdout.buffer if Target == "-" else open(Target, "wb", buffering=1 << 16)
+    try:
+        Written = File.write((Cleared + "\n" + str(r) + " " + str(c)).encode('utf-8'))
+        for row in DisplayBoard:
+            Written += File.write(("\n" + "".join(row).translate(BoardText)).encode('utf-8'))
+    finally:
+        if Target == "-":
+            File.flush()
+        else:
+            File.close()
+    Count(Session, "bytes_written", Written)
+    Timed(Session, "export", start)
+
+def InputHandler(moveset, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal, Session=None):
+    moveset = iter(moveset)
+    Profile = Session["profile"] if Session is not None else None
+    Check = IsTerminal and Session is not None and Session["stop_early"]
+    if Check:
+        GiveUpIfDoomed(moveset, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Session)
     for move in moveset:
         if move not in ("w", "a", "s", "d", "!", "p"):
             break
+        if Profile is not None:
+            Profile["counters"]["moves"] += 1
+        Before = (Player["yPos"], Player["xPos"])
+        Tools = Player["axe"] + Player["flamethrower"]
         try:
-            if move == "w": movement(-1, 0, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal)
-            if move == "a": movement(0, -1, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal)
-            if move == "s": movement(1, 0, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal)
-            if move == "d": movement(0, 1, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal)
+            if move == "w": movement(-1, 0, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal, Session)
+            if move == "a": movement(0, -1, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal, Session)
+            if move == "s": movement(1, 0, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal, Session)
+            if move == "d": movement(0, 1, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal, Session)
         except IndexError:
             break
+        Moved = Before != (Player["yPos"], Player["xPos"])
+        #a move is blocked when the player doesn't end up anywhere new
+        if Profile is not None and move in ("w", "a", "s", "d") and not Moved:
+            Profile["counters"]["blocked_moves"] += 1
+        #the stage can only become impossible when a rock gets pushed (the player is left standing where it was) or a tool is used up
+        if Check and Moved and (DisplayBoard[Player["yPos"]][Player["xPos"]] == "🪨" or Player["axe"] + Player["flamethrower"] < Tools):
+            GiveUpIfDoomed(moveset, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Session)
 
         if move == "p":
             if Player["axe"] == False and Player["flamethrower"] == False:
@@ -175,9 +288,74 @@ def InputHandler(moveset, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTer
                     Player["flamethrower"] += 1
 
         if move == "!":
-            Restart(Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard)
+            Restart(Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Session)
+            if Check:
+                GiveUpIfDoomed(moveset, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Session)
+
+def Doomed(Player, DisplayBoard, InitialBoard, ToggleBoard):
+    #True once some mushroom can never be reached; it only says so when that is certain
+    #trees are walls once no tool is left anywhere, rocks once they are boxed in on both axes,
+    #and water once no rock is left that could still be pushed in to pave it
+    Here = (Player["yPos"], Player["xPos"])
+    Tools = Player["axe"] + Player["flamethrower"]
+    for y, row in enumerate(InitialBoard):
+        for x, tile in enumerate(row):
+            if tile in ("🪓", "🔥") and ToggleBoard[y][x] != "/":
+                Tools += 1
+    TreesBlocked = Tools == 0
+
+    def Inside(y, x):
+        return 0 <= y < len(DisplayBoard) and 0 <= x < len(DisplayBoard[y])
+
+    #a rock can't move along an axis if either side is blocked for good: the player can't get behind it or it can't go forward
+    Frozen = set()
+    def Blocked(y, x):
+        if not Inside(y, x):
+            return True
+        if (y, x) == Here:
+            return False
+        return (y, x) in Frozen or (TreesBlocked and DisplayBoard[y][x] == "🌲")
+
+    Rocks = [(y, x) for y, row in enumerate(DisplayBoard) for x, tile in enumerate(row) if tile == "🪨" and (y, x) != Here]
+    Changed = True
+    while Changed:
+        Changed = False
+        for y, x in Rocks:
+            if (y, x) not in Frozen and (Blocked(y - 1, x) or Blocked(y + 1, x)) and (Blocked(y, x - 1) or Blocked(y, x + 1)):
+                Frozen.add((y, x))
+                Changed = True
+    WaterBlocked = len(Frozen) == len(Rocks)
+
+    #everywhere the player could still possibly get to
+    Reached = {Here}
+    ToVisit = [Here]
+    while ToVisit:
+        i, j = ToVisit.pop()
+        for new_i, new_j in ((i, j + 1), (i, j - 1), (i + 1, j), (i - 1, j)):
+            if (new_i, new_j) in Reached or not Inside(new_i, new_j) or (new_i, new_j) in Frozen:
+                continue
+            tile = DisplayBoard[new_i][new_j]
+            if (tile == "🌲" and TreesBlocked) or (tile == "🟦" and WaterBlocked):
+                continue
+            Reached.add((new_i, new_j))
+            ToVisit.append((new_i, new_j))
+
+    return any(tile == "🍄" and (y, x) not in Reached
+               for y, row in enumerate(DisplayBoard) for x, tile in enumerate(row))
+
+def GiveUpIfDoomed(moveset, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Session):
+    #a doomed run can only be saved by a restart, so skip straight to the next "!" (or end the run if there isn't one)
+    while Doomed(Player, DisplayBoard, InitialBoard, ToggleBoard):
+        for move in moveset:
+            if move == "!":
+                break
+            if move not in ("w", "a", "s", "d", "p"):
+                NoMoves(Player, DisplayBoard, Session)
+        else:
+            NoMoves(Player, DisplayBoard, Session)
+        Restart(Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Session)
 
-def PlayerInput(Player, DisplayBoard, ToggleBoard, InitialBoard):
+def PlayerInput(Player, InitialPlayer, DisplayBoard, ToggleBoard, InitialBoard, Session=None):
     print("[W] Move up")
     print("[A] Move left")
     print("[S] Move down")
@@ -202,23 +380,30 @@ def PlayerInput(Player, DisplayBoard, ToggleBoard, InitialBoard):
         print("\nEquippable Item on tile: None")
 
     moveset = input("Enter move:").lower()
-    InputHandler(moveset, Player, DisplayBoard, InitialBoard, ToggleBoard, False)
+    InputHandler(moveset, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, False, Session)
 
-def TerminalInput(Player, DisplayBoard, InitialBoard, ToggleBoard):
-    moveset = data[1]
-    InputHandler(moveset, Player, DisplayBoard, InitialBoard, ToggleBoard, True)
-    NoMoves(Player, DisplayBoard)
+def TerminalInput(moveset, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Session):
+    InputHandler(moveset, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, True, Session)
+    NoMoves(Player, DisplayBoard, Session)
 
-def BurnTree(i, j):
+def BurnTree(i, j, Board, Session=None):
+    #burns every tree connected to (i, j); uses a stack instead of recursion so big forests can't hit the recursion limit
     adjacent = ((0,1), (0, -1), (1,0), (-1, 0))
-    for adj in adjacent:
-        new_i, new_j = i+adj[0], j+adj[1]
-        if not (new_i < 0 or new_j < 0 or new_i >= len(DisplayBoard) or new_j >= len(DisplayBoard[0])):
-            if DisplayBoard[new_i][new_j] == "🌲":
-                DisplayBoard[new_i][new_j] = "　"
-                BurnTree(new_i, new_j)
-
-def Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard):
+    ToBurn = [(i, j)]
+    Visited = 0
+    while ToBurn:
+        i, j = ToBurn.pop()
+        Visited += 1
+        for adj in adjacent:
+            new_i, new_j = i+adj[0], j+adj[1]
+            if not (new_i < 0 or new_j < 0 or new_i >= len(Board) or new_j >= len(Board[0])):
+                if Board[new_i][new_j] == "🌲":
+                    Board[new_i][new_j] = "　"
+                    ToBurn.append((new_i, new_j))
+    Count(Session, "burn_cells", Visited)
+
+def Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard, Session=None):
+    Count(Session, "clear_space")
     #-------------------checks the previous tile of the player---------------------------#
     Spacetiles = ("　", "🍄", "🌲", "🪨", "🧑") 
     if InitialBoard[Player["yPos"]][Player["xPos"]] in Spacetiles:
@@ -249,27 +434,27 @@ def Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard):
     if (Player["xPos"] < 0):
         Player["xPos"] += 1
     
-def movement(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal):
+def movement(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard, IsTerminal, Session=None):
     #------------------------spaces-------------------------------------------#
     SkipTiles = ("　", "⬜", "🪓", "🔥")
     if DisplayBoard[Player["yPos"] + yMoveVal][Player["xPos"] + xMoveVal] in SkipTiles:
-        Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard)
+        Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard, Session)
 
     #------------------------mushrooms-------------------------------------------#
     elif DisplayBoard[Player["yPos"] + yMoveVal][Player["xPos"] + xMoveVal] == "🍄":
         Player["mushroom"] += 1
-        Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard)
+        Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard, Session)
         if Player["mushroom"] == Player["win"]:
             if IsTerminal == True:
-                TermWin(Player, DisplayBoard)
+                TermWin(Player, DisplayBoard, Session)
             else:
                 Win(Player, DisplayBoard)
 
     #------------------------water-------------------------------------------#
     elif DisplayBoard[Player["yPos"] + yMoveVal][Player["xPos"] + xMoveVal] == "🟦":
-        Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard)
+        Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard, Session)
         if IsTerminal == True:
-                TermLoss(Player, DisplayBoard)
+                TermLoss(Player, DisplayBoard, Session)
         else:
             Loss(Player, DisplayBoard)
 
@@ -279,28 +464,49 @@ def movement(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard
         if DisplayBoard[Player["yPos"] + (yMoveVal*2)][Player["xPos"] + (xMoveVal*2)] not in Avoid:
             if DisplayBoard[Player["yPos"] + (yMoveVal*2)][Player["xPos"] + (xMoveVal*2)] == "🟦":
                 DisplayBoard[Player["yPos"] + (yMoveVal*2)][Player["xPos"] + (xMoveVal*2)] = "⬜"
-                Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard)
+                Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard, Session)
             else:
                 DisplayBoard[Player["yPos"] + (yMoveVal*2)][Player["xPos"] + (xMoveVal*2)] = "🪨"
-                Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard)
+                Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard, Session)
 
     #------------------------Tree-------------------------------------------#
     elif DisplayBoard[Player["yPos"] + yMoveVal][Player["xPos"] + xMoveVal] == "🌲":
         if Player["axe"] == True:
-            Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard)
+            Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard, Session)
             Player["axe"] -= 1
         if Player["flamethrower"] == True:
-            Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard)
+            Space(yMoveVal, xMoveVal, Player, DisplayBoard, InitialBoard, ToggleBoard, Session)
             i, j = Player["yPos"], Player["xPos"]
-            BurnTree(i, j)
+            BurnTree(i, j, DisplayBoard, Session)
             Player["flamethrower"] -= 1
 
+def run(argv=None):
+    start = time.perf_counter()
+    stage_file, moves, Session = parse_args(argv)
+    start = Timed(Session, "parse", start)
+    stage_data = None
+    if stage_file:
+        with open(stage_file, encoding='utf-8') as f:
+            stage_data = f.read()
+    Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Session["size"] = load_stage(stage_data, Session)
+    start = Timed(Session, "load_level", start)
+
+    if moves:
+        try:
+            TerminalInput(moves, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Session)
+        finally:
+            #terminal mode always ends by quitting from TermPrint's caller, which timed the export itself
+            Profile = Session["profile"]
+            if Profile is not None:
+                Timed(Session, "move_loop", start)
+                Profile["timings"]["move_loop"] -= Profile["timings"]["export"]
+                WriteProfile(Session)
+    else:
+        while True:
+            clearConsole()
+            Position(DisplayBoard, Player)
+            printBoard(DisplayBoard)
+            PlayerInput(Player, InitialPlayer, DisplayBoard, ToggleBoard, InitialBoard, Session)
+
 if __name__ == "__main__":
-    while not data[1]:
-        clearConsole()
-        Position(DisplayBoard, Player)
-        printBoard(DisplayBoard)
-        PlayerInput(Player, DisplayBoard, InitialBoard, ToggleBoard)
-
-    while data[1]:
-        TerminalInput(Player, DisplayBoard, InitialBoard, ToggleBoard)
\ No newline at end of file
+    run()
@@ -1,4 +1,5 @@
 import copy
+from pathlib import Path
 import pytest
 import shroom_raider
 
@@ -42,6 +43,16 @@ def test_restart_resets_player_and_board(setup_boards):
     assert ToggleBoard == InitialBoard
 
 
+def test_load_stage_builds_player_and_boards():
+    Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Size = shroom_raider.load_stage("3 4\nT+LT\nT+.T\nTTTT")
+    assert Size == (3, 4)
+    assert (Player["yPos"], Player["xPos"], Player["win"]) == (0, 2, 2)
+    assert DisplayBoard[0] == ["🌲", "🍄", "🧑", "🌲"]
+    assert InitialPlayer == Player
+    assert InitialBoard == ToggleBoard == DisplayBoard
+    assert InitialBoard[0] is not DisplayBoard[0]
+
+
 # ----------------- MOVEMENT TESTS -----------------
 
 def test_space_moves_player(setup_boards):
@@ -95,8 +106,89 @@ def test_burn_tree_removes_adjacent_trees(setup_boards):
         for j in range(1, 4):
             DisplayBoard[i][j] = "🌲"
     DisplayBoard[2][2] = "🔥"
-    shroom_raider.DisplayBoard = DisplayBoard
-    shroom_raider.BurnTree(2, 2)
+    shroom_raider.BurnTree(2, 2, DisplayBoard)
     for i in range(1, 4):
         for j in range(1, 4):
-            assert DisplayBoard[i][j] != "🌲"
\ No newline at end of file
+            assert DisplayBoard[i][j] != "🌲"
+
+def test_burn_tree_handles_large_forest():
+    Board = [["🌲"] * 200 for _ in range(200)]
+    shroom_raider.BurnTree(0, 0, Board)
+    assert all(cell == "　" for row in Board for cell in row)
+
+def test_read_moves_expands_run_lengths_across_chunks():
+    import io
+    moves = shroom_raider.ReadMoves(io.StringIO("d1\n2w 3p0s"), ChunkSize=2, RunLengths=True)
+    assert "".join(moves) == "d" * 12 + "www" + "s"
+
+def test_read_moves_keeps_digits_without_run_lengths():
+    import io
+    assert "".join(shroom_raider.ReadMoves(io.StringIO("d12"), ChunkSize=2)) == "d12"
+
+def test_input_handler_takes_move_stream(tmp_path, setup_boards):
+    Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard = setup_boards
+    moves_file = tmp_path / "moves.txt"
+    moves_file.write_text("d1a1\n")
+    moves = shroom_raider.StreamMoves(str(moves_file), RunLengths=True)
+    shroom_raider.InputHandler(moves, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, True)
+    assert (Player["yPos"], Player["xPos"]) == (2, 2)
+    assert DisplayBoard[2][3] == "　"
+
+def test_profile_counts_burnt_cells_and_spaces(setup_boards):
+    Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard = setup_boards
+    Session = shroom_raider.NewSession(Profile=True)
+    shroom_raider.Space(0, 1, Player, DisplayBoard, InitialBoard, ToggleBoard, Session)
+    shroom_raider.BurnTree(4, 0, DisplayBoard, Session)
+    counters = Session["profile"]["counters"]
+    assert counters["clear_space"] == 1
+    assert counters["burn_cells"] == 1 + sum(row.count("🌲") for row in InitialBoard)
+
+def test_doomed_once_rock_walls_off_mushroom():
+    Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, _ = shroom_raider.load_stage("4 6\nTTTTTT\nTL.R.T\nTTTT+T\nTTTTTT")
+    assert not shroom_raider.Doomed(Player, DisplayBoard, InitialBoard, ToggleBoard)
+    shroom_raider.movement(0, 1, Player, DisplayBoard, InitialBoard, ToggleBoard, True)
+    shroom_raider.movement(0, 1, Player, DisplayBoard, InitialBoard, ToggleBoard, True)
+    assert shroom_raider.Doomed(Player, DisplayBoard, InitialBoard, ToggleBoard)
+
+def test_doomed_run_skips_to_restart():
+    Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, _ = shroom_raider.load_stage("4 6\nTTTTTT\nTL.R.T\nTTTT+T\nTTTTTT")
+    moves = iter("a" * 50 + "!d")
+    shroom_raider.movement(0, 1, Player, DisplayBoard, InitialBoard, ToggleBoard, True)
+    shroom_raider.movement(0, 1, Player, DisplayBoard, InitialBoard, ToggleBoard, True)
+    shroom_raider.GiveUpIfDoomed(moves, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, shroom_raider.NewSession())
+    assert (Player["yPos"], Player["xPos"]) == (1, 1)
+    assert list(moves) == ["d"]
+
+def test_term_print_writes_to_output_file(tmp_path):
+    _, _, DisplayBoard, _, _, Size = shroom_raider.load_stage("3 5\nTTTTT\nTLR+T\nTTTTT")
+    Output = tmp_path / "result.txt"
+    shroom_raider.TermPrint(DisplayBoard, "NO CLEAR", str(Output), Size)
+    assert Output.read_text(encoding="utf-8") == "NO CLEAR\n3 5\nTTTTT\nTLR+T\nTTTTT"
+
+def test_term_print_keeps_declared_size(tmp_path):
+    #Level2 declares more rows than it has, and the header still says so
+    with open(Path(__file__).parent / "Levels" / "Level2.txt", encoding="utf-8") as f:
+        stage_data = f.read()
+    _, _, DisplayBoard, _, _, Size = shroom_raider.load_stage(stage_data)
+    Output = tmp_path / "result.txt"
+    shroom_raider.TermPrint(DisplayBoard, "No Clear", str(Output), Size)
+    assert Output.read_text(encoding="utf-8").splitlines()[1] == "15 14"
+
+def test_profile_json_and_output_cannot_share_stdout():
+    with pytest.raises(SystemExit) as error:
+        shroom_raider.parse_args(["-f", "Levels/Level2.txt", "-m", "d", "-o", "-", "--profile-json", "-"])
+    assert error.value.code == 2
+
+def test_parse_args_returns_session():
+    stage_file, moves, Session = shroom_raider.parse_args(["-f", "Levels/Level2.txt", "-m", "ds", "-o", "out.txt", "--stop-early"])
+    assert (stage_file, moves) == ("Levels/Level2.txt", "ds")
+    assert (Session["output"], Session["stop_early"], Session["profile"]) == ("out.txt", True, None)
+    assert shroom_raider.parse_args(["-f", "Levels/Level2.txt", "--profile"])[2]["profile"]["counters"]["moves"] == 0
+
+def test_stop_early_writes_to_session_output(tmp_path):
+    Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, Size = shroom_raider.load_stage("4 6\nTTTTTT\nTL.R.T\nTTTT+T\nTTTTTT")
+    Output = tmp_path / "result.txt"
+    Session = shroom_raider.NewSession(str(Output), Size, StopEarly=True)
+    with pytest.raises(SystemExit):
+        shroom_raider.InputHandler("dd" + "a" * 50, Player, InitialPlayer, DisplayBoard, InitialBoard, ToggleBoard, True, Session)
+    assert Output.read_text(encoding="utf-8").splitlines()[:2] == ["No Clear", "4 6"]